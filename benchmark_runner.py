@@ -1,111 +1,634 @@
 # benchmark_runner.py
 import time
 from tqdm import tqdm
-import logging
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List
 
 from model_adapter import BaseModelAdapter
 from evaluate import OpenAIJudger
-from typing import List
-from evaluate import OpenAIJudger
+from journal import RunJournal
+from logger import ReportSection, ReportWriter
+from metrics import SampleStatsAccumulator, aggregate_sample_statistics, mean, sample_statistics
+from model_adapter import FAILED_STATUSES, INCOMPLETE_STATUSES, STATUS_OK, STATUS_OUT_OF_TIME, STATUS_THINKING_BUDGET, UNSCORED_STATUSES, add_usage, make_usage, request_deadline
+from pricing import PriceTable
+from rate_limit import estimate_tokens
+from reasoning import extract_answer
+from results_store import ResultsStore
+from scheduler import TimeBudgetScheduler
+import tracing
+from tracing import Tracer
 
-# logging.basicConfig(level=logging.DEBUG)
 
 class BenchmarkRunner:
-    def __init__(self, model_adapter: BaseModelAdapter, tasks: List, judger: OpenAIJudger, task_index: int = 0, benchmark_logger: logging.Logger = None):
+    def __init__(self, model_adapter: BaseModelAdapter, tasks: List, judger: OpenAIJudger, task_index: int = 0, benchmark_logger: ReportWriter = None, concurrency: int = 1, judge_workers: int = 1, journal: RunJournal = None, resume_records: List[dict] = None, judge_executor: ThreadPoolExecutor = None, price_table: PriceTable = None, samples: int = 1, pass_score: float = 60.0, results_store: ResultsStore = None, run_id: str = None, tracer: Tracer = None, scheduler: TimeBudgetScheduler = None):
         self.model_adapter = model_adapter
         self.tasks = tasks
         self.results = []
         self.judger = judger
         self.task_index = task_index
         self.benchmark_logger = benchmark_logger
+        # 同时在途（正在请求模型或裁判）的任务数上限
+        self.concurrency = max(1, concurrency)
+        # 裁判阶段独立的工作线程数，与生成阶段互不占用
+        self.judge_workers = max(1, judge_workers)
+        # 外部传入的共享裁判线程池（多模型横评时所有 Runner 共用），为 None 时自行创建
+        self.judge_executor = judge_executor
+        # 运行日志：每完成一个任务追加一条记录，用于中断后恢复
+        self.journal = journal
+        # 从运行日志恢复的已完成任务，按任务 ID 索引
+        self.resume_records = {record["task_id"]: record for record in (resume_records or [])}
+        # 之前中断的运行已经消耗的时间，恢复后继续累计
+        self.elapsed_offset = max((record.get("elapsed", 0.0) for record in self.resume_records.values()), default=0.0)
+        # 裁判线程池，仅在流水线模式下存在；为 None 时在生成线程中直接评分
+        self._judge_executor = None
+        # 是否在任务完成时写入报告段落（只在运行全部任务时写入）
+        self._report_sections = False
+        # 价格表，用于将 token 用量换算为费用
+        self.price_table = price_table or PriceTable()
+        # 每个任务的采样次数，大于 1 时报告各任务与各类别的均值、标准差、置信区间和 pass@k
+        self.samples = max(1, samples)
+        # 采样得分不低于该值时视为通过，用于计算 pass@k
+        self.pass_score = pass_score
+        # 结构化结果库：每个任务的结果与运行汇总同时写入，run_id 标识本次运行
+        self.results_store = results_store
+        self.run_id = run_id
+        # 数据集任务在 self.results 中的汇总项及其采样统计累加器，按父任务 ID 索引
+        self._dataset_results = {}
+        self._dataset_sample_stats = {}
+        # 各阶段的耗时区间，运行期间在 Runner 的所有线程中激活，适配器与裁判的区间也记入其中
+        self.tracer = tracer if tracer is not None else Tracer()
+        # 时间预算调度器：按预测耗时安排任务顺序，放不进剩余预算的任务标记为超出时间预算（OOT），为 None 时不限制
+        self.scheduler = scheduler
 
     def run(self):
+        with self.tracer.activate():
+            return self._run()
+
+    def _run(self):
         print(f"\n\n🚀 Starting benchmark for model: {self.model_adapter.model_id}")
         
         total_start_time = time.time()
+        self._start_time = total_start_time
         self.total_execution_time = 0.0
+        if self.scheduler is not None:
+            self.scheduler.start()
 
-        if self.task_index != 0:
+        if self.task_index != 0 and self.tasks[self.task_index - 1].is_dataset():
+            # 数据集任务逐行运行，得分汇总到该任务
+            task = self.tasks[self.task_index - 1]
+            print(f"===== Running Dataset Task: {task.get_name()} ({task.instance_count()} rows) =====")
+            self._run_all_tasks([task])
+            print(f"📊 Score: {self.results[-1]['score']}")
+            print(f"Reason: {self.results[-1]['reason']}\n")
+        elif self.task_index != 0:
             # 如果指定了特定任务，则只运行该任务
             task = self.tasks[self.task_index - 1]
             print(f"===== Running Task: {task.get_name()} =====")
             print(f"Category: {task.get_category()}")
             print(f"Description: {task.get_description()}")
-            prompt = task.generate_prompt()
-            start_time = time.time()
-            response = self.model_adapter.query(prompt)
-            end_time = time.time()
-            
-            execution_time = round(end_time - start_time, 2)
+            outcome = self._run_task(self.task_index - 1, task)
             
-            print(f"Model Response (took {execution_time}s): \n---\n{response}\n---\n")
+            cached_note = " [cached]" if outcome["cached"] else ""
+            print(f"Model Response (took {outcome['execution_time']}s{cached_note}): \n---\n{outcome['response']}\n---\n")
+            if outcome["metrics"]:
+                print(f"Stream metrics: {outcome['metrics']}")
 
-            score, reason = task.evaluate(response, self.judger)
-            print(f"📊 Score: {score}/1.0")
-            print(f"Reason: {reason}\n")
+            print(f"📊 Score: {outcome['score']}/1.0")
+            print(f"Reason: {outcome['reason']}\n")
+            if outcome.get("sample_stats"):
+                print(f"Sample scores: {[sample['score'] for sample in outcome['samples']]}")
+                print(f"Sample stats: {outcome['sample_stats']}\n")
             
-            self.results.append({
-                "task_name": task.get_name(),
-                "category": task.get_category(),  # ✅ 新增分类
-                "execution_time": execution_time,
-                "score": score,
-                "reason": reason,
-            })
+            self._record_result(task, outcome)
         else:
-            for i, task in tqdm(enumerate(self.tasks), total=len(self.tasks), desc="Running tasks"):
-                self.benchmark_logger.info(f"## Task {i+1}: {task.get_name()} ")
-                self.benchmark_logger.info(f"**分类**: {task.get_category()}\n")  # ✅ 记录分类
-                self.benchmark_logger.info("### 提示词\n")
-                prompt = task.generate_prompt()
-                self.benchmark_logger.info("```markdown\n" + prompt + "\n```")
-                
-                start_time = time.time()
-                response = self.model_adapter.query(prompt)
-                end_time = time.time()
-                self.benchmark_logger.info("### 模型响应\n")
-                
-                execution_time = 0.0  # 初始化，防止超时时未定义
-                
-                if "Error calling" in response and "timeout" in response:
-                    self.benchmark_logger.info(f"模型超时！\n{response}\n\n")
-                    score = 0
-                    reason = "无法在规定时间内生成完整响应"
-                else:
-                    execution_time = round(end_time - start_time, 2)
-                    self.benchmark_logger.info(f"模型输出耗时：{execution_time}s\n\n")
-                    self.benchmark_logger.info(f"模型输出：\n")
-                    self.benchmark_logger.info("```markdown\n" + response + "\n```\n")
-                    
-                    score, reason = task.evaluate(response, self.judger)
-                
-                self.benchmark_logger.info("### 评价结果\n")
-                self.benchmark_logger.info(f"📊回答评分: **{score}**\n")
-                self.benchmark_logger.info(f"评分理由: {reason}\n")
-                
-                self.results.append({
-                    "task_name": task.get_name(),
-                    "category": task.get_category(),
-                    "execution_time": execution_time,
-                    "score": score,
-                    "reason": reason,
-                })
-                self.total_execution_time += execution_time
+            self._run_all_tasks(self.tasks)
             
         total_end_time = time.time()
-        self.total_benchmark_time = round(total_end_time - total_start_time, 2)
+        self.total_benchmark_time = round(self.elapsed_offset + total_end_time - total_start_time, 2)
         print(f"✅ Benchmark finished in {self.total_benchmark_time}s.")
-        return self.get_summary()
+        summary = self.get_summary()
+        if self.results_store is not None:
+            self.results_store.finish_run(self.run_id, summary)
+        return summary
+
+    def _run_all_tasks(self, tasks: List):
+        """
+        以「生成 → 评分」两级流水线执行全部任务。
+        生成阶段最多同时有 concurrency 个任务在途，生成完成的回答交给独立的裁判线程池排队评分，
+        因此裁判评分与下一个任务的生成可以同时进行。
+        每个任务完成时即在所在线程中拼装报告段落并交给后台写入器，写入器按任务顺序输出，
+        因此报告内容与串行执行时一致；结果按任务顺序取回并汇总。
+        运行日志中已完成的任务不会重新执行，直接按原记录写入报告。
+        数据集任务按行展开为多个实例，随提交进度逐行读取，不会一次性读入整个数据集。
+        设置了时间预算时，普通任务按预测耗时从短到长提交，数据集任务排在最后逐行提交（见 TimeBudgetScheduler.order），
+        报告段落仍按任务原来的顺序写入。
+        """
+        # 已提交但尚未写入报告的任务窗口，限制窗口大小以避免一次性提交全部任务
+        window_size = (self.concurrency + self.judge_workers) * 2
+        pending = deque()
+
+        if self.judge_executor is not None:
+            judge_pool = nullcontext(self.judge_executor)
+        else:
+            judge_pool = ThreadPoolExecutor(max_workers=self.judge_workers, thread_name_prefix="judge")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="generate") as executor, \
+                judge_pool as judge_executor, \
+                tqdm(total=sum(task.instance_count() for task in tasks), desc=f"Running tasks ({self.model_adapter.model_id})") as progress:
+            self._judge_executor = judge_executor
+            self._report_sections = True
+            if self.scheduler is not None:
+                instances = self.scheduler.order(tasks, done_ids=self.resume_records.keys())
+            else:
+                instances = enumerate(instance for task in tasks for instance in task.iter_instances())
+            for i, task in instances:
+                record = self.resume_records.get(task.get_id())
+                if record is not None:
+                    future = Future()
+                    future.set_result({**record, "verdict": None})
+                    self._log_task(i, task, future.result())
+                else:
+                    future = executor.submit(tracing.bind(self._run_task), i, task)
+                pending.append((i, task, future))
+                while len(pending) >= window_size:
+                    self._collect(*pending.popleft())
+                    progress.update(1)
+            while pending:
+                self._collect(*pending.popleft())
+                progress.update(1)
+
+    def _run_task(self, i: int, task) -> dict:
+        """
+        生成阶段：在工作线程中生成提示词并请求模型。
+        需要 LLM 裁判的任务将评分提交到裁判线程池后立即返回，精确匹配、填空题则直接在本线程评分。
+        execution_time 只统计本任务自身的模型生成耗时，不包括在线程池中排队的时间。
+        设置了时间预算时，任务开始前由调度器决定是否运行以及截止时间，见 TimeBudgetScheduler.admit。
+        """
+        deadline = None
+        if self.scheduler is not None:
+            deadline, predicted = self.scheduler.admit(task)
+            if deadline is None:
+                return self._out_of_time(i, task, f"超出时间预算：预测耗时 {predicted:.1f}s，剩余预算不足，未运行，不计入得分")
+
+        if self.samples > 1:
+            return self._run_sampled_task(i, task, deadline)
+
+        with tracing.span("prompt"):
+            prompt = task.generate_prompt()
+
+        start_time = time.time()
+        with tracing.span("generate", task_id=task.get_id()), request_deadline(deadline):
+            model_response = self.model_adapter.complete(prompt)
+        end_time = time.time()
+        response = model_response.text
+
+        execution_time = 0.0  # 初始化，防止超时时未定义
+        # 超时或思考超出预算：模型没有给出完整回答
+        timed_out = model_response.status in INCOMPLETE_STATUSES
+
+        outcome = {
+            "prompt": prompt,
+            "response": response,
+            "status": model_response.status,
+            "timed_out": timed_out,
+            "cached": model_response.cached,
+            "execution_time": execution_time,
+            "metrics": model_response.metrics,
+            "timings": model_response.timings,
+            "endpoint": model_response.endpoint,
+            "usage": model_response.usage,
+            "judge_usage": {},
+            "judge_skipped": False,
+            "score": None,
+            "reason": None,
+            "verdict": None,
+        }
+
+        if timed_out:
+            outcome["score"] = 0
+            outcome["reason"] = incomplete_reason(model_response.status)
+        elif model_response.status == STATUS_OUT_OF_TIME:
+            # 被调度器的截止时间中断，不是模型的回答，不评分
+            outcome["score"] = 0
+            outcome["reason"] = f"超出时间预算：{deadline:.1f}s 的截止时间内未完成，不计入得分"
+        elif model_response.status in FAILED_STATUSES:
+            # 请求失败不是模型的回答，不评分
+            outcome["score"] = 0
+            outcome["reason"] = f"请求失败（{model_response.status}），不计入得分"
+        else:
+            if not model_response.cached:
+                # 命中缓存的耗时不计入 execution_time；服务端报告的模型加载耗时也不计入
+                outcome["execution_time"] = round(end_time - start_time - model_response.timings.get("load_duration", 0.0), 2)
+                self._observe_latency(task, prompt, outcome)
+            response = outcome["response"] = self._extract_answer(task, response)
+            # 规则预检只执行一次，结果随回答交给评分
+            rule = task.pre_check(response) if task.requires_judge() else None
+            if task.requires_judge() and self._judge_executor is not None and (rule is None or rule.score is None):
+                # 交给裁判阶段排队评分，生成线程继续处理下一个任务
+                outcome["verdict"] = self._judge_executor.submit(tracing.bind(self._judge_task), i, task, outcome, rule)
+                return outcome
+            # 不需要裁判，或规则预检可以直接判定，无需进入裁判阶段
+            with tracing.span("evaluate", task_id=task.get_id()):
+                self._apply_verdict(outcome, task.evaluate_pre_checked(response, self.judger, rule))
+
+        self._finish_task(i, task, outcome)
+        return outcome
+
+    def _run_sampled_task(self, i: int, task, deadline: float = None) -> dict:
+        """
+        多次采样时的生成阶段：一次取回全部采样（适配器支持时为一次 n=K 请求，否则并行请求），
+        再逐个评分。需要 LLM 裁判的任务整体提交到裁判线程池。
+        outcome 中 response 为第一个采样，samples 记录每个采样的回答与得分。
+        :param deadline: 调度器给出的截止时间（秒），全部采样共用。
+        """
+        with tracing.span("prompt"):
+            prompt = task.generate_prompt()
+
+        start_time = time.time()
+        with tracing.span("generate", task_id=task.get_id(), samples=self.samples), request_deadline(deadline):
+            responses = self.model_adapter.complete_samples(prompt, self.samples)
+        end_time = time.time()
+
+        samples = [
+            {
+                "response": self._extract_answer(task, model_response.text) if model_response.status == STATUS_OK else model_response.text,
+                "status": model_response.status,
+                "timed_out": model_response.status in INCOMPLETE_STATUSES,
+                "score": None,
+                "reason": None,
+                "judge_skipped": False,
+                "endpoint": model_response.endpoint,
+            }
+            for model_response in responses
+        ]
+        usage = {}
+        for model_response in responses:
+            if model_response.usage:
+                usage = add_usage(usage, model_response.usage)
+        cached = all(model_response.cached for model_response in responses)
+        # 并行请求的采样可能同时等待同一次模型加载，按最长的加载耗时扣除
+        load_duration = max(model_response.timings.get("load_duration", 0.0) for model_response in responses)
+        timed_out = all(sample["timed_out"] for sample in samples)
+        # 全部采样都请求失败（或超出时间预算）时整个任务视为失败，否则只忽略失败的采样
+        unscored = [sample["status"] for sample in samples if sample["status"] in UNSCORED_STATUSES]
+        status = unscored[0] if len(unscored) == len(samples) else (samples[0]["status"] if timed_out else STATUS_OK)
+
+        outcome = {
+            "prompt": prompt,
+            "response": samples[0]["response"],
+            "status": status,
+            "timed_out": timed_out,
+            "cached": cached,
+            # 全部超时或全部命中缓存时不计入耗时
+            "execution_time": 0.0 if timed_out or cached else round(end_time - start_time - load_duration, 2),
+            "metrics": responses[0].metrics,
+            "timings": responses[0].timings,
+            "endpoint": responses[0].endpoint,
+            "usage": usage,
+            "judge_usage": {},
+            "judge_skipped": False,
+            "score": None,
+            "reason": None,
+            "verdict": None,
+            "samples": samples,
+            "deduplicated": 0,
+            "sample_stats": {},
+        }
+
+        if status == STATUS_OK and not cached and outcome["execution_time"] > 0:
+            self._observe_latency(task, prompt, outcome)
+        if task.requires_judge() and self._judge_executor is not None and status == STATUS_OK:
+            outcome["verdict"] = self._judge_executor.submit(tracing.bind(self._judge_task), i, task, outcome)
+            return outcome
+
+        self._score_samples(task, outcome)
+        self._finish_task(i, task, outcome)
+        return outcome
+
+    def _judge_task(self, i: int, task, outcome: dict, rule=None) -> dict:
+        """
+        评分阶段：在裁判线程中为已生成的回答评分。
+        :param rule: 生成阶段已经执行过的规则预检结果（单次采样时）。
+        """
+        if "samples" in outcome:
+            self._score_samples(task, outcome)
+        else:
+            with tracing.span("evaluate", task_id=task.get_id()):
+                self._apply_verdict(outcome, task.evaluate_pre_checked(outcome["response"], self.judger, rule))
+        self._finish_task(i, task, outcome)
+        return outcome
+
+    def _score_samples(self, task, outcome: dict):
+        """
+        为每个采样评分，并计算均值、标准差、置信区间与 pass@k。
+        去掉首尾空白后相同的回答只评分一次，避免重复调用裁判。
+        """
+        # 去重后一次性评分：exact_match / fill_in 由匹配器批量评分，llm_eval 逐个调用裁判
+        unique = {}
+        evaluated = 0
+        for sample in outcome["samples"]:
+            if not sample["timed_out"] and sample["status"] not in UNSCORED_STATUSES:
+                unique.setdefault(sample["response"].strip(), sample["response"])
+                evaluated += 1
+        outcome["deduplicated"] += evaluated - len(unique)
+        with tracing.span("evaluate", task_id=task.get_id(), responses=len(unique)):
+            verdicts = dict(zip(unique, task.evaluate_many(list(unique.values()), self.judger)))
+        judge_usage = {}
+        for verdict in verdicts.values():
+            if verdict.usage:
+                judge_usage = add_usage(judge_usage, verdict.usage)
+
+        for sample in outcome["samples"]:
+            if sample["timed_out"]:
+                sample["score"] = 0
+                sample["reason"] = incomplete_reason(sample["status"])
+                continue
+            if sample["status"] in UNSCORED_STATUSES:
+                sample["reason"] = unscored_reason(sample["status"])
+                continue
+            verdict = verdicts[sample["response"].strip()]
+            sample.update(score=verdict.score, reason=verdict.reason, judge_skipped=verdict.judge_skipped)
+            if verdict.status != STATUS_OK:
+                sample.update(score=None, status=verdict.status)
+
+        scores = [sample["score"] for sample in outcome["samples"] if sample["score"] is not None]
+        if not scores:
+            # 全部采样都请求失败（模型或裁判）或超出时间预算
+            outcome["status"] = next(sample["status"] for sample in outcome["samples"] if sample["status"] in UNSCORED_STATUSES)
+            outcome["score"] = 0
+            outcome["reason"] = unscored_reason(outcome["status"])
+            return
+        outcome["sample_stats"] = sample_statistics(scores, self.pass_score)
+        outcome["score"] = outcome["sample_stats"]["mean"]
+        outcome["reason"] = next(sample["reason"] for sample in outcome["samples"] if sample["score"] is not None)
+        outcome["judge_usage"] = judge_usage
+        outcome["judge_skipped"] = bool(verdicts) and all(verdict.judge_skipped for verdict in verdicts.values())
+
+    @staticmethod
+    def _apply_verdict(outcome: dict, verdict):
+        outcome["score"] = verdict.score
+        outcome["reason"] = verdict.reason
+        outcome["judge_usage"] = verdict.usage
+        outcome["judge_skipped"] = verdict.judge_skipped
+        if verdict.status != STATUS_OK:
+            # 裁判请求失败，分数无效
+            outcome["status"] = verdict.status
+
+    def _extract_answer(self, task, text: str) -> str:
+        """按任务的 answer_mode（未配置时为适配器的默认方式）取出用于评分的回答。"""
+        mode = task.answer_mode() or getattr(self.model_adapter, "ANSWER_MODE", "full")
+        return extract_answer(text, mode)
+
+    def _observe_latency(self, task, prompt: str, outcome: dict):
+        """把任务的实际生成耗时交给调度器，用于预测之后的任务。"""
+        if self.scheduler is not None:
+            prompt_tokens = outcome["usage"].get("prompt_tokens") or estimate_tokens(prompt)
+            self.scheduler.observe(task, prompt_tokens, outcome["execution_time"])
+
+    def _out_of_time(self, i: int, task, reason: str) -> dict:
+        """放不进剩余时间预算的任务：不请求模型，直接以 STATUS_OUT_OF_TIME 完成。"""
+        outcome = {
+            "prompt": task.generate_prompt(),
+            "response": "",
+            "status": STATUS_OUT_OF_TIME,
+            "timed_out": False,
+            "cached": False,
+            "execution_time": 0.0,
+            "metrics": {},
+            "timings": {},
+            "endpoint": None,
+            "usage": {},
+            "judge_usage": {},
+            "judge_skipped": False,
+            "score": 0,
+            "reason": reason,
+            "verdict": None,
+        }
+        self._finish_task(i, task, outcome)
+        return outcome
+
+    def _finish_task(self, i: int, task, outcome: dict):
+        """
+        任务完成（生成与评分均结束）时立即写入运行日志和报告段落，不等待前面的任务。
+        请求失败和超出时间预算的任务不写入运行日志，--resume 时会重新运行。
+        """
+        if self._report_sections:
+            with tracing.span("report_section"):
+                self._log_task(i, task, outcome)
+        if self.journal is None or outcome["status"] in UNSCORED_STATUSES:
+            return
+        record = {key: value for key, value in outcome.items() if key != "verdict"}
+        record.update({
+            "index": i,
+            "task_id": task.get_id(),
+            "elapsed": round(self.elapsed_offset + time.time() - self._start_time, 2),
+        })
+        with tracing.span("journal"):
+            self.journal.append(record)
+
+    def _collect(self, i: int, task, future):
+        """
+        等待第 i 个任务完成并记录结果（报告段落已在任务完成时写入）。
+        """
+        outcome = future.result()
+        if outcome["verdict"] is not None:
+            # 等待裁判阶段完成评分
+            outcome = outcome["verdict"].result()
+        with tracing.span("record"):
+            self._record_result(task, outcome)
+
+    def _record_result(self, task, outcome: dict):
+        """
+        将已完成任务的结果加入 self.results，并按价格表计算被测模型与裁判的费用。
+        数据集任务的一行只并入其父任务的汇总项，完整结果写入结果库。
+        """
+        usage = outcome.get("usage", {})
+        judge_usage = outcome.get("judge_usage", {})
+        result = {
+            "task_id": task.get_id(),
+            "task_name": task.get_name(),
+            "category": task.get_category(),
+            "execution_time": outcome["execution_time"],
+            "cached": outcome["cached"],
+            "status": outcome.get("status", STATUS_OK),
+            "metrics": outcome.get("metrics", {}),
+            "timings": outcome.get("timings", {}),
+            "endpoint": outcome.get("endpoint"),
+            "usage": usage,
+            "judge_usage": judge_usage,
+            "cost": self.price_table.cost(self.model_adapter.model_id, usage),
+            "judge_cost": self.price_table.cost(getattr(self.judger, "JUDGE_MODEL_ID", ""), judge_usage) if judge_usage else None,
+            "requires_judge": task.requires_judge(),
+            "judge_skipped": outcome.get("judge_skipped", False),
+            "score": outcome["score"],
+            "reason": outcome["reason"],
+        }
+        if outcome.get("sample_stats"):
+            result.update({
+                "sample_scores": [sample["score"] for sample in outcome["samples"]],
+                "sample_stats": outcome["sample_stats"],
+                "deduplicated": outcome.get("deduplicated", 0),
+            })
+        if self.results_store is not None:
+            self.results_store.add_result(self.run_id, self.model_adapter.model_id, result, outcome)
+        self.total_execution_time = round(self.total_execution_time + outcome["execution_time"], 2)
+        parent = getattr(task, "parent", None)
+        if parent is None:
+            self.results.append(result)
+        else:
+            self._fold_dataset_result(parent, result)
+
+    def _fold_dataset_result(self, parent, result: dict):
+        """
+        将数据集任务一行的结果并入父任务的汇总项，父任务在 self.results 中只占一项：
+        得分为计分行（请求成功的行）的平均分，耗时、用量与费用累加，流式指标与服务端计时取各行的平均。
+        超出时间预算的行单独计数，既不计分也不算作失败。
+        汇总项的大小与数据集行数无关。
+        """
+        entry = self._dataset_results.get(parent.get_id())
+        if entry is None:
+            entry = {
+                "task_id": parent.get_id(),
+                "task_name": parent.get_name(),
+                "category": parent.get_category(),
+                "execution_time": 0.0,
+                "cached": True,
+                "status": result["status"],
+                "metrics": {},
+                "timings": {},
+                "endpoint": None,
+                "usage": make_usage(),
+                "judge_usage": make_usage(),
+                "cost": None,
+                "judge_cost": None,
+                "requires_judge": result["requires_judge"],
+                "judge_skipped": True,
+                "score": 0.0,
+                "reason": "",
+                "dataset": {"instances": 0, "scored": 0, "failed": 0, "out_of_time": 0, "cached": 0, "score_total": 0.0, "metrics": 0, "timings": 0},
+            }
+            self._dataset_results[parent.get_id()] = entry
+            self.results.append(entry)
+        stats = entry["dataset"]
+        stats["instances"] += 1
+        stats["cached"] += int(bool(result["cached"]))
+        entry["execution_time"] = round(entry["execution_time"] + result["execution_time"], 2)
+        entry["cached"] = entry["cached"] and result["cached"]
+        entry["judge_skipped"] = entry["judge_skipped"] and result["judge_skipped"]
+        entry["usage"] = add_usage(entry["usage"], result["usage"])
+        entry["judge_usage"] = add_usage(entry["judge_usage"], result["judge_usage"])
+        entry["cost"] = _sum_costs((entry["cost"], result["cost"]))
+        entry["judge_cost"] = _sum_costs((entry["judge_cost"], result["judge_cost"]))
+        if result["status"] == STATUS_OUT_OF_TIME:
+            stats["out_of_time"] += 1
+        elif result["status"] in FAILED_STATUSES:
+            stats["failed"] += 1
+        else:
+            # 只要有一行请求成功，父任务就计入得分
+            entry["status"] = STATUS_OK
+            stats["scored"] += 1
+            stats["score_total"] = round(stats["score_total"] + result["score"], 4)
+            entry["score"] = round(stats["score_total"] / stats["scored"], 2)
+        if result["metrics"]:
+            stats["metrics"] += 1
+            entry["metrics"] = _running_mean(entry["metrics"], result["metrics"], stats["metrics"])
+        if result["timings"]:
+            stats["timings"] += 1
+            entry["timings"] = _running_mean(entry["timings"], result["timings"], stats["timings"])
+        if result.get("sample_stats"):
+            accumulator = self._dataset_sample_stats.setdefault(parent.get_id(), SampleStatsAccumulator())
+            accumulator.add(result["sample_stats"])
+            entry["sample_stats"] = accumulator.result()
+            entry["deduplicated"] = entry.get("deduplicated", 0) + result["deduplicated"]
+        entry["reason"] = f"数据集共 {stats['instances']} 行，计分 {stats['scored']} 行，平均分 {entry['score']}"
+
+    def _log_task(self, i: int, task, outcome: dict):
+        """
+        在内存中拼装第 i 个任务的报告段落，整段交给报告写入器，由其按任务顺序写入文件。
+        """
+        section = ReportSection()
+        section.info(f"## Task {i+1}: {task.get_name()} ")
+        section.info(f"**分类**: {task.get_category()}\n")  # ✅ 记录分类
+        section.info("### 提示词\n")
+        section.info("```markdown\n" + outcome["prompt"] + "\n```")
+        section.info("### 模型响应\n")
+
+        if outcome["timed_out"]:
+            if outcome.get("status") == STATUS_THINKING_BUDGET:
+                section.info(f"思考超出预算，已中断！\n{outcome['response']}\n\n")
+            else:
+                section.info(f"模型超时！\n{outcome['response']}\n\n")
+        elif outcome.get("status") == STATUS_OUT_OF_TIME:
+            section.info(f"超出时间预算（OOT），不计入得分！\n{outcome['response']}\n\n")
+        elif outcome.get("status") in FAILED_STATUSES and outcome["response"].startswith("Error"):
+            section.info(f"请求失败（{outcome['status']}），不计入得分！\n{outcome['response']}\n\n")
+        else:
+            if outcome["cached"]:
+                section.info("模型输出耗时：命中缓存（不计入耗时）\n\n")
+            else:
+                section.info(f"模型输出耗时：{outcome['execution_time']}s\n\n")
+            if outcome.get("endpoint"):
+                section.info(f"服务端副本：{outcome['endpoint']}\n\n")
+            metrics = outcome.get("metrics")
+            if metrics:
+                section.info(
+                    f"首 token 延迟：{metrics['ttft']}s，token 间延迟 p50/p90/p99：{metrics['itl_p50']}/{metrics['itl_p90']}/{metrics['itl_p99']}s，"
+                    f"输出 {metrics['output_tokens']} tokens，解码速度 {metrics['tokens_per_sec']} tokens/s\n\n"
+                )
+                if "thinking_tokens" in metrics:
+                    section.info(f"思考：{metrics['thinking_tokens']} tokens，耗时 {metrics['thinking_time']}s\n\n")
+            timings = outcome.get("timings")
+            if timings:
+                section.info(f"服务端计时：{format_timings(timings)}\n\n")
+            samples = outcome.get("samples")
+            if samples:
+                for j, sample in enumerate(samples, start=1):
+                    section.info(f"模型输出（采样 {j}/{len(samples)}）：\n")
+                    section.info("```markdown\n" + sample["response"] + "\n```\n")
+            else:
+                section.info(f"模型输出：\n")
+                section.info("```markdown\n" + outcome["response"] + "\n```\n")
+
+        usage = outcome.get("usage")
+        if usage:
+            section.info(
+                f"Token 用量：输入 {usage['prompt_tokens']}，输出 {usage['completion_tokens']}（其中思考 {usage['reasoning_tokens']}）\n\n"
+            )
+
+        section.info("### 评价结果\n")
+        section.info(f"📊回答评分: **{outcome['score']}**\n")
+        stats = outcome.get("sample_stats")
+        if stats:
+            section.info(
+                f"{stats['n']} 次采样：标准差 {stats['std']}，95% 置信区间 [{stats['ci_low']}, {stats['ci_high']}]，"
+                f"pass@1 {stats['pass@1']}，pass@{stats['n']} {stats['pass@k']}（通过线 {self.pass_score}）\n"
+            )
+            if outcome.get("deduplicated"):
+                section.info(f"重复回答去重省去评分: {outcome['deduplicated']} 次\n")
+            for j, sample in enumerate(outcome["samples"], start=1):
+                section.info(f"- 采样 {j}: **{sample['score']}**，{sample['reason']}")
+            section.info("")
+        else:
+            section.info(f"评分理由: {outcome['reason']}\n")
+
+        self.benchmark_logger.write_section(i, section.text())
 
     def get_summary(self):
         """
         按类别汇总统计，输出每个类别的平均分。
         """
         # ============ 1. 按类别分组统计 ============
+        # 请求失败（限流、错误）和超出时间预算的任务不计入得分
+        scored_results = [res for res in self.results if res.get("status", STATUS_OK) not in UNSCORED_STATUSES]
+        out_of_time = [res for res in self.results if res.get("status") == STATUS_OUT_OF_TIME]
+        failed_tasks = len(self.results) - len(scored_results) - len(out_of_time)
         category_scores = defaultdict(list)
         for res in self.results:
+            category_scores[res["category"]]
+        for res in scored_results:
             category_scores[res["category"]].append(res["score"])
         
         # 计算每个类别的平均分
@@ -115,43 +638,212 @@ class BenchmarkRunner:
             category_avg[category] = {
                 "average": avg,
                 "count": len(scores),
-                "total": round(sum(scores), 2)
+                "total": round(sum(scores), 2),
+                "out_of_time": sum(1 for res in out_of_time if res["category"] == category),
             }
         
+        # 流式生成指标按类别取平均（只统计有指标的任务）
+        category_metrics = defaultdict(list)
+        for res in self.results:
+            if res.get("metrics"):
+                category_metrics[res["category"]].append(res["metrics"])
+        for category, metrics_list in category_metrics.items():
+            category_avg[category]["stream_metrics"] = {
+                "ttft": round(mean([m["ttft"] for m in metrics_list]), 4),
+                "itl_p50": round(mean([m["itl_p50"] for m in metrics_list]), 4),
+                "itl_p99": round(mean([m["itl_p99"] for m in metrics_list]), 4),
+                "output_tokens": sum(m["output_tokens"] for m in metrics_list),
+                "tokens_per_sec": round(mean([m["tokens_per_sec"] for m in metrics_list]), 2),
+                # 思考 token 数与平均思考耗时（只统计有思考内容的任务）
+                "thinking_tokens": sum(m.get("thinking_tokens", 0) for m in metrics_list),
+                "thinking_time": round(mean([m["thinking_time"] for m in metrics_list if "thinking_time" in m]), 2),
+            }
+
+        # 服务端计时（Ollama 的模型加载、提示词处理、解码）按类别汇总
+        category_timings = defaultdict(list)
+        for res in self.results:
+            if res.get("timings"):
+                category_timings[res["category"]].append(res["timings"])
+        for category, timings_list in category_timings.items():
+            category_avg[category]["server_timings"] = summarize_timings(timings_list)
+        server_timings = summarize_timings([res["timings"] for res in self.results if res.get("timings")])
+
+        # 多个服务端副本时，按副本统计处理的任务数与平均耗时
+        endpoint_summary = {}
+        for res in self.results:
+            if res.get("endpoint"):
+                entry = endpoint_summary.setdefault(res["endpoint"], {"tasks": 0, "execution_time": 0.0})
+                entry["tasks"] += 1
+                entry["execution_time"] = round(entry["execution_time"] + res["execution_time"], 2)
+        for entry in endpoint_summary.values():
+            entry["average_execution_time"] = round(entry["execution_time"] / entry["tasks"], 2)
+
+        # Token 用量与费用按类别累计
+        for category in category_avg:
+            category_results = [res for res in self.results if res["category"] == category]
+            category_avg[category].update(self._usage_totals(category_results))
+
+        # 多次采样统计按类别汇总
+        category_sample_stats = defaultdict(list)
+        for res in self.results:
+            if res.get("sample_stats"):
+                category_sample_stats[res["category"]].append(res["sample_stats"])
+        for category, stats_list in category_sample_stats.items():
+            category_avg[category]["sample_stats"] = aggregate_sample_statistics(stats_list)
+
         # 按类别名排序，保证输出顺序一致
         sorted_categories = sorted(category_avg.keys())
         
         # ============ 2. 计算总平均分 ============
-        total_score = sum(res["score"] for res in self.results)
-        total_count = len(self.results)
+        total_score = sum(res["score"] for res in scored_results)
+        total_count = len(scored_results)
         overall_average = round(total_score / total_count, 2) if total_count > 0 else 0
+        cache_hits = sum(1 for res in self.results if res.get("cached"))
+        judged_tasks = sum(1 for res in self.results if res.get("requires_judge"))
+        judge_calls_avoided = sum(1 for res in self.results if res.get("judge_skipped"))
+        usage_totals = self._usage_totals(self.results)
+        deduplicated = sum(res.get("deduplicated", 0) for res in self.results)
+        overall_sample_stats = aggregate_sample_statistics([res["sample_stats"] for res in self.results if res.get("sample_stats")])
         
         # ============ 3. 生成 Markdown 表格（按类别） ============
-        # 表头：| 模型名 | 类别1 | 类别2 | ... | 总平均分 | 耗时(s) |
-        header_row = "| 模型名 | " + " | ".join(sorted_categories) + " | 总平均分 | 耗时(s) |"
+        # 表头：| 模型名 | 类别1 | 类别2 | ... | 总平均分 | 耗时(s) | Token 开销 |
+        header_row = "| 模型名 | " + " | ".join(sorted_categories) + " | 总平均分 | 耗时(s) | Token 开销 |"
         
         # 分割线
-        separator_row = "|---" * (len(sorted_categories) + 3) + "|"
+        separator_row = "|---" * (len(sorted_categories) + 4) + "|"
         
         # 数据行：各类别平均分
-        category_scores_str = [str(category_avg[cat]["average"]) for cat in sorted_categories]
-        data_row = f"| {self.model_adapter.model_id} | " + " | ".join(category_scores_str) + f" | {overall_average} | {self.total_execution_time} |"
+        category_scores_str = [format_average(category_avg[cat]) for cat in sorted_categories]
+        data_row = f"| {self.model_adapter.model_id} | " + " | ".join(category_scores_str) + f" | {overall_average} | {self.total_execution_time} | {format_cost(usage_totals['cost'])} |"
         
         # ============ 4. 打印详细日志 ============
         self.benchmark_logger.info("## 最终评价摘要\n")
         self.benchmark_logger.info(f"测评模型: {self.model_adapter.model_id}\n")
         self.benchmark_logger.info(f"测评耗时: {self.total_benchmark_time}s\n")
+        if failed_tasks:
+            self.benchmark_logger.info(f"请求失败: {failed_tasks} 个任务未计入得分（限流或请求错误，可使用 --resume 重新运行）\n")
+        time_budget = self.scheduler.summary() if self.scheduler is not None else None
+        if time_budget:
+            mae = f"，预测耗时平均误差 {time_budget['prediction_mae']}s" if time_budget["prediction_mae"] is not None else ""
+            self.benchmark_logger.info(
+                f"时间预算: {time_budget['budget']}s，{len(out_of_time)} 个任务超出时间预算（OOT）未计入得分（可使用 --resume 继续运行），"
+                f"{time_budget['predicted_from_history']} 个任务按历史耗时预测{mae}\n"
+            )
+        if cache_hits:
+            self.benchmark_logger.info(f"缓存命中: {cache_hits}/{total_count}（命中缓存的任务不计入耗时）\n")
+        if judge_calls_avoided:
+            self.benchmark_logger.info(f"规则预检省去裁判调用: {judge_calls_avoided}/{judged_tasks} 个 LLM 评分任务\n")
+        self.benchmark_logger.info(
+            f"Token 用量: 被测模型输入 {usage_totals['token_usage']['prompt_tokens']} / 输出 {usage_totals['token_usage']['completion_tokens']}，"
+            f"裁判输入 {usage_totals['judge_token_usage']['prompt_tokens']} / 输出 {usage_totals['judge_token_usage']['completion_tokens']}\n"
+        )
+        self.benchmark_logger.info(f"费用: 被测模型 {format_cost(usage_totals['cost'])}，裁判 {format_cost(usage_totals['judge_cost'])}\n")
+        if overall_sample_stats:
+            self.benchmark_logger.info(
+                f"多次采样: 每个任务 {self.samples} 次，总平均分 95% 置信区间 [{overall_sample_stats['ci_low']}, {overall_sample_stats['ci_high']}]，"
+                f"pass@1 {overall_sample_stats['pass@1']}，pass@{self.samples} {overall_sample_stats['pass@k']}（通过线 {self.pass_score}）\n"
+            )
+            if deduplicated:
+                self.benchmark_logger.info(f"重复回答去重省去评分: {deduplicated} 次\n")
+        if server_timings:
+            self.benchmark_logger.info(
+                f"服务端计时: 模型加载共 {server_timings['load_duration']}s（其中 {server_timings['reloads']} 个任务加载超过 {RELOAD_THRESHOLD}s，可能是模型被换出后重新加载，已从耗时中扣除），"
+                f"提示词处理共 {server_timings['prompt_eval_duration']}s，解码共 {server_timings['eval_duration']}s\n"
+            )
         self.benchmark_logger.info(f"📊 总平均分: {overall_average}\n\n")
         
         # 打印各类别详情
         self.benchmark_logger.info("### 各类别得分详情\n")
-        self.benchmark_logger.info("| 类别 | 任务数 | 类别总分 | 类别平均分 |")
-        self.benchmark_logger.info("|---|---|---|---|")
+        self.benchmark_logger.info("| 类别 | 任务数 | 类别总分 | 类别平均分 | 输入 tokens | 输出 tokens | 费用 | 裁判费用 |")
+        self.benchmark_logger.info("|---|---|---|---|---|---|---|---|")
         for cat in sorted_categories:
             info = category_avg[cat]
-            self.benchmark_logger.info(f"| {cat} | {info['count']} | {info['total']} | {info['average']} |")
+            self.benchmark_logger.info(
+                f"| {cat} | {info['count']} | {info['total']} | {format_average(info)} | "
+                f"{info['token_usage']['prompt_tokens']} | {info['token_usage']['completion_tokens']} | "
+                f"{format_cost(info['cost'])} | {format_cost(info['judge_cost'])} |"
+            )
         self.benchmark_logger.info("\n")
+
+        if category_metrics:
+            self.benchmark_logger.info("### 各类别流式生成指标\n")
+            self.benchmark_logger.info("| 类别 | 平均首 token 延迟(s) | token 间延迟 p50(s) | token 间延迟 p99(s) | 输出 tokens | 平均解码速度(tokens/s) | 思考 tokens | 平均思考耗时(s) |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|---|---|")
+            for cat in sorted_categories:
+                if "stream_metrics" not in category_avg[cat]:
+                    continue
+                m = category_avg[cat]["stream_metrics"]
+                self.benchmark_logger.info(f"| {cat} | {m['ttft']} | {m['itl_p50']} | {m['itl_p99']} | {m['output_tokens']} | {m['tokens_per_sec']} | {m['thinking_tokens']} | {m['thinking_time']} |")
+            self.benchmark_logger.info("\n")
         
+        if category_timings:
+            self.benchmark_logger.info("### 各类别服务端计时\n")
+            self.benchmark_logger.info("| 类别 | 模型加载(s) | 提示词处理(s) | 解码(s) | 平均提示词处理速度(tokens/s) | 平均解码速度(tokens/s) |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|")
+            for cat in sorted_categories:
+                if "server_timings" not in category_avg[cat]:
+                    continue
+                t = category_avg[cat]["server_timings"]
+                self.benchmark_logger.info(f"| {cat} | {t['load_duration']} | {t['prompt_eval_duration']} | {t['eval_duration']} | {t['prompt_eval_rate']} | {t['eval_rate']} |")
+            self.benchmark_logger.info("\n")
+
+        if endpoint_summary:
+            self.benchmark_logger.info("### 各服务端副本负载\n")
+            self.benchmark_logger.info("| 副本 | 任务数 | 总耗时(s) | 平均耗时(s) |")
+            self.benchmark_logger.info("|---|---|---|---|")
+            for endpoint, entry in sorted(endpoint_summary.items()):
+                self.benchmark_logger.info(f"| {endpoint} | {entry['tasks']} | {entry['execution_time']} | {entry['average_execution_time']} |")
+            self.benchmark_logger.info("\n")
+
+        dataset_results = list(self._dataset_results.values())
+        if dataset_results:
+            self.benchmark_logger.info("### 数据集任务\n")
+            self.benchmark_logger.info("| 任务 | 类别 | 行数 | 计分行数 | 失败行数 | OOT 行数 | 缓存命中 | 平均分 | 耗时(s) |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|---|---|---|")
+            for res in dataset_results:
+                d = res["dataset"]
+                self.benchmark_logger.info(
+                    f"| {res['task_name']} | {res['category']} | {d['instances']} | {d['scored']} | {d['failed']} | "
+                    f"{d['out_of_time']} | {d['cached']} | {res['score']} | {res['execution_time']} |"
+                )
+            self.benchmark_logger.info("\n")
+
+        if category_sample_stats:
+            self.benchmark_logger.info("### 各类别多次采样统计\n")
+            self.benchmark_logger.info(f"| 类别 | 平均分 | 平均标准差 | 95% 置信区间 | pass@1 | pass@{self.samples} |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|")
+            for cat in sorted_categories:
+                if "sample_stats" not in category_avg[cat]:
+                    continue
+                st = category_avg[cat]["sample_stats"]
+                self.benchmark_logger.info(f"| {cat} | {st['mean']} | {st['std']} | [{st['ci_low']}, {st['ci_high']}] | {st['pass@1']} | {st['pass@k']} |")
+            self.benchmark_logger.info("\n")
+
+        if out_of_time:
+            self.benchmark_logger.info("### 超出时间预算的任务\n")
+            self.benchmark_logger.info("| 任务 | 类别 | 原因 |")
+            self.benchmark_logger.info("|---|---|---|")
+            for res in out_of_time:
+                self.benchmark_logger.info(f"| {res['task_id']} | {res['category']} | {res['reason']} |")
+            self.benchmark_logger.info("\n")
+
+        stage_latency = self.tracer.stage_summary()
+        if stage_latency["stages"]:
+            # 各阶段在多个线程中并行，总耗时之和可能超过运行时间；阶段之间有嵌套（如 request 包含在 generate 与 judge 中）
+            self.benchmark_logger.info("### 各阶段耗时分布\n")
+            self.benchmark_logger.info("| 阶段 | 次数 | 总耗时(s) | p50(ms) | p95(ms) | p99(ms) |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|")
+            for stage, d in stage_latency["stages"].items():
+                self.benchmark_logger.info(f"| {stage} | {d['count']} | {d['total_s']} | {d['p50_ms']} | {d['p95_ms']} | {d['p99_ms']} |")
+            self.benchmark_logger.info("\n")
+        if stage_latency["endpoints"]:
+            self.benchmark_logger.info("### 各端点请求耗时分布\n")
+            self.benchmark_logger.info("| 阶段 | 端点 | 次数 | 总耗时(s) | p50(ms) | p95(ms) | p99(ms) |")
+            self.benchmark_logger.info("|---|---|---|---|---|---|---|")
+            for d in stage_latency["endpoints"].values():
+                self.benchmark_logger.info(f"| {d['stage']} | {d['endpoint']} | {d['count']} | {d['total_s']} | {d['p50_ms']} | {d['p95_ms']} | {d['p99_ms']} |")
+            self.benchmark_logger.info("\n")
+
         # 打印汇总表格
         self.benchmark_logger.info("### 汇总表格\n")
         self.benchmark_logger.info(f"{header_row}\n{separator_row}\n{data_row}\n")
@@ -160,9 +852,109 @@ class BenchmarkRunner:
         summary = {
             "model_id": self.model_adapter.model_id,
             "total_tasks": total_count,
+            "failed_tasks": failed_tasks,
+            "out_of_time_tasks": len(out_of_time),
+            "time_budget": time_budget,
             "overall_average": overall_average,
             "total_execution_time": self.total_execution_time,
             "total_benchmark_time": self.total_benchmark_time,
+            "cache_hits": cache_hits,
+            "judge_calls_avoided": judge_calls_avoided,
+            "server_timings": server_timings,
+            "endpoint_summary": endpoint_summary,
+            "stage_latency": stage_latency,
+            "dataset_tasks": {
+                res["task_id"]: {
+                    **{key: res["dataset"][key] for key in ("instances", "scored", "failed", "out_of_time", "cached")},
+                    "average": res["score"],
+                }
+                for res in dataset_results
+            },
+            **usage_totals,
+            "samples": self.samples,
+            "sample_stats": overall_sample_stats,
+            "deduplicated": deduplicated,
             "category_summary": category_avg,  # ✅ 各类别统计
         }
-        return summary
\ No newline at end of file
+        return summary
+
+    @staticmethod
+    def _usage_totals(results: List[dict]) -> dict:
+        """
+        累计一组任务结果的 token 用量与费用。费用在价格表中缺失时为 None。
+        """
+        token_usage, judge_token_usage = make_usage(), make_usage()
+        for res in results:
+            token_usage = add_usage(token_usage, res.get("usage", {}))
+            judge_token_usage = add_usage(judge_token_usage, res.get("judge_usage", {}))
+        return {
+            "token_usage": token_usage,
+            "judge_token_usage": judge_token_usage,
+            "cost": _sum_costs(res.get("cost") for res in results),
+            "judge_cost": _sum_costs(res.get("judge_cost") for res in results),
+        }
+
+
+def incomplete_reason(status: str) -> str:
+    """没有给出完整回答（计 0 分）的任务（或采样）的评分理由。"""
+    if status == STATUS_THINKING_BUDGET:
+        return "思考超出预算，已提前中断，未给出回答"
+    return "无法在规定时间内生成完整响应"
+
+def unscored_reason(status: str) -> str:
+    """不计分的任务（或采样）的评分理由。"""
+    if status == STATUS_OUT_OF_TIME:
+        return "超出时间预算，不计入得分"
+    return f"请求失败（{status}），不计入得分"
+
+def format_average(category_info: dict) -> str:
+    """榜单中的类别平均分：该类别的任务全部超出时间预算时显示 OOT。"""
+    if not category_info["count"] and category_info.get("out_of_time"):
+        return "OOT"
+    return str(category_info["average"])
+
+def _running_mean(average: dict, values: dict, count: int) -> dict:
+    """将第 count 组取值并入各键的平均值。"""
+    return {
+        key: round(average.get(key, 0.0) + (value - average.get(key, 0.0)) / count, 4)
+        for key, value in values.items()
+    }
+
+def _sum_costs(costs) -> float:
+    """累加费用，忽略未知（None）的部分；全部未知时返回 None。"""
+    known = [cost for cost in costs if cost is not None]
+    return round(sum(known), 6) if known else None
+
+# 单个任务的模型加载耗时超过该秒数时，视为模型被重新加载
+RELOAD_THRESHOLD = 1.0
+
+def summarize_timings(timings_list: List[dict]) -> dict:
+    """
+    汇总一组任务的服务端计时：加载、提示词处理、解码的总耗时（秒），处理速度的平均值，
+    以及加载耗时超过 RELOAD_THRESHOLD 的任务数 reloads。
+    """
+    if not timings_list:
+        return {}
+    summary = {
+        name: round(sum(timings.get(name, 0.0) for timings in timings_list), 4)
+        for name in ("load_duration", "prompt_eval_duration", "eval_duration")
+    }
+    for rate in ("prompt_eval_rate", "eval_rate"):
+        summary[rate] = round(mean([timings[rate] for timings in timings_list if rate in timings]), 2)
+    summary["reloads"] = sum(1 for timings in timings_list if timings.get("load_duration", 0.0) > RELOAD_THRESHOLD)
+    return summary
+
+def format_timings(timings: dict) -> str:
+    parts = []
+    if "load_duration" in timings:
+        parts.append(f"模型加载 {timings['load_duration']}s")
+    if "prompt_eval_duration" in timings:
+        parts.append(f"提示词处理 {timings['prompt_eval_duration']}s（{timings.get('prompt_eval_rate', '-')} tokens/s）")
+    if "eval_duration" in timings:
+        parts.append(f"解码 {timings['eval_duration']}s（{timings.get('eval_rate', '-')} tokens/s）")
+    if "total_duration" in timings:
+        parts.append(f"服务端总耗时 {timings['total_duration']}s")
+    return "，".join(parts)
+
+def format_cost(cost) -> str:
+    return f"${cost:.4f}" if cost is not None else "-"
\ No newline at end of file
@@ -0,0 +1,207 @@
+# benchmarks/bench_harness.py
+"""
+评测框架自身的性能基准：在本地模拟 LLM 服务（mock_server.py）上驱动任务加载、适配器、裁判与 BenchmarkRunner，
+报告吞吐量（tasks/s）、各阶段耗时和内存占用，用于离线发现热路径上的性能回退。
+
+用法：
+    python benchmarks/bench_harness.py                          # 运行全部基准
+    python benchmarks/bench_harness.py --json bench.json        # 保存结果
+    python benchmarks/bench_harness.py --baseline bench.json    # 与之前的结果比较，回退超过阈值时返回非 0
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_runner import BenchmarkRunner
+from evaluate import OpenAIJudger
+from journal import RunJournal
+from logger import setup_markdown_logger
+from mock_server import MockLLMServer
+from model_adapter import build_model_adapter
+from tasks_handler import load_all_tasks
+from tracing import Tracer
+
+TASKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tasks")
+
+
+def bench_task_loading(repeat: int) -> dict:
+    """任务加载：不使用索引（每次完整解析）与使用已建好的索引。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "task_index.json")
+        results = {}
+        for name, path in (("cold", None), ("indexed", index_path)):
+            load_all_tasks(TASKS_DIR, index_path=path)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                tasks = load_all_tasks(TASKS_DIR, index_path=path)
+            elapsed = time.perf_counter() - start
+            results[name] = {"per_load_ms": round(elapsed / repeat * 1000, 3), "tasks": len(tasks)}
+        return results
+
+
+def bench_adapters(server_url: str, requests: int) -> dict:
+    """适配器单次请求的客户端开销（服务端延迟为 0 时的往返耗时）。"""
+    results = {}
+    for adapter_type, api_base in (("openai", server_url + "/v1"), ("ollama", server_url)):
+        for stream in (False, True):
+            adapter = build_model_adapter(adapter_type, api_key="mock", model_id="mock", api_base=api_base, stream=stream)
+            adapter.complete("warm up")
+            start = time.perf_counter()
+            for i in range(requests):
+                adapter.complete(f"prompt {i}")
+            elapsed = time.perf_counter() - start
+            results[f"{adapter_type}{'-stream' if stream else ''}"] = {
+                "requests_per_sec": round(requests / elapsed, 1),
+                "per_request_ms": round(elapsed / requests * 1000, 3),
+            }
+    return results
+
+
+def bench_judge(server_url: str, requests: int) -> dict:
+    """裁判评分（构造提示词、请求、解析分数）的单次开销，以及批量评分的单条开销。"""
+    judger = OpenAIJudger(api_key="mock", api_base=server_url + "/v1")
+    judger.judge("warm up", "warm up")
+    start = time.perf_counter()
+    for i in range(requests):
+        judger.judge("若回答正确则 100 分", f"answer {i}")
+    single = time.perf_counter() - start
+
+    batch_size = 8
+    items = [("若回答正确则 100 分", f"answer {i}", "bench") for i in range(batch_size)]
+    start = time.perf_counter()
+    for _ in range(max(1, requests // batch_size)):
+        judger.judge_batch(items)
+    batched = time.perf_counter() - start
+    return {
+        "single_per_item_ms": round(single / requests * 1000, 3),
+        "batch_per_item_ms": round(batched / (max(1, requests // batch_size) * batch_size) * 1000, 3),
+    }
+
+
+def bench_runner(server_url: str, repeat: int, concurrency: int, judge_workers: int, trace_memory: bool = False) -> dict:
+    """
+    用完整的 BenchmarkRunner 跑 repeat 遍题库，报告吞吐量和 Runner 自身记录的各阶段耗时分布。
+    各阶段耗时在多个线程中累计，总和可能超过墙钟时间。
+    tracemalloc 会显著拖慢执行，因此内存峰值（trace_memory=True）需单独跑一遍，不与耗时混在一起。
+    """
+    tasks = [task for _ in range(repeat) for task in load_all_tasks(TASKS_DIR)]
+    adapter = build_model_adapter("openai", api_key="mock", model_id="mock", api_base=server_url + "/v1")
+    judger = OpenAIJudger(api_key="mock", api_base=server_url + "/v1")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = Tracer(max_events=0)
+        benchmark_logger = setup_markdown_logger(os.path.join(tmp, "report.md"))
+        benchmark_logger.tracer = tracer
+        journal = RunJournal(os.path.join(tmp, "run.jsonl"))
+        runner = BenchmarkRunner(adapter, tasks, judger, benchmark_logger=benchmark_logger,
+                                 concurrency=concurrency, judge_workers=judge_workers, journal=journal, tracer=tracer)
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            runner.run()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        journal.close()
+        benchmark_logger.close()
+
+    if trace_memory:
+        return {"peak_traced_mb": round(peak / 1024 / 1024, 2)}
+    return {
+        "tasks": len(tasks),
+        "wall_s": round(elapsed, 3),
+        "tasks_per_sec": round(len(tasks) / elapsed, 1),
+        "stages": tracer.stage_summary()["stages"],
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    比较吞吐量与单次耗时，返回超过容差的回退项。
+    各阶段耗时（stages）在并发下波动较大，仅用于定位热点，不参与比较。
+    """
+    regressions = []
+
+    def walk(current, base, path):
+        for key, value in current.items():
+            if key not in base or key == "stages":
+                continue
+            if isinstance(value, dict):
+                walk(value, base[key], f"{path}{key}.")
+            elif isinstance(value, (int, float)) and base[key]:
+                higher_is_better = key.endswith("per_sec")
+                lower_is_better = key.endswith("_ms")
+                change = (value - base[key]) / base[key]
+                if (higher_is_better and change < -tolerance) or (lower_is_better and change > tolerance):
+                    regressions.append(f"{path}{key}: {base[key]} -> {value} ({change:+.0%})")
+
+    walk(results, baseline, "")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the harness itself against the local mock LLM server")
+    parser.add_argument("--server_url", type=str, default=None, help="Use an already running mock server (python mock_server.py) instead of an in-process one.")
+    parser.add_argument("--latency", type=str, default="fixed:0", help="Latency distribution of the in-process mock server, see mock_server.LatencyModel.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per adapter / judge micro-benchmark.")
+    parser.add_argument("--repeat", type=int, default=30, help="How many times the task set is repeated in the runner benchmark.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--judge_workers", type=int, default=4)
+    parser.add_argument("--json", type=str, default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare with results saved by --json and fail on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression before --baseline fails.")
+    args = parser.parse_args()
+
+    server = None
+    server_url = args.server_url
+    if server_url is None:
+        server = MockLLMServer(latency=args.latency).start()
+        server_url = server.url
+
+    try:
+        results = {
+            "task_loading": bench_task_loading(repeat=50),
+            "adapters": bench_adapters(server_url, args.requests),
+            "judge": bench_judge(server_url, args.requests),
+            "runner": bench_runner(server_url, args.repeat, args.concurrency, args.judge_workers),
+        }
+        results["runner"].update(bench_runner(server_url, args.repeat, args.concurrency, args.judge_workers, trace_memory=True))
+    finally:
+        if server is not None:
+            server.stop()
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n⚠️ Regressions beyond tolerance:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✅ No regressions beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
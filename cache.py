@@ -0,0 +1,193 @@
+# cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """
+    基于 SQLite 的本地键值缓存基类，支持按条目数和存活时间淘汰。
+    同一个实例可在多个工作线程间共享，所有数据库操作都在锁内完成。
+    缓存模式：
+    - read: 优先读取缓存，未命中时正常请求并写入缓存；
+    - write: 总是正常请求，并用新结果覆盖缓存；
+    - off: 不使用缓存。
+    :param path: SQLite 文件路径，所在目录不存在时会自动创建。
+    :param mode: 缓存模式，见上。
+    :param max_entries: 最多保留的条目数，超出时淘汰最久未访问的条目。
+    :param max_age_days: 条目最长保留天数，小于等于 0 表示不过期。
+    """
+    TABLE = "cache"
+    COLUMNS = ()
+    MODES = ("read", "write", "off")
+
+    # 每写入多少次执行一次淘汰
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, mode: str = "read", max_entries: int = 10000, max_age_days: float = 30.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.mode = mode
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = "".join(f", {name} {kind}" for name, kind in self.COLUMNS)
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                f"key TEXT PRIMARY KEY{columns}, created_at REAL, last_access REAL)"
+            )
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_access ON {self.TABLE}(last_access)")
+        self.evict()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def make_key(cls, **fields) -> str:
+        """将所有决定缓存内容的字段序列化后取哈希，作为内容寻址的缓存键。"""
+        return cls.hash_text(json.dumps(fields, sort_keys=True, ensure_ascii=False))
+
+    def _get(self, key: str):
+        if self.mode != "read":
+            return None
+        names = ", ".join(name for name, _ in self.COLUMNS)
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(f"SELECT {names}, created_at FROM {self.TABLE} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age_days > 0 and now - row[-1] > self.max_age_days * 86400:
+                self.conn.execute(f"DELETE FROM {self.TABLE} WHERE key = ?", (key,))
+                return None
+            self.conn.execute(f"UPDATE {self.TABLE} SET last_access = ? WHERE key = ?", (now, key))
+        return dict(zip((name for name, _ in self.COLUMNS), row[:-1]))
+
+    def _put(self, key: str, **values):
+        if self.mode == "off":
+            return
+        names = ["key"] + [name for name, _ in self.COLUMNS] + ["created_at", "last_access"]
+        now = time.time()
+        row = [key] + [values.get(name) for name, _ in self.COLUMNS] + [now, now]
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                row,
+            )
+            self._writes += 1
+            should_evict = self._writes % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并在条目数超过上限时淘汰最久未访问的条目。"""
+        with self._lock, self.conn:
+            if self.max_age_days > 0:
+                self.conn.execute(
+                    f"DELETE FROM {self.TABLE} WHERE created_at < ?",
+                    (time.time() - self.max_age_days * 86400,),
+                )
+            if self.max_entries > 0:
+                self.conn.execute(
+                    f"DELETE FROM {self.TABLE} WHERE key IN ("
+                    f"SELECT key FROM {self.TABLE} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class ResponseCache(SQLiteCache):
+    """
+    模型回答缓存，以模型 ID、api_base、完整请求参数和提示词哈希作为缓存键。
+    """
+    TABLE = "responses"
+    COLUMNS = (("model_id", "TEXT"), ("api_base", "TEXT"), ("prompt_hash", "TEXT"), ("response", "TEXT"))
+
+    def __init__(self, path: str = ".cache/responses.sqlite", mode: str = "read", max_entries: int = 10000, max_age_days: float = 30.0):
+        super().__init__(path, mode, max_entries, max_age_days)
+
+    def key_for(self, adapter, prompt: str, sample: int = 0, n: int = 1) -> str:
+        # 共 n 次采样时，第 sample 次采样实际使用的请求参数（随机种子等）各不相同，因此各自缓存
+        return self.make_key(
+            adapter=type(adapter).__name__,
+            model_id=adapter.model_id,
+            api_base=adapter.api_base,
+            params=adapter.sample_params(sample, n),
+            prompt_hash=self.hash_text(prompt),
+        )
+
+    def lookup(self, adapter, prompt: str, sample: int = 0, n: int = 1):
+        """返回缓存的回答文本，未命中或当前模式不读取缓存时返回 None。"""
+        entry = self._get(self.key_for(adapter, prompt, sample, n))
+        return entry["response"] if entry else None
+
+    def store(self, adapter, prompt: str, response: str, sample: int = 0, n: int = 1):
+        self._put(
+            self.key_for(adapter, prompt, sample, n),
+            model_id=adapter.model_id,
+            api_base=adapter.api_base,
+            prompt_hash=self.hash_text(prompt),
+            response=response,
+        )
+
+
+class VerdictCache(SQLiteCache):
+    """
+    裁判评分缓存，以裁判模型 ID、裁判提示词哈希和归一化后的回答作为缓存键。
+    缓存解析后的分数、理由以及裁判的原始回复，并记录所属任务以便按任务失效。
+    """
+    TABLE = "verdicts"
+    COLUMNS = (
+        ("judge_model_id", "TEXT"),
+        ("task_id", "TEXT"),
+        ("score", "REAL"),
+        ("reason", "TEXT"),
+        ("raw", "TEXT"),
+    )
+
+    def __init__(self, path: str = ".cache/verdicts.sqlite", mode: str = "read", max_entries: int = 10000, max_age_days: float = 30.0):
+        super().__init__(path, mode, max_entries, max_age_days)
+        with self._lock, self.conn:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_task_id ON {self.TABLE}(task_id)")
+
+    def key_for(self, judge_model_id: str, judge_prompt: str, normalized_response: str) -> str:
+        return self.make_key(
+            judge_model_id=judge_model_id,
+            judge_prompt_hash=self.hash_text(judge_prompt),
+            response=normalized_response,
+        )
+
+    def lookup(self, judge_model_id: str, judge_prompt: str, normalized_response: str):
+        """返回缓存的评分 dict（score, reason, raw），未命中时返回 None。"""
+        return self._get(self.key_for(judge_model_id, judge_prompt, normalized_response))
+
+    def store(self, judge_model_id: str, judge_prompt: str, normalized_response: str, task_id: str, score: float, reason: str, raw: str):
+        self._put(
+            self.key_for(judge_model_id, judge_prompt, normalized_response),
+            judge_model_id=judge_model_id,
+            task_id=task_id,
+            score=score,
+            reason=reason,
+            raw=raw,
+        )
+
+    def invalidate_task(self, task_id: str) -> int:
+        """删除某个任务的全部缓存评分（例如修改了任务 YAML 中的评分标准后），返回删除的条目数。"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(f"DELETE FROM {self.TABLE} WHERE task_id = ?", (task_id,))
+        return cursor.rowcount
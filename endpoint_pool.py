@@ -0,0 +1,119 @@
+# endpoint_pool.py
+import threading
+import time
+
+
+def split_endpoints(api_base: str) -> list[str]:
+    """将逗号分隔的多个 api_base 拆分为端点列表，去掉空白和末尾的斜杠。"""
+    return [url.strip().rstrip("/") for url in (api_base or "").split(",") if url.strip()]
+
+
+class Endpoint:
+    """
+    端点池中的一个服务端副本。
+    :param outstanding: 正在处理中的请求数。
+    :param served: 累计分配到该端点的请求数。
+    :param failures: 连续失败的请求数，请求成功后清零。
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.served = 0
+        self.failures = 0
+        self.last_probe_latency = None
+
+
+class EndpointPool:
+    """
+    同一个模型的多个服务端副本（例如多台 GPU 机器上的 Ollama），在副本间做负载均衡。
+    - 选择端点：在健康的端点中选择处理中请求数最少的，相同时选择累计请求数最少的；
+      没有健康的端点时在全部端点中选择，使请求仍能发出并按重试策略处理错误。
+    - 摘除：连续 MAX_FAILURES 次请求失败，或健康检查失败、探测耗时超过 slow_threshold 的端点不再分配请求；
+    - 恢复：后台线程每 check_interval 秒探测一次全部端点，探测正常的端点重新加入轮转。
+    只有一个端点时不启动健康检查。同一个实例可在多个工作线程间共享。
+    :param probe: 探测函数，参数为端点 URL，服务正常时正常返回，否则抛出异常。为 None 时不做健康检查。
+    :param check_interval: 健康检查间隔秒数，小于等于 0 时不做健康检查（只按请求失败摘除，摘除后不会恢复，除非全部端点都被摘除）。
+    :param slow_threshold: 探测耗时超过该秒数的端点视为过慢，暂时摘除。为 None 时不检查。
+    """
+    MAX_FAILURES = 3
+
+    def __init__(self, urls: list[str], probe=None, check_interval: float = 30.0, slow_threshold: float = None):
+        if not urls:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.probe = probe
+        self.check_interval = check_interval
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def acquire(self) -> Endpoint:
+        """选出一个端点并将其处理中请求数加一，请求结束后必须调用 release。"""
+        self._start_checker()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy] or self.endpoints
+            endpoint = min(candidates, key=lambda endpoint: (endpoint.outstanding, endpoint.served))
+            endpoint.outstanding += 1
+            endpoint.served += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, failed: bool = False):
+        """请求结束。连续失败 MAX_FAILURES 次的端点被摘除，等待健康检查恢复。"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if not failed:
+                endpoint.failures = 0
+                return
+            endpoint.failures += 1
+            if endpoint.healthy and endpoint.failures >= self.MAX_FAILURES and len(self.endpoints) > 1:
+                endpoint.healthy = False
+                print(f"⚠️ Endpoint {endpoint.url} taken out of rotation after {endpoint.failures} consecutive failures")
+
+    def check(self):
+        """探测全部端点并更新其健康状态。"""
+        for endpoint in self.endpoints:
+            start = time.perf_counter()
+            try:
+                self.probe(endpoint.url)
+                latency = time.perf_counter() - start
+                healthy = self.slow_threshold is None or latency <= self.slow_threshold
+            except Exception:
+                latency = None
+                healthy = False
+            with self._lock:
+                endpoint.last_probe_latency = latency
+                if healthy != endpoint.healthy:
+                    state = "back in rotation" if healthy else ("too slow" if latency is not None else "unreachable") + ", taken out of rotation"
+                    print(f"{'✅' if healthy else '⚠️'} Endpoint {endpoint.url} {state}")
+                endpoint.healthy = healthy
+                if healthy:
+                    endpoint.failures = 0
+
+    def _start_checker(self):
+        if self._checker is not None or self.probe is None or self.check_interval <= 0 or len(self.endpoints) < 2:
+            return
+        with self._lock:
+            if self._checker is not None:
+                return
+            self._checker = threading.Thread(target=self._check_loop, name="endpoint-health", daemon=True)
+            self._checker.start()
+
+    def _check_loop(self):
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def stats(self) -> dict:
+        """各端点的状态：是否健康、处理中的请求数、累计请求数。"""
+        with self._lock:
+            return {
+                endpoint.url: {"healthy": endpoint.healthy, "outstanding": endpoint.outstanding, "served": endpoint.served}
+                for endpoint in self.endpoints
+            }
+
+    def close(self):
+        self._stop.set()
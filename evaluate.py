@@ -1,12 +1,52 @@
 import re
-from model_adapter import OpenAIAdapter, OllamaAdapter
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import tracing
+from model_adapter import STATUS_OK, add_usage, entry_point_targets, load_object
 
-class OpenAIJudger(OpenAIAdapter):
-    def __init__(self, model_id: str = "gpt-4o", api_key: str = "sk-your-judge-api-key", api_base: str = "https://api.openai.com/v1"):
+
+@dataclass
+class Verdict:
+    """
+    一次评分的结果。
+    :param score: 分数。
+    :param reason: 评分理由。
+    :param raw: 裁判的原始回复（非 LLM 评分时为空）。
+    :param cached: 是否来自裁判评分缓存。
+    :param usage: 裁判调用的 token 用量，未调用裁判时为空。
+    :param judge_skipped: LLM 评分任务是否由规则预检直接判定、省去了裁判调用。
+    :param status: 裁判请求的状态（model_adapter.STATUS_*），请求失败时分数无效。
+    """
+    score: float
+    reason: str
+    raw: str = ""
+    cached: bool = False
+    usage: dict = field(default_factory=dict)
+    judge_skipped: bool = False
+    status: str = STATUS_OK
+
+class BaseJudger:
+    """
+    LLM 裁判的基类。
+    裁判适配器在初始化时创建一次，之后所有评分请求复用同一个连接池，可在多个工作线程间共享。
+    """
+    def __init__(self, model_id: str, api_key: str, api_base: str, pool_size: int = 10, keepalive: float = 30.0):
         self.JUDGE_MODEL_ID = model_id
         # 确保裁判模型有自己的API Key
         self.JUDGE_API_KEY = api_key
         self.JUDGE_API_BASE = api_base
+        # 初始化裁判适配器（在这里导入，只在真正创建裁判时才加载 openai）
+        from openai_adapter import OpenAIAdapter
+        self.judge_adapter = OpenAIAdapter(
+            api_key=self.JUDGE_API_KEY,
+            model_id=self.JUDGE_MODEL_ID,
+            api_base=self.JUDGE_API_BASE,
+            pool_size=pool_size,
+            keepalive=keepalive,
+        )
+        # 可选的裁判评分缓存（cache.VerdictCache），为 None 时不使用缓存
+        self.verdict_cache = None
 
     def get_name(self) -> str:
         return "Use LLM to Judge LLM's output"
@@ -30,77 +70,252 @@ class OpenAIJudger(OpenAIAdapter):
         Reason: [Your brief justification for the score]
         """
 
-    def evaluate(self, evaluation_standard: str, response: str) -> tuple[float, str]:
-        # 初始化裁判适配器
-        judge_adapter = OpenAIAdapter(api_key=self.JUDGE_API_KEY, model_id=self.JUDGE_MODEL_ID, api_base=self.JUDGE_API_BASE)
-        
+    @staticmethod
+    def normalize_response(response: str) -> str:
+        """归一化待评分的回答：去掉首尾空白并合并连续空白，使仅有空白差异的回答共享缓存。"""
+        return re.sub(r"\s+", " ", response.strip())
+
+    def _parse_judge_response(self, judge_response: str):
+        """
+        从裁判的回复中提取分数和理由。
+        :return: (分数, 理由)，无法解析时返回 None。
+        """
+        score_match = re.search(r"Score:\s*(\d+\.?\d*)", judge_response)
+        reason_match = re.search(r"Reason:\s*(.*)", judge_response, re.DOTALL)
+
+        if score_match and reason_match:
+            score = float(score_match.group(1)) / 1.0
+            reason = reason_match.group(1).strip()
+            return score, reason
+        return None
+
+    def evaluate(self, evaluation_standard: str, response: str, task_id: str = None) -> tuple[float, str]:
+        """
+        让裁判模型按评分标准为回答打分。
+        :param task_id: 回答所属的任务 ID，写入评分缓存以便按任务失效。
+        :return: 一个元组 (分数, 评估理由)。
+        """
+        verdict = self.judge(evaluation_standard, response, task_id)
+        return verdict.score, verdict.reason
+
+    def judge(self, evaluation_standard: str, response: str, task_id: str = None) -> Verdict:
+        """
+        与 evaluate 相同，但返回包含裁判原始回复和 token 用量的 Verdict。
+        """
+        cached = self._lookup_verdict(evaluation_standard, response)
+        if cached is not None:
+            return cached
+
         judging_prompt = self._get_judge_prompt(evaluation_standard, response)
         # print("Judger Evaluating...")
         # 让裁判模型打分
-        judge_response = judge_adapter.query(judging_prompt)
+        with tracing.span("judge", task_id=task_id):
+            judge_result = self.judge_adapter.complete(judging_prompt)
+        judge_response = judge_result.text
+        if not judge_result.ok:
+            return Verdict(0.0, f"裁判请求失败（{judge_result.status}）: {judge_response}", judge_response, usage=judge_result.usage, status=judge_result.status)
         
-        # 从裁判的回复中提取分数和理由
         try:
-            score_match = re.search(r"Score:\s*(\d+\.?\d*)", judge_response)
-            reason_match = re.search(r"Reason:\s*(.*)", judge_response, re.DOTALL)
-            
-            if score_match and reason_match:
-                score = float(score_match.group(1)) / 1.0
-                reason = reason_match.group(1).strip()
-                return score, f"Judge's Verdict: {reason}"
-            else:
-                return 0.0, f"Could not parse judge's response: {judge_response}"
+            with tracing.span("judge_parse"):
+                parsed = self._parse_judge_response(judge_response)
+            if parsed is None:
+                return Verdict(0.0, f"Could not parse judge's response: {judge_response}", judge_response, usage=judge_result.usage)
+
+            score, reason = parsed
+            self._store_verdict(evaluation_standard, response, task_id, score, reason, judge_response)
+            return Verdict(score, f"Judge's Verdict: {reason}", judge_response, usage=judge_result.usage)
         except Exception as e:
-            return 0.0, f"Error during judging: {e}"
-        
-class OllamaJudger(OllamaAdapter):
-    def __init__(self, model_id: str = "qwen2.5:3b", api_key: str = "sk-your-judge-api-key", api_base: str = "https://127.0.0.1:11434"):
-        self.JUDGE_MODEL_ID = model_id
-        # 确保裁判模型有自己的API Key
-        self.JUDGE_API_KEY = api_key
-        self.JUDGE_API_BASE = api_base
+            return Verdict(0.0, f"Error during judging: {e}", judge_response, usage=judge_result.usage)
 
-    def get_name(self) -> str:
-        return "Use LLM to Judge LLM's output"
+    def _lookup_verdict(self, evaluation_standard: str, response: str):
+        """在裁判评分缓存中查找，未命中或未启用缓存时返回 None。"""
+        if self.verdict_cache is None:
+            return None
+        normalized = self.normalize_response(response)
+        cached = self.verdict_cache.lookup(self.JUDGE_MODEL_ID, self._get_judge_prompt(evaluation_standard, normalized), normalized)
+        if cached is None:
+            return None
+        return Verdict(
+            score=cached["score"],
+            reason=f"Judge's Verdict: {cached['reason']}（评分来自缓存）",
+            raw=cached["raw"],
+            cached=True,
+        )
 
-    def get_description(self) -> str:
-        return "This task uses a separate LLM to evaluate the output of another LLM based on a given prompt"
+    def _store_verdict(self, evaluation_standard: str, response: str, task_id: str, score: float, reason: str, raw: str):
+        if self.verdict_cache is None:
+            return
+        normalized = self.normalize_response(response)
+        self.verdict_cache.store(self.JUDGE_MODEL_ID, self._get_judge_prompt(evaluation_standard, normalized), normalized, task_id, score, reason, raw)
 
-    def _get_judge_prompt(self, evaluation_standard: str, response_to_judge: str) -> str:
-        return f"""
-        你是一个回答评分器，需要根据给定的标准对 AI 的回答进行评分。
+    def _get_batch_judge_prompt(self, items: list[tuple[str, str]]) -> str:
+        """
+        将多个 (评分标准, 回答) 打包为一个评分请求，评分说明只出现一次。
+        """
+        sections = "\n".join(
+            f"""
+        ### Item {number}
 
         [评判要求：]
         {evaluation_standard}
 
         [AI 的回答]
         {response_to_judge}
+        """
+            for number, (evaluation_standard, response_to_judge) in enumerate(items, start=1)
+        )
+        return f"""
+        你是一个回答评分器，下面有 {len(items)} 个待评分的条目，每个条目包含一份评判要求和一个 AI 的回答。
+        请按照每个条目各自的评判要求，独立地为该条目中的 AI 回答评分，条目之间互不影响。
+        {sections}
 
-        请按照下面的格式给出你的评分，除此之外不要包含其他内容。
+        请按照下面的格式依次给出每个条目的评分，条目编号与上面一一对应，除此之外不要包含其他内容。
 
+        ### Item [条目编号]
         Score: [Total score out of 100]
         Reason: [Your brief justification for the score]
         """
 
-    def evaluate(self, evaluation_standard: str, response: str) -> tuple[float, str]:
-        # 初始化裁判适配器
-        judge_adapter = OpenAIAdapter(api_key=self.JUDGE_API_KEY, model_id=self.JUDGE_MODEL_ID, api_base=self.JUDGE_API_BASE)
-        
-        judging_prompt = self._get_judge_prompt(evaluation_standard, response)
-        # print("Judger Evaluating...")
-        # 让裁判模型打分
-        judge_response = judge_adapter.query(judging_prompt)
-        
-        # 从裁判的回复中提取分数和理由
-        try:
-            score_match = re.search(r"Score:\s*(\d+\.?\d*)", judge_response)
-            reason_match = re.search(r"Reason:\s*(.*)", judge_response, re.DOTALL)
-            
-            if score_match and reason_match:
-                score = float(score_match.group(1)) / 1.0
-                reason = reason_match.group(1).strip()
-                return score, f"Judge's Verdict: {reason}"
-            else:
-                return 0.0, f"Could not parse judge's response: {judge_response}"
-        except Exception as e:
-            return 0.0, f"Error during judging: {e}"
\ No newline at end of file
+    def judge_batch(self, items: list[tuple[str, str, str]]) -> list[Verdict]:
+        """
+        在一次裁判请求中为多个条目评分。
+        :param items: (评分标准, 回答, 任务 ID) 列表。
+        :return: 与 items 一一对应的 Verdict 列表。命中缓存的条目不会发送给裁判；
+                 批量回复中无法解析的条目会单独调用 judge 重新评分。
+        """
+        verdicts = [self._lookup_verdict(standard, response) for standard, response, _ in items]
+        pending = [index for index, verdict in enumerate(verdicts) if verdict is None]
+        if len(pending) == 1:
+            standard, response, task_id = items[pending[0]]
+            verdicts[pending[0]] = self.judge(standard, response, task_id)
+        elif pending:
+            judging_prompt = self._get_batch_judge_prompt([items[index][:2] for index in pending])
+            with tracing.span("judge_batch", items=len(pending)):
+                judge_result = self.judge_adapter.complete(judging_prompt)
+            if not judge_result.ok:
+                # 批量请求失败时不再逐条重试，避免在限流时成倍增加请求
+                for index in pending:
+                    verdicts[index] = Verdict(0.0, f"裁判请求失败（{judge_result.status}）: {judge_result.text}", judge_result.text, status=judge_result.status)
+                return verdicts
+            with tracing.span("judge_parse", items=len(pending)):
+                sections = self._split_batch_response(judge_result.text)
+                parsed_sections = {number: self._parse_judge_response(section) for number, section in sections.items()}
+            shares = _split_usage(judge_result.usage, len(pending))
+
+            for number, (index, usage) in enumerate(zip(pending, shares), start=1):
+                standard, response, task_id = items[index]
+                parsed = parsed_sections.get(number)
+                if parsed is None:
+                    # 批量回复中该条目无法解析，单独重新评分
+                    verdict = self.judge(standard, response, task_id)
+                    verdict.usage = add_usage(verdict.usage, usage)
+                    verdicts[index] = verdict
+                    continue
+                score, reason = parsed
+                self._store_verdict(standard, response, task_id, score, reason, sections[number])
+                verdicts[index] = Verdict(score, f"Judge's Verdict: {reason}", sections[number], usage=usage)
+        return verdicts
+
+    @staticmethod
+    def _split_batch_response(judge_response: str) -> dict:
+        """将批量评分的回复按 "### Item N" 拆分为 {N: 该条目的回复}。"""
+        sections = {}
+        matches = list(re.finditer(r"^\s*#*\s*Item\s*(\d+)\s*$", judge_response, re.MULTILINE))
+        for match, following in zip(matches, matches[1:] + [None]):
+            end = following.start() if following else len(judge_response)
+            sections[int(match.group(1))] = judge_response[match.end():end].strip()
+        return sections
+
+
+def _split_usage(usage: dict, parts: int) -> list[dict]:
+    """将一次批量调用的 token 用量平均分摊到各条目上，余数计入前面的条目。"""
+    shares = [{} for _ in range(parts)]
+    for key, value in usage.items():
+        base, remainder = divmod(value, parts)
+        for index in range(parts):
+            shares[index][key] = base + (1 if index < remainder else 0)
+    return shares
+
+
+class BatchingJudger:
+    """
+    将多个线程并发提交的单条评分请求合并为批量请求的裁判包装器。
+    接口与 BaseJudger 相同，可直接替换传给任务和 Runner。
+    第一个到达的请求成为该批次的发起者：它最多等待 linger 秒或直到凑满 batch_size 条，
+    然后调用 judge_batch 一次性评分，并把结果分发给同批次的其他请求。
+    由于每个等待中的请求占用一个裁判线程，裁判线程数应不小于 batch_size。
+    """
+    def __init__(self, judger: BaseJudger, batch_size: int = 4, linger: float = 0.5):
+        self.judger = judger
+        self.batch_size = batch_size
+        self.linger = linger
+        self._lock = threading.Lock()
+        # 当前正在收集条目的批次
+        self._open_batch = None
+
+    def __getattr__(self, name):
+        # JUDGE_MODEL_ID、verdict_cache 等属性直接使用被包装的裁判
+        return getattr(self.judger, name)
+
+    def evaluate(self, evaluation_standard: str, response: str, task_id: str = None) -> tuple[float, str]:
+        verdict = self.judge(evaluation_standard, response, task_id)
+        return verdict.score, verdict.reason
+
+    def judge(self, evaluation_standard: str, response: str, task_id: str = None) -> Verdict:
+        future = Future()
+        with self._lock:
+            batch = self._open_batch
+            is_leader = batch is None
+            if is_leader:
+                batch = {"items": [], "full": threading.Event()}
+                self._open_batch = batch
+            batch["items"].append((evaluation_standard, response, task_id, future))
+            if len(batch["items"]) >= self.batch_size:
+                self._open_batch = None
+                batch["full"].set()
+
+        if is_leader:
+            batch["full"].wait(self.linger)
+            with self._lock:
+                if self._open_batch is batch:
+                    self._open_batch = None
+            items = batch["items"]
+            try:
+                verdicts = self.judger.judge_batch([item[:3] for item in items])
+                for item, verdict in zip(items, verdicts):
+                    item[3].set_result(verdict)
+            except Exception as e:
+                for item in items:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+
+        return future.result()
+
+class OpenAIJudger(BaseJudger):
+    def __init__(self, model_id: str = "gpt-4o", api_key: str = "sk-your-judge-api-key", api_base: str = "https://api.openai.com/v1", pool_size: int = 10, keepalive: float = 30.0):
+        super().__init__(model_id, api_key, api_base, pool_size, keepalive)
+
+class OllamaJudger(BaseJudger):
+    def __init__(self, model_id: str = "qwen2.5:3b", api_key: str = "sk-your-judge-api-key", api_base: str = "https://127.0.0.1:11434", pool_size: int = 10, keepalive: float = 30.0):
+        # 通过 Ollama 的 OpenAI 兼容接口调用，保留裁判回复的完整内容以便解析分数和理由
+        super().__init__(model_id, api_key, api_base, pool_size, keepalive)
+
+
+# 内置裁判：类型 -> "模块:类名"，第三方裁判通过 JUDGER_ENTRY_POINT_GROUP 组的 entry point 注册
+JUDGERS = {
+    "openai": "evaluate:OpenAIJudger",
+    "ollama": "evaluate:OllamaJudger",
+}
+JUDGER_ENTRY_POINT_GROUP = "noah_llm_benchmark.judgers"
+
+
+def judger_types() -> list[str]:
+    """全部可用的裁判类型（内置 + entry point 注册）。"""
+    return sorted({**entry_point_targets(JUDGER_ENTRY_POINT_GROUP), **JUDGERS})
+
+def build_judger(adapter_type: str, **kwargs):
+    """根据适配器类型创建裁判。内置类型优先于同名的 entry point。"""
+    target = JUDGERS.get(adapter_type) or entry_point_targets(JUDGER_ENTRY_POINT_GROUP).get(adapter_type)
+    if target is None:
+        raise ValueError(f"Unknown judger adapter type: {adapter_type} (available: {', '.join(judger_types())})")
+    return load_object(target)(**kwargs)
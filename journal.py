@@ -0,0 +1,95 @@
+# journal.py
+import json
+import os
+import threading
+
+
+class RunJournal:
+    """
+    崩溃安全的运行日志（JSONL）。
+    第一行是记录本次运行配置的 meta 记录，之后每完成一个任务追加一行 task 记录。
+    每次写入后都会 flush 并 fsync，进程崩溃或被中断时已完成的任务不会丢失。
+    续写已有的日志（--resume）时，先截掉崩溃时写了一半的最后一行，避免新记录接在残行后面一起无法解析。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _truncate_partial_line(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write_meta(self, meta: dict):
+        self._append({"type": "meta", **meta})
+
+    def append(self, record: dict):
+        self._append({"type": "task", **record})
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def load(path: str) -> tuple[dict, list[dict]]:
+        """
+        读取已有的运行日志。
+        :return: (meta 记录, task 记录列表)。崩溃时写了一半的最后一行会被忽略。
+        """
+        meta = {}
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("type") == "meta":
+                    meta = record
+                elif record.get("type") == "task":
+                    records.append(record)
+        return meta, records
+
+
+def _truncate_partial_line(path: str, block_size: int = 4096):
+    """文件不以换行结尾时，截断到最后一个换行之后（没有换行时清空）。"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        # 从末尾向前按块查找最后一个换行
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            index = f.read(position - start).rfind(b"\n")
+            if index != -1:
+                f.truncate(start + index + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def resolve_run_paths(run: str, results_dir: str = "results") -> tuple[str, str]:
+    """
+    将 --resume 的参数解析为 (Markdown 报告路径, 运行日志路径)。
+    参数可以是运行时间戳（如 2026-02-16-120000），也可以是 .md 或 .jsonl 文件路径。
+    """
+    base, ext = os.path.splitext(run)
+    if ext not in (".md", ".jsonl"):
+        base = run
+    if not os.path.dirname(base):
+        base = os.path.join(results_dir, base)
+    return base + ".md", base + ".jsonl"
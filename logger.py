@@ -1,34 +1,133 @@
-import logging
+import atexit
 import os
+import queue
+import threading
+import time
 from datetime import datetime
 
-def setup_markdown_logger():
+
+class ReportSection:
     """
-    设置一个 Markdown 日志记录器，自动在 ./results/ 目录下创建带时间戳的文件。
-    如果 ./results/ 目录不存在，则会自动创建。
+    在内存中拼装的一段 Markdown（例如一个任务的完整报告），接口与 logging.Logger.info 相同：每条消息占一行。
     """
-    # 创建 ./results 目录（如果不存在）
-    results_dir = "results"
-    os.makedirs(results_dir, exist_ok=True)
+    def __init__(self):
+        self.lines = []
+
+    def info(self, message: str):
+        self.lines.append(message)
+
+    def text(self) -> str:
+        return "".join(line + "\n" for line in self.lines)
+
+
+class ReportWriter:
+    """
+    后台写入的 Markdown 报告。调用方只把拼装好的文本放入队列，文件写入在独立线程中完成，不阻塞评测的热路径。
+    - info：与 logging.Logger.info 相同，按调用顺序写入一行（报告头部、最终摘要）；
+    - write_section：写入第 index 段（从 0 开始），无论各段以什么顺序完成，都按 index 顺序写入文件，
+      在前面的段到达之前，后面的段暂存在内存中。
+    每写完一次队列中的内容就 flush 一次，因此报告总是停在完整的段落边界上；close 时写完剩余内容。
+    报告文件路径记录在 report_path 属性上。
+    """
+    def __init__(self, file_path: str):
+        self.report_path = file_path
+        # 可选的 tracing.Tracer，记录写入线程每次写文件的耗时（report_write 阶段）
+        self.tracer = None
+        self._queue = queue.Queue()
+        self._error = None
+        self._file = open(file_path, 'w', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self._thread.start()
+        # 运行中断（异常、Ctrl-C）时也写完已提交的内容
+        atexit.register(self.close)
+
+    def info(self, message: str):
+        self._put((None, message + "\n"))
 
-    # 生成带时间戳的文件名
-    timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-    file_path = os.path.join(results_dir, f"{timestamp}.md")
+    def write_section(self, index: int, text: str):
+        self._put((index, text))
 
-    # 创建一个 Logger 实例
-    logger = logging.getLogger("benchmark_logger")
-    logger.setLevel(logging.INFO) # 只记录 INFO 及以上级别的日志
+    def _put(self, item):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(item)
 
-    # 避免重复添加 Handler
-    if not logger.handlers:
-        # 创建一个 FileHandler，将日志写入 Markdown 文件
-        file_handler = logging.FileHandler(file_path, mode='w', encoding='utf-8')
+    def _run(self):
+        # 已到达但前面还有段未到达的段落，按 index 暂存
+        waiting = {}
+        next_index = 0
+        closing = False
+        while not closing:
+            items = [self._queue.get()]
+            # 一次取完队列中已有的内容，合并为一次写入
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            chunks = []
+            for item in items:
+                if item is _CLOSE:
+                    closing = True
+                    continue
+                index, text = item
+                if index is None:
+                    chunks.append(text)
+                    continue
+                waiting[index] = text
+                while next_index in waiting:
+                    chunks.append(waiting.pop(next_index))
+                    next_index += 1
+            if closing and waiting:
+                # 中断时缺失的段落之后已完成的段落也写入，不丢失结果
+                chunks.extend(waiting.pop(index) for index in sorted(waiting))
+            try:
+                if chunks:
+                    start = time.perf_counter_ns()
+                    self._file.write("".join(chunks))
+                    self._file.flush()
+                    if self.tracer is not None:
+                        self.tracer.record("report_write", start, time.perf_counter_ns(), {"chunks": len(chunks)})
+            except OSError as e:
+                self._error = e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
 
-        # 自定义一个 Formatter，用于将日志信息转换为 Markdown 格式
-        formatter = logging.Formatter('%(message)s')
-        file_handler.setFormatter(formatter)
+    def flush(self):
+        """等待已提交的内容全部写入文件（后面的段仍在等待前面的段时除外）。"""
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """写入剩余内容并关闭文件。可重复调用。"""
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+_CLOSE = object()
+
+
+def setup_markdown_logger(file_path: str = None) -> ReportWriter:
+    """
+    创建 Markdown 报告写入器，自动在 ./results/ 目录下创建带时间戳的文件。
+    如果 ./results/ 目录不存在，则会自动创建。
+    :param file_path: 指定报告文件路径（例如恢复中断的运行时重写原报告），为 None 时自动生成。
+    报告文件路径记录在返回的写入器的 report_path 属性上。运行结束后需调用 close 写完剩余内容。
+    """
+    if file_path is None:
+        # 创建 ./results 目录（如果不存在）
+        results_dir = "results"
+        os.makedirs(results_dir, exist_ok=True)
 
-        # 将 Handler 添加到 Logger
-        logger.addHandler(file_handler)
+        # 生成带时间戳的文件名
+        timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
+        file_path = os.path.join(results_dir, f"{timestamp}.md")
 
-    return logger
\ No newline at end of file
+    return ReportWriter(file_path)
@@ -1,36 +1,171 @@
 # main.py
 import argparse
+import json
 import os
 from pprint import pprint
 import datetime
+from contextlib import nullcontext
 
-from benchmark_runner import BenchmarkRunner
-from model_adapter import OpenAIAdapter,OllamaAdapter
-from evaluate import OpenAIJudger, OllamaJudger
+from cache import ResponseCache, VerdictCache
+from model_adapter import adapter_types, build_model_adapter
+from evaluate import BatchingJudger, build_judger, judger_types
+from journal import RunJournal, resolve_run_paths
 from logger import setup_markdown_logger
+from pricing import PriceTable
+from rate_limit import RetryPolicy, shared_rate_limiters
+from results_store import ResultsStore, run_id_for
+from scheduler import LatencyPredictor, TimeBudgetScheduler
+from task_index import DuplicateTaskIdError
 from tasks_handler import load_all_tasks
+from tracing import RunProfiler, Tracer
+
+# 题库版本，写入报告头部
+TASK_VERSION = "20260216"
+
+def write_report_header(benchmark_logger, meta: dict):
+    """
+    写入 Markdown 报告头部。恢复中断的运行时使用运行日志中保存的 meta 重写，保证报告与未中断时一致。
+    """
+    benchmark_logger.info("# Noah's LLM Benchmark 结果\n")
+    benchmark_logger.info(f"- 测评模型: {meta['model_id']}\n")
+    benchmark_logger.info(f"- 评价模型: {meta['judger_model_id']}\n")
+    benchmark_logger.info(f"- 运行时间: {meta['started_at']}\n")
+    benchmark_logger.info(f"- 题库版本: {meta['task_version']}\n")
+
+def print_task_list(tasks: list, done_ids: set = frozenset()):
+    """打印任务列表（只用到任务索引中的元数据，不读取任务正文）。已完成的任务标记为 done。"""
+    print(f"{'#':>4}  {'id':<32} {'category':<24} {'judge':<6} name")
+    for position, task in enumerate(tasks, start=1):
+        marker = "done" if task.get_id() in done_ids else ("yes" if task.requires_judge() else "no")
+        print(f"{position:>4}  {task.get_id():<32} {task.get_category():<24} {marker:<6} {task.get_name()}")
+
+def ollama_kwargs(adapter_type: str, keep_alive, num_ctx: int = None, options: dict = None) -> dict:
+    """
+    Ollama 适配器专有的构造参数。keep_alive 为纯数字时按秒数传给 Ollama，否则按时长字符串（如 "30m"）传递。
+    """
+    if adapter_type != "ollama":
+        return {}
+    options = dict(options or {})
+    if num_ctx is not None:
+        options["num_ctx"] = num_ctx
+    if isinstance(keep_alive, str) and keep_alive.lstrip("-").isdigit():
+        keep_alive = int(keep_alive)
+    return {"keep_alive": keep_alive, "options": options}
 
 def main():
     parser = argparse.ArgumentParser(description="Personal LLM Benchmark Framework")
-    parser.add_argument("--adapter_type", type=str, default="openai", choices=["openai", "ollama"], help="The type of adapter to use.")
+    parser.add_argument("--adapter_type", type=str, default="openai", help="The type of adapter to use: openai, ollama or a type registered through entry points.")
     parser.add_argument("--api_base", type=str, default="https://api.openai.com/v1", help="Optional: The base URL for the API (for local models).")
     parser.add_argument("--api_key", type=str, default="sk-your-key-here", help="API Key for the LLM service.")
     parser.add_argument("--model_id", type=str, default="gpt-4", help="The ID of the model to be benchmarked.")
 
-    parser.add_argument("--judger_adapter_type", type=str, default="openai", choices=["openai", "ollama"], help="The type of judger adapter to use.")
+    parser.add_argument("--judger_adapter_type", type=str, default="openai", help="The type of judger adapter to use: openai, ollama or a type registered through entry points.")
     parser.add_argument("--judger_api_base", type=str, default="https://api.openai.com/v1", help="The base URL for the LLM Judger API (for local models).")
     parser.add_argument("--judger_api_key", type=str, default="sk-your-key-here", help="API Key for the LLM Judger service.")
     parser.add_argument("--judger_model_id", type=str, default="gpt-4o", help="Model for the LLM Judger service.")
 
-    parser.add_argument("--task", type=int, default=0, help="Test on specific task, default is 0 (all tasks).")
+    parser.add_argument("--judge_batch_size", type=int, default=1, help="Pack up to this many llm_eval items into one judge request, default is 1 (no batching).")
+    parser.add_argument("--judge_batch_linger", type=float, default=0.5, help="Seconds a judge batch waits for more items before it is sent.")
+    parser.add_argument("--pool_size", type=int, default=10, help="Maximum number of pooled HTTP connections per adapter and judger.")
+    parser.add_argument("--keepalive", type=float, default=30.0, help="Seconds an idle pooled connection is kept alive, <= 0 disables keep-alive.")
+
+    parser.add_argument("--health_check_interval", type=float, default=30.0, help="Seconds between health checks of replicas when --api_base / --judger_api_base list several comma-separated endpoints. <= 0 disables them.")
+    parser.add_argument("--slow_threshold", type=float, default=5.0, help="Replicas whose health check takes longer than this many seconds are taken out of rotation until they recover.")
+
+    parser.add_argument("--rpm", type=float, default=0, help="Client-side limit of requests per minute per endpoint, shared by the model and the judger when they use the same endpoint. <= 0 disables it.")
+    parser.add_argument("--tpm", type=float, default=0, help="Client-side limit of tokens (input + output) per minute per endpoint, shared like --rpm. <= 0 disables it.")
+    parser.add_argument("--max_retries", type=int, default=3, help="Retries for rate-limited (429), 5xx and connection errors, with jittered exponential backoff that honors Retry-After.")
+    parser.add_argument("--retry_base_delay", type=float, default=1.0, help="Base delay in seconds of the exponential backoff.")
+
+    parser.add_argument("--warm_up", action="store_true", help="Load the model before the first task (Ollama) so model load time is not counted in task execution time.")
+    parser.add_argument("--keep_alive", type=str, default=None, help="Ollama keep_alive: how long the model stays loaded after a request, e.g. 30m, 3600 (seconds) or -1 (forever).")
+    parser.add_argument("--num_ctx", type=int, default=None, help="Ollama context window size (options.num_ctx).")
+    parser.add_argument("--options", type=str, default=None, help="Extra Ollama model options as a JSON object, e.g. '{\"temperature\": 0}'.")
+
+    parser.add_argument("--stream", action="store_true", help="Use streaming generation and record time-to-first-token, inter-token latency and decode speed.")
+    parser.add_argument("--max_thinking_tokens", type=int, default=0, help="With --stream, abort a request once the model has thought for more than this many tokens; the task scores 0 like a timeout. 0 disables it.")
+    parser.add_argument("--max_thinking_time", type=float, default=0, help="With --stream, abort a request once the model has thought for more than this many seconds. 0 disables it.")
+    parser.add_argument("--start_thinking", action="store_true", help="The model's chat template opens <think> in the prompt (e.g. Qwen3, DeepSeek-R1), so its output starts inside the thinking block: treat everything before </think> as thinking, letting the thinking budget apply from the first token.")
+
+    parser.add_argument("--cache", type=str, default="off", choices=ResponseCache.MODES, help="Response cache mode: 'read' serves hits and stores misses, 'write' always queries and refreshes the cache, 'off' disables it.")
+    parser.add_argument("--cache_path", type=str, default=".cache/responses.sqlite", help="SQLite file used by the response cache.")
+    parser.add_argument("--cache_max_entries", type=int, default=10000, help="Maximum number of cached responses; least recently used entries are evicted first.")
+    parser.add_argument("--cache_max_age_days", type=float, default=30.0, help="Cached responses older than this many days are evicted, <= 0 keeps them forever.")
+
+    parser.add_argument("--judge_cache", type=str, default="off", choices=VerdictCache.MODES, help="Judge verdict cache mode, same semantics as --cache.")
+    parser.add_argument("--judge_cache_path", type=str, default=".cache/verdicts.sqlite", help="SQLite file used by the judge verdict cache.")
+    parser.add_argument("--invalidate_judge_cache", type=str, action="append", default=[], metavar="TASK_ID", help="Drop cached verdicts of the given task id before running. Can be repeated.")
+
+    parser.add_argument("--samples", type=int, default=1, help="Number of samples per task. Uses one n=K request where the backend supports it, otherwise K parallel requests with different seeds.")
+    parser.add_argument("--pass_score", type=float, default=60.0, help="A sample scoring at least this much counts as passed when computing pass@k.")
+
+    parser.add_argument("--time_budget", type=float, default=0, help="Time budget in seconds for generating answers. Tasks run shortest-predicted-first (predicted from this model's history in --results_db, or from prompt length), get adaptive deadlines, and tasks that cannot fit are reported as out-of-time (OOT) instead of scored. <= 0 disables it.")
+    parser.add_argument("--deadline_factor", type=float, default=3.0, help="With --time_budget, a task with latency history is cut off (and marked OOT) after this many times its predicted latency. <= 0 only limits tasks by the remaining budget.")
+    parser.add_argument("--results_db", type=str, default="results/results.sqlite", help="SQLite results store that every run also writes structured per-task records to (query it with results_store.py). Empty disables it.")
+
+    parser.add_argument("--prices", type=str, default="prices.yaml", help="Price table (USD per 1M tokens) used to turn token usage into cost.")
+
+    parser.add_argument("--task", type=int, default=0, help="Test on the N-th selected task (tasks are ordered by path), default is 0 (all tasks).")
+    parser.add_argument("--only", type=str, action="append", default=[], metavar="SELECTOR", help="Only run tasks matching a task id, a category or a glob over ids and paths (e.g. 'reasoning/*'). Can be repeated.")
+    parser.add_argument("--task_index_path", type=str, default=".cache/task_index.json", help="Compiled task index; only changed task files are re-parsed on startup.")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN", help="Resume an interrupted run from its journal, given as a results timestamp or a results/*.md / *.jsonl path.")
+    parser.add_argument("--trace_events", type=int, default=100000, help="Maximum number of stage spans kept for the Chrome trace written next to the report (results/<run>.trace.json); 0 disables the trace file. Stage latency histograms are always reported.")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile (including worker threads), write results/<run>.prof and print the top functions by cumulative time.")
+    parser.add_argument("--list-tasks", dest="list_tasks", action="store_true", help="List the selected tasks and exit.")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Print what would be run (models, tasks, resumed tasks) and exit without calling any model.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Maximum number of tasks in flight at the same time, default is 1 (sequential).")
+    parser.add_argument("--judge_workers", type=int, default=1, help="Number of worker threads in the judging stage, independent of --concurrency.")
     
     args = parser.parse_args()
-    benchmark_logger = setup_markdown_logger()
-    benchmark_logger.info("# Noah's LLM Benchmark 结果\n")
-    benchmark_logger.info(f"- 测评模型: {args.model_id}\n")
-    benchmark_logger.info(f"- 评价模型: {args.judger_model_id}\n")
-    benchmark_logger.info(f"- 运行时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    benchmark_logger.info(f"- 题库版本: 20260216\n")
+
+    # 只校验类型名，不导入适配器模块
+    if args.adapter_type not in adapter_types():
+        parser.error(f"--adapter_type: unknown adapter type {args.adapter_type} (available: {', '.join(adapter_types())})")
+    if args.judger_adapter_type not in judger_types():
+        parser.error(f"--judger_adapter_type: unknown judger type {args.judger_adapter_type} (available: {', '.join(judger_types())})")
+
+    # 记录本次运行各阶段的耗时区间（任务加载、生成、评分、报告写入等）
+    tracer = Tracer(max_events=args.trace_events)
+    try:
+        with tracer.span("load_tasks"):
+            all_tasks = load_all_tasks("tasks", selectors=args.only, index_path=args.task_index_path)
+    except DuplicateTaskIdError as e:
+        parser.error(str(e))
+    except ValueError as e:
+        parser.error(f"--only: {e}")
+    if args.task < 0 or args.task > len(all_tasks):
+        parser.error(f"--task: must be between 0 and {len(all_tasks)}")
+
+    if args.list_tasks:
+        print_task_list(all_tasks)
+        return
+
+    if args.dry_run:
+        # 只读取任务索引和运行日志，不创建报告、不连接任何模型服务
+        selected = all_tasks if args.task == 0 else [all_tasks[args.task - 1]]
+        done_ids = set()
+        if args.resume:
+            _, journal_path = resolve_run_paths(args.resume)
+            if os.path.exists(journal_path):
+                done_ids = {record["task_id"] for record in RunJournal.load(journal_path)[1]}
+        print(f"测评模型: {args.model_id} ({args.adapter_type}, {args.api_base})")
+        print(f"评价模型: {args.judger_model_id} ({args.judger_adapter_type}, {args.judger_api_base})")
+        print(f"任务数: {len(selected)}，需要裁判: {sum(task.requires_judge() for task in selected)}，已完成: {len(done_ids & {task.get_id() for task in selected})}\n")
+        print_task_list(selected, done_ids)
+        return
+
+    # 在打开报告和运行日志之前校验参数：--resume 会重写原报告，参数错误时不能留下被截断的报告或多余的文件
+    try:
+        options = json.loads(args.options) if args.options else {}
+    except ValueError as e:
+        parser.error(f"--options: invalid JSON: {e}")
+    if not isinstance(options, dict):
+        parser.error("--options: must be a JSON object")
+    if args.adapter_type != "ollama" and (args.keep_alive is not None or args.num_ctx is not None or options):
+        parser.error("--keep_alive, --num_ctx and --options are only supported by the ollama adapter")
+    if (args.max_thinking_tokens or args.max_thinking_time) and not args.stream:
+        # 思考预算只能在流式输出时逐块检查
+        parser.error("--max_thinking_tokens and --max_thinking_time require --stream")
 
     if args.adapter_type == "openai" and args.api_key == "sk-your-key-here":
         # 如果被测模型为外部模型，且没有提供 API Key，则提示错误
@@ -40,45 +175,130 @@ def main():
         # 如果裁判模型为外部模型，且没有提供 API Key，则提示错误
         parser.error("--judger_api_key is required for the selected judger adapter type")
 
+    # 运行器依赖 tqdm 等较重的模块，只在真正运行时导入，--list-tasks / --dry-run 可以快速返回
+    from benchmark_runner import BenchmarkRunner
 
-    if args.adapter_type == "openai":
-        model_adapter = OpenAIAdapter(
-            api_key=args.api_key,
-            model_id=args.model_id,
-            api_base=args.api_base
-        )
-    elif args.adapter_type == "ollama":
-        model_adapter = OllamaAdapter(
-            api_key=args.api_key, # 即使被忽略，也传入以保持一致性
-            model_id=args.model_id,
-            api_base=args.api_base
-        )
+    resume_records = None
+    if args.resume:
+        # 从运行日志恢复：重写原报告，跳过已完成的任务
+        report_path, journal_path = resolve_run_paths(args.resume)
+        if not os.path.exists(journal_path):
+            parser.error(f"--resume: journal not found: {journal_path}")
+        meta, resume_records = RunJournal.load(journal_path)
+        if meta.get("model_id") != args.model_id:
+            parser.error(f"--resume: run was recorded for model {meta.get('model_id')}, not {args.model_id}")
+        benchmark_logger = setup_markdown_logger(report_path)
+        journal = RunJournal(journal_path)
+        print(f"♻️ Resuming run {journal_path}: {len(resume_records)} tasks already finished")
     else:
-        raise ValueError(f"Unknown adapter type: {args.adapter_type}")
-    
-    if args.judger_adapter_type == "openai":
-        judger_model_adapter = OpenAIJudger(
-            api_key=args.judger_api_key,
-            model_id=args.judger_model_id,
-            api_base=args.judger_api_base
+        meta = {
+            "model_id": args.model_id,
+            "judger_model_id": args.judger_model_id,
+            "started_at": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "task_version": TASK_VERSION,
+        }
+        benchmark_logger = setup_markdown_logger()
+        journal = RunJournal(os.path.splitext(benchmark_logger.report_path)[0] + ".jsonl")
+        journal.write_meta(meta)
+    write_report_header(benchmark_logger, meta)
+
+    model_adapter = build_model_adapter(
+        args.adapter_type,
+        api_key=args.api_key,
+        model_id=args.model_id,
+        api_base=args.api_base,
+        pool_size=args.pool_size,
+        keepalive=args.keepalive,
+        stream=args.stream,
+        **ollama_kwargs(args.adapter_type, args.keep_alive, args.num_ctx, options),
+    )
+    judger_model_adapter = build_judger(
+        args.judger_adapter_type,
+        api_key=args.judger_api_key,
+        model_id=args.judger_model_id,
+        api_base=args.judger_api_base,
+        pool_size=args.pool_size,
+        keepalive=args.keepalive,
+    )
+
+    model_adapter.max_thinking_tokens = args.max_thinking_tokens or None
+    model_adapter.max_thinking_time = args.max_thinking_time or None
+    model_adapter.start_thinking = args.start_thinking
+
+    # 被测模型与裁判使用同一服务端时共享同一个限流器
+    for adapter in (model_adapter, judger_model_adapter.judge_adapter):
+        adapter.rate_limiters = shared_rate_limiters(adapter.api_base, args.rpm, args.tpm)
+        adapter.retry_policy = RetryPolicy(max_retries=args.max_retries, base_delay=args.retry_base_delay)
+        if adapter.endpoints is not None:
+            adapter.endpoints.check_interval = args.health_check_interval
+            adapter.endpoints.slow_threshold = args.slow_threshold
+
+    if args.cache != "off":
+        model_adapter.cache = ResponseCache(
+            path=args.cache_path,
+            mode=args.cache,
+            max_entries=args.cache_max_entries,
+            max_age_days=args.cache_max_age_days,
         )
-    elif args.judger_adapter_type == "ollama":
-        judger_model_adapter = OllamaJudger(
-            api_key=args.judger_api_key, # 即使被忽略，也传入以保持一致性
-            model_id=args.judger_model_id,
-            api_base=args.judger_api_base
+
+    if args.judge_cache != "off" or args.invalidate_judge_cache:
+        verdict_cache = VerdictCache(
+            path=args.judge_cache_path,
+            mode=args.judge_cache,
+            max_entries=args.cache_max_entries,
+            max_age_days=args.cache_max_age_days,
         )
-    else:
-        raise ValueError(f"Unknown judger adapter type: {args.judger_adapter_type}")
+        for task_id in args.invalidate_judge_cache:
+            removed = verdict_cache.invalidate_task(task_id)
+            print(f"🗑️ Invalidated {removed} cached verdicts for task: {task_id}")
+        if args.judge_cache != "off":
+            judger_model_adapter.verdict_cache = verdict_cache
 
-    all_tasks = load_all_tasks("tasks")
+    judge_workers = args.judge_workers
+    if args.judge_batch_size > 1:
+        judger_model_adapter = BatchingJudger(judger_model_adapter, batch_size=args.judge_batch_size, linger=args.judge_batch_linger)
+        # 每个等待合批的条目占用一个裁判线程，线程数不足时批次无法凑满
+        judge_workers = max(judge_workers, args.judge_batch_size)
+
+    if args.warm_up:
+        with tracer.activate(), tracer.span("warm_up"):
+            timings = model_adapter.warm_up()
+        if timings:
+            print(f"🔥 Warmed up {args.model_id}: model loaded in {timings.get('load_duration', 0.0)}s")
 
     # 初始化 Benchmark Runner
 
-    runner = BenchmarkRunner(model_adapter, all_tasks, judger_model_adapter, args.task, benchmark_logger)
+    results_store = None
+    run_id = run_id_for(benchmark_logger.report_path)
+    if args.results_db:
+        results_store = ResultsStore(args.results_db)
+        results_store.start_run(run_id, meta, benchmark_logger.report_path)
+
+    scheduler = None
+    if args.time_budget > 0:
+        predictor = LatencyPredictor.from_store(results_store, args.model_id, sampled=args.samples > 1) if results_store is not None else None
+        scheduler = TimeBudgetScheduler(args.time_budget, predictor, deadline_factor=args.deadline_factor)
+
+    benchmark_logger.tracer = tracer
+    runner = BenchmarkRunner(model_adapter, all_tasks, judger_model_adapter, args.task, benchmark_logger, concurrency=args.concurrency, judge_workers=judge_workers, journal=journal, resume_records=resume_records, price_table=PriceTable.load(args.prices), samples=args.samples, pass_score=args.pass_score, results_store=results_store, run_id=run_id, tracer=tracer, scheduler=scheduler)
 
     # 运行并获取结果
-    final_report = runner.run()
+    with RunProfiler() if args.profile else nullcontext() as profiler:
+        final_report = runner.run()
+    journal.close()
+    benchmark_logger.close()
+    if results_store is not None:
+        results_store.close()
+        print(f"🗄️ Results stored in {args.results_db} as run {run_id}")
+
+    run_base = os.path.splitext(benchmark_logger.report_path)[0]
+    if args.trace_events > 0:
+        tracer.export_chrome_trace(run_base + ".trace.json", {"model_id": args.model_id, "run_id": run_id})
+        print(f"🧭 Trace written to {run_base}.trace.json (open it in ui.perfetto.dev or chrome://tracing)")
+    if profiler is not None:
+        stats = profiler.dump(run_base + ".prof")
+        stats.sort_stats("cumulative").print_stats(25)
+        print(f"🔬 Profile written to {run_base}.prof (python -m pstats {run_base}.prof)")
 
     # 打印最终报告
     print("\n\n========== 📊 FINAL BENCHMARK REPORT ==========")
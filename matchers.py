@@ -0,0 +1,162 @@
+# matchers.py
+import re
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy 是可选依赖，仅用于批量评分时向量化数值容差比较
+    np = None
+
+# 去掉首尾空格、转小写、去掉可能包含的引号（有的模型喜欢加引号）
+QUOTES = str.maketrans("", "", "\"'")
+# 选择题：回答中第一个出现的字母
+FIRST_LETTER = re.compile(r'[a-zA-Z]')
+# 填空题：结尾常见的标点符号
+TRAILING_PUNCTUATION = re.compile(r'[。，！？．\.!\?,]$')
+# 填空题：整个回答是一个数字（用于数值容差）
+NUMBER = re.compile(r'[+-]?\d+(?:\.\d+)?')
+# 批量评分时超过该数量才使用 NumPy，少量回答时逐个比较更快
+NUMPY_MIN_BATCH = 64
+
+
+def normalize(text) -> str:
+    return str(text).strip().lower().translate(QUOTES)
+
+
+class ExactMatcher:
+    """
+    精确匹配评分（选择题或分类题），由任务 YAML 的 evaluation 配置编译一次后重复使用：
+    mapping 中的得分与理由预先解析为 (score, reason)，「是否全为单字母选项」预先判断。
+    调用时可以传入本行的标准答案（数据集任务），命中时得 evaluation.score 分，mapping 只用于给其他回答部分分。
+    """
+    def __init__(self, eval_cfg: dict):
+        self.mapping = {key: self._parse_result(value) for key, value in eval_cfg.get('mapping', {}).items()}
+        self.score_value = float(eval_cfg.get('score', 100))
+        self.default = (float(eval_cfg.get('default_score', 0.0)), eval_cfg.get('default_reason', "回答未匹配到任何预设选项"))
+        self.choice_question = all(len(key) == 1 for key in self.mapping)
+
+    @staticmethod
+    def _parse_result(result) -> tuple[float, str]:
+        # 支持 YAML 中简写为 score: 100 或 结构化 {score: 100, reason: "..."}
+        if isinstance(result, dict):
+            return float(result.get('score', 0)), result.get('reason', '匹配成功')
+        return float(result), "回答正确"
+
+    def score(self, response: str, answers: list = None) -> tuple[float, str]:
+        processed = normalize(response)
+        expected = {normalize(answer) for answer in answers} if answers is not None else ()
+        # 针对选择题，有的模型会输出 "A." 或 "选项 A"，如果匹配项里全是单字母，只看回答的第一个字母
+        if self.choice_question and all(len(answer) == 1 for answer in expected) and processed:
+            match = FIRST_LETTER.search(processed)
+            if match:
+                processed = match.group()
+        if processed in expected:
+            return self.score_value, "回答正确"
+        return self.mapping.get(processed, self.default)
+
+    def score_many(self, responses: list[str], answers: list = None) -> list[tuple[float, str]]:
+        """
+        批量评分。
+        :param answers: 与 responses 一一对应的标准答案列表（数据集任务各行的答案），为 None 时只使用 mapping。
+        """
+        if answers is None:
+            answers = [None] * len(responses)
+        return [self.score(response, expected) for response, expected in zip(responses, answers)]
+
+
+class FillInMatcher:
+    """
+    填空题评分：支持多个正确答案、去除结尾标点干扰，以及可选的数值容差（evaluation.tolerance）。
+    标准答案预先归一化为集合，数值答案预先解析；批量评分时可用 NumPy 一次比较全部数值回答。
+    """
+    def __init__(self, eval_cfg: dict):
+        # 填空题的正确答案可以是列表或字符串
+        answers = eval_cfg.get('answers', [])
+        if isinstance(answers, str):
+            answers = [answers]
+        self.standards = self._normalize_standards(answers)
+        self.tolerance = float(eval_cfg['tolerance']) if eval_cfg.get('tolerance') is not None else None
+        self.numbers = self._parse_numbers(self.standards)
+        self.score_value = float(eval_cfg.get('score', 100.0))
+        self.default = (float(eval_cfg.get('default_score', 0.0)), eval_cfg.get('default_reason', "回答错误"))
+
+    @staticmethod
+    def _normalize_standards(answers: list) -> frozenset:
+        return frozenset(str(answer).strip().lower() for answer in answers)
+
+    def _parse_numbers(self, standards) -> tuple:
+        if self.tolerance is None:
+            return ()
+        return tuple(float(standard) for standard in standards if NUMBER.fullmatch(standard))
+
+    @staticmethod
+    def _normalize_response(response: str) -> str:
+        return TRAILING_PUNCTUATION.sub('', normalize(response))
+
+    def _expected(self, answers: list):
+        if answers is None:
+            return self.standards, self.numbers
+        if isinstance(answers, str):
+            answers = [answers]
+        standards = self._normalize_standards(answers)
+        return standards, self._parse_numbers(standards)
+
+    def score(self, response: str, answers: list = None) -> tuple[float, str]:
+        res = self._normalize_response(response)
+        standards, numbers = self._expected(answers)
+        # 精确匹配（归一化后）
+        if res in standards:
+            return self.score_value, "回答正确"
+        # 数值容差
+        if numbers and NUMBER.fullmatch(res) and any(abs(float(res) - number) <= self.tolerance for number in numbers):
+            return self.score_value, "回答正确（在数值容差范围内）"
+        return self.default
+
+    def score_many(self, responses: list[str], answers: list = None) -> list[tuple[float, str]]:
+        """
+        批量评分：先按归一化后的文本查集合，未命中且配置了 tolerance 时，
+        安装了 NumPy 且回答足够多时一次性向量化比较全部数值回答，否则逐个比较。
+        :param answers: 与 responses 一一对应的标准答案列表（数据集任务各行的答案），为 None 时使用 evaluation.answers。
+        """
+        if answers is None:
+            answers = [None] * len(responses)
+        expected = [self._expected(answer) for answer in answers]
+        normalized = [self._normalize_response(response) for response in responses]
+        results = [
+            (self.score_value, "回答正确") if res in standards else None
+            for res, (standards, _) in zip(normalized, expected)
+        ]
+        if self.tolerance is not None:
+            pending = [i for i, result in enumerate(results) if result is None and expected[i][1] and NUMBER.fullmatch(normalized[i])]
+            if np is not None and len(pending) >= NUMPY_MIN_BATCH:
+                matched = self._numeric_matches_numpy([float(normalized[i]) for i in pending], [expected[i][1] for i in pending])
+            else:
+                matched = [
+                    any(abs(float(normalized[i]) - number) <= self.tolerance for number in expected[i][1])
+                    for i in pending
+                ]
+            for i, hit in zip(pending, matched):
+                if hit:
+                    results[i] = (self.score_value, "回答正确（在数值容差范围内）")
+        return [result or self.default for result in results]
+
+    def _numeric_matches_numpy(self, values: list[float], numbers: list[tuple]) -> list[bool]:
+        """每个回答的数值与其任一标准答案相差不超过 tolerance 时为 True。各回答的标准答案个数可以不同。"""
+        counts = np.fromiter((len(candidates) for candidates in numbers), dtype=np.int64, count=len(numbers))
+        owners = np.repeat(np.arange(len(values)), counts)
+        flat = np.fromiter(chain.from_iterable(numbers), dtype=np.float64, count=int(counts.sum()))
+        hits = np.abs(np.asarray(values, dtype=np.float64)[owners] - flat) <= self.tolerance
+        return (np.bincount(owners[hits], minlength=len(values)) > 0).tolist()
+
+
+MATCHERS = {
+    "exact_match": ExactMatcher,
+    "fill_in": FillInMatcher,
+}
+
+
+def build_matcher(eval_cfg: dict):
+    """按 evaluation.method 编译匹配器；llm_eval 等需要裁判的方法返回 None。"""
+    matcher_class = MATCHERS.get(eval_cfg.get('method'))
+    return matcher_class(eval_cfg) if matcher_class is not None else None
@@ -0,0 +1,154 @@
+# metrics.py
+import math
+import time
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    线性插值计算百分位数。
+    :param q: 百分位，取值 0~100。
+    :return: 百分位数，values 为空时返回 0.0。
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def mean(values: list) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+class StreamMetrics:
+    """
+    记录一次流式生成中每个 token（流式分块）到达的时间，计算首 token 延迟、token 间延迟与解码速度。
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.token_times = []
+
+    def on_token(self):
+        self.token_times.append(time.perf_counter())
+
+    def finish(self, output_tokens: int = None) -> dict:
+        """
+        :param output_tokens: 服务端返回的输出 token 数，为 None 时以收到的分块数代替。
+        :return: 指标 dict，单位为秒和 token/s。
+        """
+        if not self.token_times:
+            return {}
+        if output_tokens is None:
+            output_tokens = len(self.token_times)
+
+        first, last = self.token_times[0], self.token_times[-1]
+        gaps = [later - earlier for earlier, later in zip(self.token_times, self.token_times[1:])]
+        decode_time = last - first
+        return {
+            "ttft": round(first - self.start_time, 4),
+            "itl_p50": round(percentile(gaps, 50), 4),
+            "itl_p90": round(percentile(gaps, 90), 4),
+            "itl_p99": round(percentile(gaps, 99), 4),
+            "output_tokens": output_tokens,
+            # 首 token 之后的解码速度
+            "tokens_per_sec": round((output_tokens - 1) / decode_time, 2) if decode_time > 0 else 0.0,
+        }
+
+
+# 95% 置信水平下 t 分布的双侧临界值，按自由度 1~30 排列；自由度更大时使用正态分布的 1.96
+T_CRITICAL_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)
+
+def stdev(values: list) -> float:
+    """样本标准差（n-1），少于两个值时返回 0.0。"""
+    if len(values) < 2:
+        return 0.0
+    average = mean(values)
+    return math.sqrt(sum((value - average) ** 2 for value in values) / (len(values) - 1))
+
+def t_critical_95(df: int) -> float:
+    if df < 1:
+        return 0.0
+    return T_CRITICAL_95[df - 1] if df <= len(T_CRITICAL_95) else 1.96
+
+def pass_at_k(n: int, c: int, k: int) -> float:
+    """
+    pass@k 的无偏估计：从 n 次采样（其中 c 次通过）中任取 k 次，至少有一次通过的概率。
+    """
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.comb(n - c, k) / math.comb(n, k)
+
+def sample_statistics(scores: list, pass_score: float) -> dict:
+    """
+    汇总同一任务多次采样的得分。
+    :param pass_score: 得分不低于该值的采样视为通过，用于计算 pass@1 与 pass@k（k 为采样次数）。
+    :return: mean、std、均值的 95% 置信区间 ci_low/ci_high、pass@1、pass@k 与采样次数 n。
+    """
+    n = len(scores)
+    average = mean(scores)
+    std = stdev(scores)
+    half_width = t_critical_95(n - 1) * std / math.sqrt(n) if n > 1 else 0.0
+    passed = sum(1 for score in scores if score >= pass_score)
+    return {
+        "n": n,
+        "mean": round(average, 2),
+        "std": round(std, 2),
+        "ci_low": round(average - half_width, 2),
+        "ci_high": round(average + half_width, 2),
+        "pass@1": round(pass_at_k(n, passed, 1), 4) if n else 0.0,
+        "pass@k": round(pass_at_k(n, passed, n), 4) if n else 0.0,
+    }
+
+class SampleStatsAccumulator:
+    """
+    逐个并入任务的采样统计，得到一个类别（或总体、数据集任务）的汇总统计，内存占用与任务数无关。
+    均值、标准差、pass@1、pass@k 取各任务的平均；置信区间只反映采样带来的波动：
+    汇总均值的标准误为 sqrt(Σ se_i²) / 任务数，其中单个任务 se_i² = std_i² / n_i，按正态近似取 ±1.96 倍。
+    并入的统计本身是汇总结果（带 standard_error）时，直接使用其标准误，因此数据集任务可以作为一个任务参与类别汇总。
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_mean = 0.0
+        self.total_std = 0.0
+        self.total_variance = 0.0
+        self.total_pass_1 = 0.0
+        self.total_pass_k = 0.0
+
+    def add(self, stats: dict):
+        self.count += 1
+        self.total_mean += stats["mean"]
+        self.total_std += stats["std"]
+        if "standard_error" in stats:
+            self.total_variance += stats["standard_error"] ** 2
+        else:
+            self.total_variance += stats["std"] ** 2 / stats["n"]
+        self.total_pass_1 += stats["pass@1"]
+        self.total_pass_k += stats["pass@k"]
+
+    def result(self) -> dict:
+        if not self.count:
+            return {}
+        average = self.total_mean / self.count
+        standard_error = math.sqrt(self.total_variance) / self.count
+        return {
+            "mean": round(average, 2),
+            "std": round(self.total_std / self.count, 2),
+            "standard_error": round(standard_error, 4),
+            "ci_low": round(average - 1.96 * standard_error, 2),
+            "ci_high": round(average + 1.96 * standard_error, 2),
+            "pass@1": round(self.total_pass_1 / self.count, 4),
+            "pass@k": round(self.total_pass_k / self.count, 4),
+        }
+
+def aggregate_sample_statistics(task_stats: list[dict]) -> dict:
+    """
+    将多个任务的采样统计汇总为一个类别（或总体）的统计，见 SampleStatsAccumulator。
+    """
+    accumulator = SampleStatsAccumulator()
+    for stats in task_stats:
+        accumulator.add(stats)
+    return accumulator.result()
@@ -0,0 +1,317 @@
+# mock_server.py
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+
+class LatencyModel:
+    """
+    可复现的延迟分布，用 "类型:参数" 描述：
+    - fixed:0.05 固定 0.05 秒；
+    - uniform:0.01,0.1 均匀分布；
+    - normal:0.05,0.01 正态分布（均值, 标准差），小于 0 时取 0；
+    - lognormal:-3,0.5 对数正态分布（mu, sigma）。
+    """
+    def __init__(self, spec: str = "fixed:0", seed: int = 0):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self.params[0] if self.params else 0.0
+            if self.kind == "uniform":
+                return self._random.uniform(*self.params)
+            if self.kind == "normal":
+                return max(0.0, self._random.gauss(*self.params))
+            return self._random.lognormvariate(*self.params)
+
+
+class MockScript:
+    """
+    脚本化的回答：按顺序匹配提示词，返回第一条匹配规则的回答。
+    脚本为 YAML 列表，每条规则包含 match（正则）以及 response（固定回答）或 responses（按采样轮换的多个回答）。
+    未匹配任何规则时，裁判提示词返回由提示词哈希决定的固定分数，其他提示词返回 default_response。
+    """
+    JUDGE_MARKER = "Score: [Total score out of 100]"
+
+    def __init__(self, rules: list[dict] = None, default_response: str = "借贷"):
+        self.rules = [
+            (re.compile(rule["match"], re.DOTALL), rule.get("responses") or [rule["response"]])
+            for rule in (rules or [])
+        ]
+        self.default_response = default_response
+
+    @classmethod
+    def load(cls, path: str) -> "MockScript":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        return cls(data.get("rules", []), data.get("default_response", "借贷"))
+
+    def respond(self, prompt: str, sample: int = 0) -> str:
+        for pattern, responses in self.rules:
+            if pattern.search(prompt):
+                return responses[sample % len(responses)]
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        if "### Item 1" in prompt:
+            # 批量评分
+            count = len(re.findall(r"^\s*### Item \d+\s*$", prompt, re.MULTILINE))
+            return "\n".join(f"### Item {i}\nScore: {(digest >> i) % 101}\nReason: mock verdict {i}" for i in range(1, count + 1))
+        if self.JUDGE_MARKER in prompt:
+            return f"Score: {digest % 101}\nReason: mock verdict"
+        return self.default_response
+
+
+class MockLLMServer:
+    """
+    本地的模拟 LLM 服务，同时支持 OpenAI chat completions（/v1/chat/completions）与 Ollama（/api/chat）协议，
+    用于在没有真实 API 的情况下测试和压测评测框架本身。
+    支持脚本化回答、可配置的延迟分布、流式返回，以及按比例注入 429、超时和 5xx 故障。
+    所有随机性都来自固定种子，相同的请求序列得到相同的结果。
+    :param latency: 首 token（非流式时为整个回答）的延迟分布，见 LatencyModel。
+    :param token_latency: 流式返回时相邻 token 之间的延迟分布。
+    :param rate_limit_rate: 返回 429（带 Retry-After）的请求比例。
+    :param timeout_rate: 挂起 hang 秒后才返回的请求比例，用于触发客户端超时。
+    :param error_rate: 返回 500 的请求比例。
+    :param load_time: 模拟 Ollama 第一次请求某个模型时把模型加载进显存的秒数，并在 load_duration 中返回。
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, script: MockScript = None,
+                 latency: str = "fixed:0", token_latency: str = "fixed:0",
+                 rate_limit_rate: float = 0.0, timeout_rate: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 1.0, hang: float = 120.0, load_time: float = 0.0, seed: int = 0):
+        self.script = script or MockScript()
+        self.latency = LatencyModel(latency, seed)
+        self.token_latency = LatencyModel(token_latency, seed + 1)
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.hang = hang
+        self.load_time = load_time
+        self._loaded_models = set()
+        self._faults = random.Random(seed + 2)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "timeouts": 0, "errors": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _draw_fault(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._faults.random()
+            for fault, rate in (("rate_limited", self.rate_limit_rate), ("timeouts", self.timeout_rate), ("errors", self.error_rate)):
+                if roll < rate:
+                    self.stats[fault] += 1
+                    return fault
+                roll -= rate
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 关闭 Nagle 算法，避免与客户端的延迟确认叠加出约 40ms 的额外延迟
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models") or self.path.startswith("/api/tags"):
+                    self._send_json(200, {"object": "list", "data": [], "models": []})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fault = server._draw_fault()
+                if fault == "rate_limited":
+                    self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+                if fault == "errors":
+                    self._send_json(500, {"error": {"message": "internal error", "type": "server_error"}})
+                    return
+                if fault == "timeouts":
+                    time.sleep(server.hang)
+
+                if self.path.endswith("/api/chat"):
+                    self._ollama(body)
+                elif self.path.endswith("/chat/completions"):
+                    self._openai(body)
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def _prompt(self, body: dict) -> str:
+                return "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+
+            def _sample(self, body: dict) -> int:
+                # 多次采样时客户端按采样序号递增 seed（Ollama 的 seed 在 options 中）
+                return int(body.get("seed", body.get("options", {}).get("seed", 42))) - 42
+
+            def _openai(self, body: dict):
+                prompt = self._prompt(body)
+                n = int(body.get("n", 1))
+                texts = [server.script.respond(prompt, self._sample(body) + i) for i in range(n)]
+                usage = {"prompt_tokens": len(prompt), "completion_tokens": sum(len(text) for text in texts)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                time.sleep(server.latency.sample())
+                if not body.get("stream"):
+                    self._send_json(200, {
+                        "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                        "choices": [
+                            {"index": i, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                            for i, text in enumerate(texts)
+                        ],
+                        "usage": usage,
+                    })
+                    return
+                self._start_chunked("text/event-stream")
+                for i, token in enumerate(texts[0]):
+                    if i:
+                        time.sleep(server.token_latency.sample())
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                final = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                         "choices": [], "usage": {**usage, "completion_tokens": len(texts[0])}}
+                self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n")
+                self._end_chunked()
+
+            def _ollama(self, body: dict):
+                start = time.perf_counter()
+                model = body.get("model")
+                with server._lock:
+                    loading = model not in server._loaded_models
+                    server._loaded_models.add(model)
+                if loading:
+                    time.sleep(server.load_time)
+                load_duration = time.perf_counter() - start
+                if not body.get("messages"):
+                    # 不含消息的请求只加载模型
+                    self._send_json(200, {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load",
+                                          "load_duration": int(load_duration * 1e9), "total_duration": int(load_duration * 1e9)})
+                    return
+
+                prompt = self._prompt(body)
+                text = server.script.respond(prompt, self._sample(body))
+                time.sleep(server.latency.sample())
+                prompt_done = time.perf_counter()
+
+                def final_fields():
+                    end = time.perf_counter()
+                    return {
+                        "prompt_eval_count": len(prompt), "eval_count": len(text),
+                        "load_duration": int(load_duration * 1e9),
+                        "prompt_eval_duration": int((prompt_done - start - load_duration) * 1e9),
+                        "eval_duration": int((end - prompt_done) * 1e9),
+                        "total_duration": int((end - start) * 1e9),
+                    }
+
+                if not body.get("stream", True):
+                    for _ in text[1:]:
+                        time.sleep(server.token_latency.sample())
+                    self._send_json(200, {"model": model, "message": {"role": "assistant", "content": text}, "done": True, **final_fields()})
+                    return
+                self._start_chunked("application/x-ndjson")
+                for i, token in enumerate(text):
+                    if i:
+                        time.sleep(server.token_latency.sample())
+                    self._write_chunk(json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}, ensure_ascii=False) + "\n")
+                self._write_chunk(json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True, **final_fields()}) + "\n")
+                self._end_chunked()
+
+            def _send_json(self, status: int, data: dict, headers: dict = None):
+                payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _start_chunked(self, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _write_chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock LLM server speaking the OpenAI and Ollama chat protocols")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", type=str, default=None, help="YAML file with scripted responses (rules: [{match, response | responses}], default_response).")
+    parser.add_argument("--latency", type=str, default="fixed:0", help="Latency before the first token, e.g. fixed:0.05, uniform:0.01,0.1, lognormal:-3,0.5.")
+    parser.add_argument("--token_latency", type=str, default="fixed:0", help="Latency between streamed tokens, same format as --latency.")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry_after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses.")
+    parser.add_argument("--timeout_rate", type=float, default=0.0, help="Fraction of requests that hang for --hang seconds.")
+    parser.add_argument("--hang", type=float, default=120.0, help="Seconds a 'timeout' request hangs before answering.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--load_time", type=float, default=0.0, help="Seconds the first Ollama request of each model spends 'loading' the model (reported as load_duration).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency and fault generators.")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port,
+        script=MockScript.load(args.script) if args.script else None,
+        latency=args.latency, token_latency=args.token_latency,
+        rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate, error_rate=args.error_rate,
+        retry_after=args.retry_after, hang=args.hang, load_time=args.load_time, seed=args.seed,
+    )
+    print(f"🧪 Mock LLM server listening on {server.url} (OpenAI: {server.url}/v1, Ollama: {server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
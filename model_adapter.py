@@ -1,142 +1,369 @@
 # model_adapter.py
 from abc import ABC, abstractmethod
-import os
-from openai import OpenAI
-import requests
-import json
+from dataclasses import dataclass, field
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import tracing
+from rate_limit import RetryPolicy, estimate_tokens
+from reasoning import ReasoningParser
+
+
+# 模型调用结果的状态
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"            # 未能在规定时间内生成完整响应，视为模型不可用，计 0 分
+STATUS_RATE_LIMITED = "rate_limited"  # 重试后仍被服务端限流（429）
+STATUS_ERROR = "error"                # 其他请求错误或返回格式错误
+STATUS_OUT_OF_TIME = "out_of_time"    # 超出时间预算：未运行，或被调度器设置的截止时间中断（见 scheduler.py）
+STATUS_THINKING_BUDGET = "thinking_budget"  # 思考超出预算被提前中断，没有给出回答，与超时一样计 0 分
+
+# 模型没有给出完整回答（超时或思考超出预算），计 0 分
+INCOMPLETE_STATUSES = (STATUS_TIMEOUT, STATUS_THINKING_BUDGET)
+
+# 请求失败（不是模型的回答），任务不计分，也不写入运行日志，--resume 时会重新运行
+FAILED_STATUSES = (STATUS_RATE_LIMITED, STATUS_ERROR)
+# 不计分的状态：请求失败，以及超出时间预算（同样不写入运行日志，--resume 时会重新运行）
+UNSCORED_STATUSES = FAILED_STATUSES + (STATUS_OUT_OF_TIME,)
+
+
+@dataclass
+class ModelResponse:
+    """
+    一次模型调用的结果。
+    :param text: 模型的文本输出（出错时为错误信息）。
+    :param cached: 是否命中本地回答缓存。
+    :param metrics: 流式生成时记录的延迟指标（ttft、itl_p50/p90/p99、output_tokens、tokens_per_sec）。
+    :param usage: 本次调用的 token 用量（prompt_tokens、completion_tokens、reasoning_tokens），服务端未返回时为空。
+    :param status: 调用状态，见 STATUS_*。
+    :param retryable: 出错时是否值得重试（限流、5xx、连接错误）。
+    :param retry_after: 服务端通过 Retry-After 要求等待的秒数。
+    :param timings: 服务端返回的计时（秒），如 Ollama 的模型加载、提示词处理与解码耗时，见各适配器。
+    text 中不包含思考内容；流式生成时 metrics 中还记录思考的 token 数与耗时（thinking_tokens、thinking_time）。
+    :param endpoint: 配置了多个服务端副本时，处理该请求的副本地址。
+    """
+    text: str
+    cached: bool = False
+    metrics: dict = field(default_factory=dict)
+    usage: dict = field(default_factory=dict)
+    status: str = STATUS_OK
+    retryable: bool = False
+    retry_after: float = None
+    timings: dict = field(default_factory=dict)
+    endpoint: str = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+
+def make_usage(prompt_tokens: int = 0, completion_tokens: int = 0, reasoning_tokens: int = 0) -> dict:
+    """构造统一格式的 token 用量 dict。reasoning_tokens 已包含在 completion_tokens 中。"""
+    return {
+        "prompt_tokens": prompt_tokens or 0,
+        "completion_tokens": completion_tokens or 0,
+        "reasoning_tokens": reasoning_tokens or 0,
+    }
+
+def add_usage(total: dict, usage: dict) -> dict:
+    """累加两份 token 用量，返回新的 dict。"""
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in make_usage()}
+
+
+# 当前线程中模型请求的截止时间（time.monotonic()），由 request_deadline 设置
+_deadline = threading.local()
+
+@contextmanager
+def request_deadline(seconds: float = None):
+    """
+    在当前线程中为模型请求设置截止时间（从现在起 seconds 秒），退出时恢复之前的截止时间。
+    seconds 为 None 时不设置。截止时间之前未完成的请求被中断并标记为 STATUS_OUT_OF_TIME，见 BaseModelAdapter._request。
+    """
+    previous = getattr(_deadline, "at", None)
+    _deadline.at = time.monotonic() + seconds if seconds is not None else previous
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+def remaining_time() -> float:
+    """当前线程的截止时间之前剩余的秒数（不小于 0），没有截止时间时返回 None。"""
+    at = getattr(_deadline, "at", None)
+    return max(0.0, at - time.monotonic()) if at is not None else None
+
+# 当前线程正在发送的请求：_request 写入预估的 token 数，选定服务端副本后按该副本的限流器取用额度，
+# 并记下所用的限流器（见 BaseModelAdapter._acquire_rate_limit）
+_rate_limit = threading.local()
+
+def bind_deadline(fn):
+    """包装在其他线程中执行的函数（例如并行采样），使其使用调用方当前的截止时间。"""
+    at = getattr(_deadline, "at", None)
+    if at is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        previous = getattr(_deadline, "at", None)
+        _deadline.at = at
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _deadline.at = previous
+    return bound
 
 
 class BaseModelAdapter(ABC):
     """
     模型适配器的基类。
+    每个适配器实例持有一个长连接复用的 HTTP 客户端，可在多个工作线程间共享。
+    :param pool_size: 连接池中最多保持的连接数，建议不小于并发线程数。
+    :param keepalive: 空闲连接保持的秒数，小于等于 0 时不复用连接。
+    :param stream: 是否使用流式生成，流式生成时会记录首 token 延迟、token 间延迟与解码速度。
     """
-    def __init__(self, api_key: str, model_id: str, api_base: str = None):
+    # 单次请求的超时秒数，None 表示使用客户端库的默认值，见 request_timeout
+    TIMEOUT = None
+    # 任务未配置 answer_mode 时回答的保留方式（见 reasoning.ANSWER_MODES）
+    ANSWER_MODE = "full"
+
+    def __init__(self, api_key: str, model_id: str, api_base: str = None, pool_size: int = 10, keepalive: float = 30.0, stream: bool = False):
         self.api_key = api_key
         self.model_id = model_id
         self.api_base = api_base
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.stream = stream
+        # 可选的本地回答缓存（cache.ResponseCache），为 None 时不使用缓存
+        self.cache = None
+        # 可选的客户端限流器，每个服务端副本一个 {副本地址: rate_limit.RateLimiter}，
+        # 与使用同一服务端的其他适配器共享（见 rate_limit.shared_rate_limiters）
+        self.rate_limiters = {}
+        # 限流、5xx 等可重试错误的重试策略
+        self.retry_policy = RetryPolicy()
+        # 多个服务端副本（api_base 为逗号分隔的多个地址）时的端点池（endpoint_pool.EndpointPool），由各适配器创建
+        self.endpoints = None
+        # 思考预算（token 数、秒），流式生成时思考超出预算即中断请求，为 None 时不限制
+        self.max_thinking_tokens = None
+        self.max_thinking_time = None
+        # 聊天模板把 <think> 放在提示词中，输出从思考开始（见 reasoning.ReasoningParser 的 start_thinking）
+        self.start_thinking = False
+
+    def request_params(self, sample: int = 0) -> dict:
+        """
+        除模型 ID 和提示词外，决定模型输出的全部请求参数。
+        同时用于构造请求和回答缓存的缓存键。
+        :param sample: 多次采样时的采样序号，各适配器据此使用不同的随机种子。
+        """
+        return {}
+
+    def sample_params(self, sample: int, n: int) -> dict:
+        """
+        共 n 次采样时第 sample 次采样的请求参数，用作回答缓存的缓存键。
+        默认每次采样单独请求，与 request_params(sample) 相同；一次请求生成多个采样的适配器需要覆盖此方法。
+        """
+        return self.request_params(sample)
+
+    def request_timeout(self) -> float:
+        """
+        本次请求使用的超时秒数：适配器自身的 TIMEOUT 与当前线程截止时间之前的剩余时间中较短的一个，
+        都没有时返回 None（使用客户端库的默认值）。
+        """
+        remaining = remaining_time()
+        if remaining is None:
+            return self.TIMEOUT
+        # 超时为 0 时部分客户端库视为不限制
+        remaining = max(remaining, 0.001)
+        return remaining if self.TIMEOUT is None else min(self.TIMEOUT, remaining)
+
+    def reasoning_parser(self) -> ReasoningParser:
+        """为一次流式请求创建按本适配器的思考预算中断的解析器。"""
+        return ReasoningParser(self.max_thinking_tokens, self.max_thinking_time, start_thinking=self.start_thinking)
+
+    def warm_up(self) -> dict:
+        """
+        在第一个任务之前预热模型（例如让本地服务把模型加载进显存），使模型加载时间不计入任务耗时。
+        默认不做任何事；支持预热的适配器返回服务端计时（如 load_duration），失败时返回空 dict。
+        """
+        return {}
+
+    def complete(self, prompt: str, sample: int = 0) -> ModelResponse:
+        """
+        经过回答缓存向模型发送请求。
+        命中缓存时不会请求模型；出错的回答不会写入缓存。
+        """
+        if self.cache is not None:
+            cached_text = self.cache.lookup(self, prompt, sample)
+            if cached_text is not None:
+                return ModelResponse(text=cached_text, cached=True)
+
+        model_response = self._request(lambda: self._complete(prompt, sample), prompt)
+        if self.cache is not None and model_response.ok:
+            self.cache.store(self, prompt, model_response.text, sample)
+        return model_response
+
+    def complete_samples(self, prompt: str, n: int) -> list[ModelResponse]:
+        """
+        对同一个提示词采样 n 次，经过回答缓存（按采样序号分别缓存）。
+        只请求未命中缓存的采样。
+        """
+        if n <= 1:
+            return [self.complete(prompt)]
+        responses = [None] * n
+        if self.cache is not None:
+            for sample in range(n):
+                cached_text = self.cache.lookup(self, prompt, sample, n)
+                if cached_text is not None:
+                    responses[sample] = ModelResponse(text=cached_text, cached=True)
+
+        missing = [sample for sample in range(n) if responses[sample] is None]
+        if missing:
+            for sample, model_response in zip(missing, self._complete_samples(prompt, missing)):
+                responses[sample] = model_response
+                if self.cache is not None and model_response.ok:
+                    self.cache.store(self, prompt, model_response.text, sample, n)
+        return responses
+
+    def _complete_samples(self, prompt: str, samples: list[int]) -> list[ModelResponse]:
+        """
+        实际请求给定序号的采样（不经过缓存）。默认以各自的采样序号（随机种子）并行发送请求，
+        支持单次请求返回多个候选的适配器可以覆盖此方法。
+        """
+        with ThreadPoolExecutor(max_workers=len(samples), thread_name_prefix="sample") as executor:
+            request = tracing.bind(bind_deadline(lambda sample: self._request(lambda: self._complete(prompt, sample), prompt)))
+            return list(executor.map(request, samples))
+
+    def _request(self, call, prompt: str, samples: int = 1):
+        """
+        经过限流与重试执行一次请求。
+        :param call: 实际发送请求的函数，返回 ModelResponse 或（一次请求多个采样时）ModelResponse 列表。
+        :param samples: 本次请求生成的采样数，用于预估 token 用量。
+        限流（429）时按 Retry-After 暂停共享同一限流器的全部请求；5xx、连接错误按指数退避重试，
+        超时和其他错误不重试。
+        当前线程设置了截止时间（request_deadline）时：截止时间已过则不再发送请求，因截止时间而超时的请求，
+        以及等不到下一次重试的请求，都标记为 STATUS_OUT_OF_TIME。
+        """
+        estimated = estimate_tokens(prompt) * (1 + samples)
+        for attempt in range(self.retry_policy.max_retries + 1):
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                responses = [ModelResponse(text="Error: request deadline exceeded", status=STATUS_OUT_OF_TIME) for _ in range(samples)]
+                return responses if samples > 1 else responses[0]
+            _rate_limit.estimated = estimated
+            _rate_limit.limiter = None
+            if self.endpoints is None:
+                # 没有端点池时请求都发往 api_base；有端点池时在 _on_endpoint 选定副本后取用额度
+                self._acquire_rate_limit(self.api_base)
+            result = call()
+            first = result[0] if isinstance(result, list) else result
+            rate_limiter = _rate_limit.limiter
+            if rate_limiter is not None:
+                responses = result if isinstance(result, list) else [result]
+                actual = sum(r.usage.get("prompt_tokens", 0) + r.usage.get("completion_tokens", 0) for r in responses)
+                rate_limiter.record(estimated, actual)
+            if first.status == STATUS_TIMEOUT and remaining is not None and (self.TIMEOUT is None or remaining < self.TIMEOUT):
+                # 截止时间比适配器自身的超时更早，超时是调度器的截止时间造成的，不是模型不可用
+                for response in (result if isinstance(result, list) else [result]):
+                    response.status = STATUS_OUT_OF_TIME
+                return result
+            if first.ok or not first.retryable or attempt == self.retry_policy.max_retries:
+                return result
+            delay = self.retry_policy.delay(attempt, first.retry_after)
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                for response in (result if isinstance(result, list) else [result]):
+                    response.status = STATUS_OUT_OF_TIME
+                return result
+            if first.status == STATUS_RATE_LIMITED and rate_limiter is not None:
+                rate_limiter.pause(delay)
+            print(f"⏳ {self.model_id}: {first.status}, retrying in {delay:.1f}s ({attempt + 1}/{self.retry_policy.max_retries})")
+            with tracing.span("retry_backoff"):
+                time.sleep(delay)
+
+    def _on_endpoint(self, call):
+        """
+        在端点池中选出一个副本执行 call(url)，call 返回 ModelResponse 或其列表。
+        请求出错（超时除外）计为该副本的一次失败；有多个副本时在结果上记录处理请求的副本。
+        没有端点池时直接使用 api_base。请求耗时按端点记入当前的 Tracer（request 阶段）。
+        """
+        if self.endpoints is None:
+            with tracing.span("request", model=self.model_id, endpoint=self.api_base):
+                return call(self.api_base)
+        endpoint = self.endpoints.acquire()
+        failed = True
+        try:
+            self._acquire_rate_limit(endpoint.url)
+            with tracing.span("request", model=self.model_id, endpoint=endpoint.url):
+                result = call(endpoint.url)
+            responses = result if isinstance(result, list) else [result]
+            failed = any(response.status == STATUS_ERROR for response in responses)
+            if len(self.endpoints) > 1:
+                for response in responses:
+                    response.endpoint = endpoint.url
+            return result
+        finally:
+            self.endpoints.release(endpoint, failed)
+
+    def _acquire_rate_limit(self, url: str):
+        """发送请求前按服务端副本 url 的限流器取用 _request 预估的额度，并记下所用的限流器供之后修正用量。"""
+        rate_limiter = self.rate_limiters.get(url)
+        if rate_limiter is None and len(self.rate_limiters) == 1:
+            # 单个服务端时 api_base 可能带有末尾的斜杠等，与拆分后的地址不完全相同
+            rate_limiter = next(iter(self.rate_limiters.values()))
+        _rate_limit.limiter = rate_limiter
+        if rate_limiter is not None:
+            with tracing.span("rate_limit_wait"):
+                rate_limiter.acquire(getattr(_rate_limit, "estimated", 0))
 
-    @abstractmethod
     def query(self, prompt: str) -> str:
         """
         向模型发送请求并获取返回结果。
         :param prompt: 发送给模型的提示词。
         :return: 模型的文本输出。
         """
+        return self.complete(prompt).text
+
+    @abstractmethod
+    def _complete(self, prompt: str, sample: int = 0) -> ModelResponse:
+        """
+        实际向模型发送请求（不经过缓存），由各适配器实现。
+        """
         pass
 
-class OpenAIAdapter(BaseModelAdapter):
-    """
-    适用于 OpenAI API 的适配器。
-    也兼容所有遵循 OpenAI API 格式的本地模型服务，例如 LM Studio, LocalAI 等。
-    """
-    def __init__(self, api_key: str, model_id: str, api_base: str = None):
-        super().__init__(api_key, model_id, api_base)
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base,
-        )
 
-    def query(self, prompt: str) -> str:
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=self.model_id,
-                seed=42,  # 设置随机种子以确保结果可复现
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error calling OpenAI API: {e}")
-            return f"Error: {e}"
-
-
-class OllamaAdapter(BaseModelAdapter):
-    """
-    适用于本地运行的 Ollama 服务的适配器。
-    """
-    def __init__(self, api_key: str, model_id: str, api_base: str = None):
-        # api_key 在此适配器中被忽略，但为了接口统一性而保留
-        super().__init__(api_key, model_id, api_base)
-        # 如果用户未提供 api_base，则使用 Ollama 的默认地址
-        self.api_base = api_base or "http://localhost:11434"
-        self.api_endpoint = f"{self.api_base}/api/chat"
+# 内置适配器：类型 -> "模块:类名"。模块只在对应类型被选中时才导入，
+# 只评测 Ollama 模型或只查看任务列表时不会导入 openai 等第三方库
+ADAPTERS = {
+    "openai": "openai_adapter:OpenAIAdapter",
+    "ollama": "ollama_adapter:OllamaAdapter",
+}
 
-    def query(self, prompt: str) -> str:
-        """
-        使用 /api/chat 端点向 Ollama 模型发送请求。
-        """
-        payload = {
-            "model": self.model_id,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            "stream": False,
-            "seed": 42,  # 设置随机种子以确保结果可复现
-        }
+# 第三方适配器通过该 entry point 组注册，例如在 pyproject.toml 中：
+# [project.entry-points."noah_llm_benchmark.adapters"]
+# my_backend = "my_package.adapter:MyAdapter"
+ADAPTER_ENTRY_POINT_GROUP = "noah_llm_benchmark.adapters"
 
-        try:
-            response = requests.post(
-                self.api_endpoint,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(payload),
-                timeout=100 # 设置100秒超时，超过100秒还无法返回完整响应，视为此模型在实际应用中不可用
-            )
-            # 如果API返回错误状态码（如 404, 500），则会抛出异常
-            response.raise_for_status()
-            
-            response_data = response.json()
-
-            response_with_think = response_data.get('message', {}).get('content', '').strip()
-            
-            # 从返回的JSON中提取核心回复内容
-            return self.extract_ollama_thinking_and_category(response_with_think).get('answer', response_with_think)
-
-        except requests.exceptions.RequestException as e:
-            error_message = f"Error calling Ollama API: {e}"
-            print(error_message)
-            return f"Error: {error_message}"
-        except KeyError:
-            error_message = f"Error: Unexpected response format from Ollama. Response: {response.text}"
-            print(error_message)
-            return error_message
-    def extract_ollama_thinking_and_category(self, response_str):
-        # 移除 'response': '<think>' 和末尾的单引号
-        processed_str = response_str.replace("'response': '<think>", "").strip()
-        if processed_str.endswith("'"):
-            processed_str = processed_str[:-1].strip()
-
-        # 找到 </think> 的位置
-        end_think_index = processed_str.find('</think>')
-
-        if end_think_index != -1:
-            # 思考内容是 </think> 之前的部分
-            thinking_content = processed_str[:end_think_index].strip()
-            
-            # 分类结果是 </think> 之后，直到字符串末尾的部分
-            # 首先移除 </think> 标签，然后取最后一行
-            remaining_str = processed_str[end_think_index + len('</think>'):].strip()
-            
-            # 分类结果通常是最后一行，所以我们按行分割并取最后一行
-            lines = remaining_str.splitlines()
-            answer = lines[-1].strip() if lines else ""
-
-            return {
-                "thinking": thinking_content,
-                "answer": answer
-            }
-        else:
-            # 如果没有 <think> 标签，可能是纯文本结果或者格式不同
-            # 尝试直接将整个内容作为分类结果（或者根据实际情况调整）
-            lines = processed_str.splitlines()
-            answer = lines[-1].strip() if lines else ""
-            return {
-                "thinking": "", # 或者可以返回原始字符串作为思考，取决于预期
-                "answer": answer
-            }
+
+def load_object(target: str):
+    """导入 "模块:属性" 形式的引用并返回该对象。"""
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+def entry_point_targets(group: str) -> dict:
+    """列出通过 entry point 注册的扩展：名称 -> "模块:属性"，只读取元数据，不导入扩展模块。"""
+    from importlib.metadata import entry_points
+    return {entry_point.name: entry_point.value for entry_point in entry_points(group=group)}
+
+def adapter_types() -> list[str]:
+    """全部可用的适配器类型（内置 + entry point 注册）。"""
+    return sorted({**entry_point_targets(ADAPTER_ENTRY_POINT_GROUP), **ADAPTERS})
+
+def get_adapter_class(adapter_type: str):
+    """按类型查找适配器类，只导入该类型所在的模块。内置类型优先于同名的 entry point。"""
+    target = ADAPTERS.get(adapter_type) or entry_point_targets(ADAPTER_ENTRY_POINT_GROUP).get(adapter_type)
+    if target is None:
+        raise ValueError(f"Unknown adapter type: {adapter_type} (available: {', '.join(adapter_types())})")
+    return load_object(target)
+
+def build_model_adapter(adapter_type: str, **kwargs) -> BaseModelAdapter:
+    """根据适配器类型创建被测模型适配器。"""
+    return get_adapter_class(adapter_type)(**kwargs)
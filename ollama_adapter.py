@@ -0,0 +1,208 @@
+# ollama_adapter.py
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from endpoint_pool import EndpointPool, split_endpoints
+from metrics import StreamMetrics
+from model_adapter import STATUS_ERROR, STATUS_RATE_LIMITED, STATUS_THINKING_BUDGET, STATUS_TIMEOUT, BaseModelAdapter, ModelResponse, make_usage
+from rate_limit import estimate_tokens, parse_retry_after
+from reasoning import ReasoningParser, ThinkingBudgetExceeded, split_reasoning
+
+
+class OllamaAdapter(BaseModelAdapter):
+    """
+    适用于本地运行的 Ollama 服务的适配器。
+    :param keep_alive: 请求后模型在显存中保留的时长，如 "30m"、3600（秒）、-1（一直保留），为 None 时使用服务端默认值（5 分钟）。
+    :param options: 传给 Ollama 的模型参数（options），如 {"num_ctx": 8192, "temperature": 0}。
+    api_base 可以是逗号分隔的多个 Ollama 地址（运行同一个模型的多台机器），请求在各副本间负载均衡，见 EndpointPool。
+    每次调用都会记录 Ollama 返回的模型加载、提示词处理与解码耗时，见 parse_timings。
+    回答中的思考内容（<think> 标签或 message.thinking）被去掉；任务未配置 answer_mode 时只保留回答的最后一行。
+    """
+    # 设置100秒超时，超过100秒还无法返回完整响应，视为此模型在实际应用中不可用
+    TIMEOUT = 100
+    # 本地模型常在答案前附带解释，默认只保留最后一行
+    ANSWER_MODE = "last_line"
+
+    def __init__(self, api_key: str, model_id: str, api_base: str = None, pool_size: int = 10, keepalive: float = 30.0, stream: bool = False, keep_alive=None, options: dict = None):
+        # api_key 在此适配器中被忽略，但为了接口统一性而保留
+        super().__init__(api_key, model_id, api_base, pool_size, keepalive, stream)
+        self.keep_alive = keep_alive
+        self.options = options or {}
+        # 如果用户未提供 api_base，则使用 Ollama 的默认地址
+        self.api_base = api_base or "http://localhost:11434"
+        self.endpoints = EndpointPool(split_endpoints(self.api_base), probe=self._probe)
+
+        # 复用同一个 Session 以获得 keep-alive；底层 urllib3 连接池是线程安全的，
+        # 创建后不再修改 Session 的状态，因此可以在多个工作线程间共享
+        self.session = requests.Session()
+        http_adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=self.pool_size)
+        self.session.mount("http://", http_adapter)
+        self.session.mount("https://", http_adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Connection": "keep-alive" if self.keepalive > 0 else "close",
+        })
+
+    def request_params(self, sample: int = 0) -> dict:
+        return {
+            "stream": self.stream,
+            # Ollama 只读取 options 中的 seed。设置随机种子以确保结果可复现，多次采样时每次采样使用不同的种子
+            "options": {**self.options, "seed": 42 + sample},
+        }
+
+    def _payload(self, messages: list, **params) -> dict:
+        payload = {"model": self.model_id, "messages": messages, **params}
+        if self.keep_alive is not None:
+            # keep_alive 不影响模型输出，因此不属于 request_params（不进入回答缓存的缓存键）
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def warm_up(self) -> dict:
+        """
+        向每个副本发送不含消息的请求，让 Ollama 把模型加载进显存（并按 keep_alive 保留）。
+        返回服务端计时，其中 load_duration 为最慢的副本的加载耗时；全部副本都失败时返回空 dict。
+        """
+        timings = {}
+        for endpoint in self.endpoints.endpoints:
+            try:
+                response = self.session.post(f"{endpoint.url}/api/chat", data=json.dumps(self._payload([], stream=False)), timeout=self.TIMEOUT)
+                response.raise_for_status()
+                endpoint_timings = self.parse_timings(response.json())
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Warning: failed to warm up Ollama model {self.model_id} on {endpoint.url}: {e}")
+                continue
+            if endpoint_timings.get("load_duration", 0.0) >= timings.get("load_duration", 0.0):
+                timings = endpoint_timings
+        return timings
+
+    def _probe(self, url: str):
+        """健康检查：请求模型列表。"""
+        self.session.get(f"{url}/api/tags", timeout=10).raise_for_status()
+
+    def _complete(self, prompt: str, sample: int = 0) -> ModelResponse:
+        """
+        使用 /api/chat 端点向 Ollama 模型发送请求，有多个副本时发往处理中请求最少的副本。
+        """
+        return self._on_endpoint(lambda url: self._complete_at(url, prompt, sample))
+
+    def _complete_at(self, url: str, prompt: str, sample: int = 0) -> ModelResponse:
+        payload = self._payload(
+            [
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            **self.request_params(sample),
+        )
+
+        # 调度器设置了截止时间时，超时取 TIMEOUT 与剩余时间中较短的一个
+        timeout = self.request_timeout()
+        try:
+            response = self.session.post(
+                f"{url}/api/chat",
+                data=json.dumps(payload),
+                timeout=timeout,
+                stream=self.stream,
+            )
+            # 如果API返回错误状态码（如 404, 500），则会抛出异常
+            response.raise_for_status()
+
+            metrics = {}
+            if self.stream:
+                parser, metrics, response_data = self._consume_stream(response, timeout)
+                reasoning_tokens = parser.thinking_tokens
+            else:
+                response_data = response.json()
+                message = response_data.get('message', {})
+                parser = split_reasoning(message.get('content', ''), message.get('thinking'))
+                # 非流式时无法按分块计数，按思考内容的长度估计
+                reasoning_tokens = estimate_tokens(parser.reasoning) if parser.reasoning else 0
+
+            # Ollama 在最后一个响应中返回 prompt_eval_count / eval_count，不单独统计思考 token
+            usage = make_usage(
+                prompt_tokens=response_data.get('prompt_eval_count'),
+                completion_tokens=response_data.get('eval_count'),
+                reasoning_tokens=reasoning_tokens,
+            )
+            return ModelResponse(text=parser.answer, metrics=metrics, usage=usage, timings=self.parse_timings(response_data))
+
+        except ThinkingBudgetExceeded as e:
+            print(f"Ollama model {self.model_id}: {e}, request aborted")
+            return ModelResponse(text=f"Error: {e}", status=STATUS_THINKING_BUDGET)
+        except requests.exceptions.RequestException as e:
+            error_message = f"Error calling Ollama API: {e}"
+            print(error_message)
+            return self._error_response(e, f"Error: {error_message}")
+        except (KeyError, ValueError):
+            error_message = f"Error: Unexpected response format from Ollama. Response: {response.text}"
+            print(error_message)
+            return ModelResponse(text=error_message, status=STATUS_ERROR)
+
+    @staticmethod
+    def parse_timings(response_data: dict) -> dict:
+        """
+        将 Ollama 返回的纳秒计时换算为秒：
+        load_duration 模型加载，prompt_eval_duration 提示词处理，eval_duration 解码，total_duration 服务端总耗时，
+        以及提示词处理与解码的速度 prompt_eval_rate / eval_rate（tokens/s）。服务端未返回的项不出现在结果中。
+        """
+        timings = {
+            name: round(response_data[name] / 1e9, 4)
+            for name in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+            if response_data.get(name) is not None
+        }
+        for rate, count, duration in (("prompt_eval_rate", "prompt_eval_count", "prompt_eval_duration"), ("eval_rate", "eval_count", "eval_duration")):
+            if response_data.get(count) and response_data.get(duration):
+                timings[rate] = round(response_data[count] / (response_data[duration] / 1e9), 2)
+        return timings
+
+    @staticmethod
+    def _error_response(e: requests.exceptions.RequestException, text: str) -> ModelResponse:
+        """将 requests 的异常转换为带状态的 ModelResponse。"""
+        if isinstance(e, requests.exceptions.Timeout) and not isinstance(e, requests.exceptions.ConnectTimeout):
+            return ModelResponse(text=text, status=STATUS_TIMEOUT)
+        if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+            if e.response.status_code == 429:
+                return ModelResponse(text=text, status=STATUS_RATE_LIMITED, retryable=True, retry_after=retry_after)
+            return ModelResponse(text=text, status=STATUS_ERROR, retryable=e.response.status_code >= 500, retry_after=retry_after)
+        # 连接被拒绝、连接中断等通常是暂时的（例如 Ollama 正在加载模型）
+        return ModelResponse(text=text, status=STATUS_ERROR, retryable=isinstance(e, requests.exceptions.ConnectionError))
+
+    def _consume_stream(self, response, timeout: float) -> tuple[ReasoningParser, dict, dict]:
+        """
+        逐行读取 Ollama 流式返回的 JSON，边接收边拆分思考内容与回答，并记录每个 token 的到达时间。
+        requests 的 timeout 只限制两次读取之间的间隔，这里额外限制整个生成过程的总时长不超过 timeout 秒。
+        思考超出预算时抛出 ThinkingBudgetExceeded，关闭连接以中断生成。
+        :return: (解析器, 流式指标（含思考 token 数与耗时）, 最后一个（done）分块)
+        """
+        stream_metrics = StreamMetrics()
+        parser = self.reasoning_parser()
+        output_tokens = None
+        final_chunk = {}
+        try:
+            # chunk_size=None：数据到达即处理，避免缓冲导致 token 时间失真
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                message = chunk.get('message', {})
+                content = message.get('content', '')
+                thinking = message.get('thinking', '')
+                if content or thinking:
+                    stream_metrics.on_token()
+                    parser.feed_reasoning(thinking)
+                    parser.feed(content)
+                    parser.check()
+                if chunk.get('done'):
+                    output_tokens = chunk.get('eval_count')
+                    final_chunk = chunk
+                    break
+                if stream_metrics.token_times and stream_metrics.token_times[-1] - stream_metrics.start_time > timeout:
+                    raise requests.exceptions.Timeout(f"stream exceeded timeout of {timeout:.1f}s")
+        finally:
+            response.close()
+        parser.finish()
+        return parser, {**stream_metrics.finish(output_tokens), **parser.stats()}, final_chunk
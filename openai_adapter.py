@@ -0,0 +1,209 @@
+# openai_adapter.py
+import time
+
+import httpx
+import openai
+from openai import OpenAI
+
+from endpoint_pool import EndpointPool, split_endpoints
+from metrics import StreamMetrics
+from model_adapter import STATUS_ERROR, STATUS_RATE_LIMITED, STATUS_THINKING_BUDGET, STATUS_TIMEOUT, BaseModelAdapter, ModelResponse, make_usage, remaining_time
+from rate_limit import estimate_tokens, parse_retry_after
+from reasoning import ThinkingBudgetExceeded, split_reasoning
+
+
+class OpenAIAdapter(BaseModelAdapter):
+    """
+    适用于 OpenAI API 的适配器。
+    也兼容所有遵循 OpenAI API 格式的本地模型服务，例如 LM Studio, LocalAI 等。
+    api_base 可以是逗号分隔的多个地址（运行同一个模型的多个服务端），请求在各副本间负载均衡，见 EndpointPool。
+    回答中的思考内容（<think> 标签，或 reasoning_content / reasoning 字段）被去掉，不计入回答。
+    """
+    def __init__(self, api_key: str, model_id: str, api_base: str = None, pool_size: int = 10, keepalive: float = 30.0, stream: bool = False):
+        super().__init__(api_key, model_id, api_base, pool_size, keepalive, stream)
+        urls = split_endpoints(self.api_base) or [None]
+        # httpx.Client 自带线程安全的连接池，OpenAI 客户端可在多个线程间共享；连接数上限按副本数放大
+        keepalive_connections = self.pool_size * len(urls) if self.keepalive > 0 else 0
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.pool_size * len(urls),
+                max_keepalive_connections=keepalive_connections,
+                keepalive_expiry=max(self.keepalive, 0.0),
+            ),
+        )
+        # 每个副本一个 OpenAI 客户端，共用同一个连接池
+        self.clients = {
+            url: OpenAI(
+                api_key=self.api_key,
+                base_url=url,
+                http_client=self.http_client,
+                # 重试由 BaseModelAdapter 统一处理（限流器 + Retry-After），关闭 SDK 自带的重试
+                max_retries=0,
+            )
+            for url in urls
+        }
+        self.client = self.clients[urls[0]]
+        if urls[0] is not None:
+            self.endpoints = EndpointPool(urls, probe=self._probe)
+
+    def request_params(self, sample: int = 0) -> dict:
+        params = {
+            "seed": 42 + sample,  # 设置随机种子以确保结果可复现，多次采样时每次采样使用不同的种子
+        }
+        if self.stream:
+            # 在最后一个分块中返回 usage，用于获取准确的输出 token 数
+            params["stream"] = True
+            params["stream_options"] = {"include_usage": True}
+        return params
+
+    def _probe(self, url: str):
+        """健康检查：请求模型列表。"""
+        self.clients[url].with_options(timeout=10).models.list()
+
+    def _timeout_params(self) -> dict:
+        """调度器设置了截止时间时，按剩余时间设置本次请求的超时；否则使用 SDK 的默认超时。"""
+        timeout = self.request_timeout()
+        return {"timeout": timeout} if timeout is not None else {}
+
+    def _complete(self, prompt: str, sample: int = 0) -> ModelResponse:
+        return self._on_endpoint(lambda url: self._complete_at(self.clients[url], prompt, sample))
+
+    def _complete_at(self, client: OpenAI, prompt: str, sample: int = 0) -> ModelResponse:
+        try:
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ],
+                model=self.model_id,
+                **self.request_params(sample),
+                **self._timeout_params(),
+            )
+            if self.stream:
+                return self._consume_stream(chat_completion)
+            return self._parse_message(chat_completion.choices[0].message, self._parse_usage(chat_completion.usage))
+        except Exception as e:
+            return self._error_response(e)
+
+    def sample_params(self, sample: int, n: int) -> dict:
+        if self.stream or n <= 1:
+            return super().sample_params(sample, n)
+        # 非流式时 n 次采样由一次 n=K 的请求生成，全部候选使用同一个种子，因此以候选序号区分
+        return {**self.request_params(), "n": n, "choice": sample}
+
+    def _complete_samples(self, prompt: str, samples: list[int]) -> list[ModelResponse]:
+        """
+        非流式时用一次 n=K 的请求获取全部采样，请求的 token 用量记在第一个采样上。
+        部分 OpenAI 兼容服务会忽略 n，返回的候选不足时其余采样改为单独请求；
+        流式生成需要按请求记录首 token 延迟，因此仍然并行发送 n 个请求。
+        """
+        if self.stream or len(samples) == 1:
+            return super()._complete_samples(prompt, samples)
+        n = len(samples)
+        responses = self._request(lambda: self._on_endpoint(lambda url: self._complete_choices(self.clients[url], prompt, n)), prompt, samples=n)
+        for sample in samples[len(responses):]:
+            responses.append(self._request(lambda: self._complete(prompt, sample), prompt))
+        return responses
+
+    def _complete_choices(self, client: OpenAI, prompt: str, n: int) -> list[ModelResponse]:
+        """发送一次 n=K 的请求，返回服务端给出的全部候选（可能少于 n 个）。"""
+        try:
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ],
+                model=self.model_id,
+                n=n,
+                **self.request_params(),
+                **self._timeout_params(),
+            )
+        except Exception as e:
+            return [self._error_response(e) for _ in range(n)]
+
+        responses = [self._parse_message(choice.message, {}) for choice in chat_completion.choices[:n]]
+        if responses:
+            responses[0].usage = self._parse_usage(chat_completion.usage)
+        return responses
+
+    @staticmethod
+    def _parse_message(message, usage: dict) -> ModelResponse:
+        """拆分非流式回答中的思考内容与回答。服务端未返回思考 token 数时按思考内容的长度估计。"""
+        parser = split_reasoning(message.content or "", _reasoning_field(message))
+        if usage and not usage["reasoning_tokens"] and parser.reasoning:
+            usage["reasoning_tokens"] = estimate_tokens(parser.reasoning)
+        return ModelResponse(text=parser.answer, usage=usage)
+
+    @staticmethod
+    def _error_response(e: Exception) -> ModelResponse:
+        """将 OpenAI SDK 的异常转换为带状态的 ModelResponse。"""
+        print(f"Error calling OpenAI API: {e}")
+        if isinstance(e, openai.APITimeoutError):
+            return ModelResponse(text=f"Error: {e}", status=STATUS_TIMEOUT)
+        if isinstance(e, openai.RateLimitError):
+            return ModelResponse(text=f"Error: {e}", status=STATUS_RATE_LIMITED, retryable=True,
+                                 retry_after=parse_retry_after(e.response.headers.get("retry-after")))
+        if isinstance(e, openai.APIStatusError):
+            return ModelResponse(text=f"Error: {e}", status=STATUS_ERROR, retryable=e.status_code >= 500,
+                                 retry_after=parse_retry_after(e.response.headers.get("retry-after")))
+        # 连接错误（APITimeoutError 之外的 APIConnectionError）通常是暂时的
+        return ModelResponse(text=f"Error: {e}", status=STATUS_ERROR, retryable=isinstance(e, openai.APIConnectionError))
+
+    def _consume_stream(self, chunks) -> ModelResponse:
+        """
+        读取流式返回的分块，边接收边拆分思考内容与回答，并记录每个 token 的到达时间。
+        SDK 的超时只限制两次读取之间的间隔，设置了截止时间时这里额外检查整个生成过程是否超过截止时间。
+        思考超出预算时关闭连接以中断生成。
+        """
+        remaining = remaining_time()
+        deadline = time.monotonic() + remaining if remaining is not None else None
+        stream_metrics = StreamMetrics()
+        parser = self.reasoning_parser()
+        output_tokens = None
+        usage = {}
+        for chunk in chunks:
+            if chunk.usage is not None:
+                output_tokens = chunk.usage.completion_tokens
+                usage = self._parse_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            reasoning = _reasoning_field(delta)
+            # 推理模型的思考内容同样计入 token 时间，但不计入回答
+            if delta.content or reasoning:
+                stream_metrics.on_token()
+                parser.feed_reasoning(reasoning)
+                parser.feed(delta.content)
+                try:
+                    parser.check()
+                except ThinkingBudgetExceeded as e:
+                    chunks.close()
+                    print(f"OpenAI model {self.model_id}: {e}, request aborted")
+                    return ModelResponse(text=f"Error: {e}", status=STATUS_THINKING_BUDGET)
+            if deadline is not None and time.monotonic() > deadline:
+                chunks.close()
+                return ModelResponse(text="Error: stream exceeded request deadline", status=STATUS_TIMEOUT)
+        parser.finish()
+        if usage and not usage["reasoning_tokens"]:
+            usage["reasoning_tokens"] = parser.thinking_tokens
+        return ModelResponse(text=parser.answer, metrics={**stream_metrics.finish(output_tokens), **parser.stats()}, usage=usage)
+
+    @staticmethod
+    def _parse_usage(usage) -> dict:
+        if usage is None:
+            return {}
+        details = getattr(usage, "completion_tokens_details", None)
+        return make_usage(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            reasoning_tokens=getattr(details, "reasoning_tokens", 0) if details else 0,
+        )
+
+
+def _reasoning_field(message) -> str:
+    """OpenAI 兼容服务单独返回的思考内容：reasoning_content（DeepSeek、vLLM 等）或 reasoning（Ollama、OpenRouter 等）。"""
+    return getattr(message, "reasoning_content", None) or getattr(message, "reasoning", None) or ""
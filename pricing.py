@@ -0,0 +1,40 @@
+# pricing.py
+import os
+
+import yaml
+
+
+class PriceTable:
+    """
+    本地模型价格表，将 token 用量换算为费用（美元）。
+    价格单位为美元 / 百万 tokens，见 prices.yaml。
+    """
+    def __init__(self, prices: dict = None):
+        self.prices = prices or {}
+
+    @classmethod
+    def load(cls, path: str = "prices.yaml") -> "PriceTable":
+        """读取价格表文件，文件不存在时返回空价格表（不计算任何费用）。"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(yaml.safe_load(f) or {})
+
+    def lookup(self, model_id: str):
+        """按模型 ID 精确匹配，未匹配时使用最长前缀匹配；仍未匹配时返回 None。"""
+        if model_id in self.prices:
+            return self.prices[model_id]
+        matches = [name for name in self.prices if model_id.startswith(name)]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def cost(self, model_id: str, usage: dict):
+        """
+        计算一次或多次调用的费用。
+        :return: 费用（美元）；模型不在价格表中时返回 None。
+        """
+        price = self.lookup(model_id)
+        if price is None:
+            return None
+        prompt_tokens = usage.get("prompt_tokens", 0) if usage else 0
+        completion_tokens = usage.get("completion_tokens", 0) if usage else 0
+        return (prompt_tokens * price.get("input", 0.0) + completion_tokens * price.get("output", 0.0)) / 1_000_000
@@ -0,0 +1,145 @@
+# rate_limit.py
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from endpoint_pool import split_endpoints
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate_per_minute 的速率补充，最多积攒一分钟的额度。
+    允许单次取用超过剩余额度（记为欠账），之后的请求需要等待欠账还清，
+    因此超大的请求不会永远等不到足够的额度。
+    """
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.available = rate_per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """距离额度恢复为正还需等待的秒数。"""
+        self._refill(now)
+        return 0.0 if self.available > 0 else -self.available / self.rate + 1e-3
+
+    def take(self, amount: float):
+        self.available -= amount
+
+
+class RateLimiter:
+    """
+    客户端限流器，同时限制每分钟请求数和每分钟 token 数，可在多个线程、多个适配器间共享。
+    发送请求前调用 acquire 按预估 token 数取用额度，收到回复后调用 record 按实际用量修正；
+    服务端返回 429 时调用 pause，在冷却结束前所有共享该限流器的请求都会等待。
+    :param requests_per_minute: 每分钟请求数上限，为 None 或 <= 0 时不限制。
+    :param tokens_per_minute: 每分钟 token 数（输入 + 输出）上限，为 None 或 <= 0 时不限制。
+    """
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute and requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute and tokens_per_minute > 0 else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, estimated_tokens: int = 0):
+        """阻塞直到额度允许发送一个预估消耗 estimated_tokens 个 token 的请求。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(now) if self.requests else 0.0,
+                    self.tokens.wait_time(now) if self.tokens else 0.0,
+                )
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.take(1)
+                    if self.tokens:
+                        self.tokens.take(estimated_tokens)
+                    return
+            time.sleep(wait)
+
+    def record(self, estimated_tokens: int, actual_tokens: int):
+        """用实际 token 用量修正 acquire 时的预估。"""
+        if self.tokens and actual_tokens:
+            with self._lock:
+                self.tokens.take(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds: float):
+        """服务端限流时暂停所有请求 seconds 秒。"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    带随机抖动的指数退避重试策略。
+    服务端给出 Retry-After 时按其等待，否则等待 [0, min(max_delay, base_delay * 2^attempt)] 之间的随机时长（full jitter）。
+    :param max_retries: 最多重试次数，0 表示不重试。
+    """
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """第 attempt 次（从 0 开始）重试前需要等待的秒数。"""
+        if retry_after is not None:
+            # 加少量抖动，避免所有线程在同一时刻一起重试
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def parse_retry_after(value) -> float:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），无法解析时返回 None。"""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数（中文约一个字一个 token，英文约四个字符一个 token），用于限流预估。"""
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return max(1, (len(text) - ascii_chars) + ascii_chars // 4)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def shared_rate_limiter(url: str, requests_per_minute: float = None, tokens_per_minute: float = None) -> RateLimiter:
+    """
+    按服务端（url 的协议、主机和端口）共享的限流器：被测模型与裁判使用同一服务端时共用同一份额度。
+    url 为单个服务端地址。同一服务端第一次创建时的限制生效。两项限制都未配置时返回 None。
+    """
+    if not (requests_per_minute and requests_per_minute > 0) and not (tokens_per_minute and tokens_per_minute > 0):
+        return None
+    parts = urlsplit(url or "")
+    key = (parts.scheme, parts.netloc)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[key]
+
+def shared_rate_limiters(api_base: str, requests_per_minute: float = None, tokens_per_minute: float = None) -> dict:
+    """
+    为 api_base 中的每个服务端副本（逗号分隔的多个地址）分别取共享的限流器，
+    因此裁判指向其中某个副本时与被测模型共用该副本的额度。
+    :return: {副本地址: 限流器}，两项限制都未配置时为空 dict。
+    """
+    if not (requests_per_minute and requests_per_minute > 0) and not (tokens_per_minute and tokens_per_minute > 0):
+        return {}
+    return {url: shared_rate_limiter(url, requests_per_minute, tokens_per_minute) for url in split_endpoints(api_base) or [api_base]}
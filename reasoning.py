@@ -0,0 +1,208 @@
+# reasoning.py
+import time
+
+# 回答的保留方式：full 保留完整回答，last_line 只保留最后一个非空行（模型在答案前附带解释时使用）
+ANSWER_MODES = ("full", "last_line")
+
+
+class ThinkingBudgetExceeded(Exception):
+    """思考超出预算（token 数或耗时），调用方应中断请求。"""
+
+
+class ReasoningParser:
+    """
+    增量解析模型的输出：在流式分块到达时把思考内容与回答分开，并统计思考的 token 数与耗时。
+    - 回答中 <think>...</think> 标签内的文本是思考内容。标签可能被拆在两个分块之间，可能是标签开头的尾部暂存到下一个分块；
+      只有 </think> 而没有 <think> 时（部分模型的聊天模板把 <think> 放在提示词中），之前收到的内容都算作思考；
+    - 服务端单独返回的思考字段（OpenAI 兼容服务的 reasoning_content / reasoning、Ollama 的 message.thinking）经 feed_reasoning 传入。
+    思考 token 数按包含思考内容的流式分块计数（一个分块通常是一个 token），思考耗时从第一个思考分块到思考结束。
+    :param max_thinking_tokens: 思考 token 数上限，为 None 时不限制。
+    :param max_thinking_time: 思考耗时上限（秒），为 None 时不限制。
+    :param start_thinking: 输出从思考开始（聊天模板把 <think> 放在提示词中，如 Qwen3、DeepSeek-R1），收到 </think> 之前的内容都是思考。
+        否则这类输出在 </think> 到达之前都被当作回答，思考预算无法提前生效。输出开头多余的 <think> 会被去掉。
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self, max_thinking_tokens: int = None, max_thinking_time: float = None, start_thinking: bool = False):
+        self.max_thinking_tokens = max_thinking_tokens
+        self.max_thinking_time = max_thinking_time
+        self.thinking_parts = []
+        self.answer_parts = []
+        self.thinking_tokens = 0
+        # 是否处于 <think> 标签内
+        self.in_tag = start_thinking
+        # 从思考开始时，输出开头可能仍带有 <think>，需要去掉
+        self._strip_open_tag = start_thinking
+        # 可能是标签开头、需要等下一个分块才能确定的尾部
+        self._pending = ""
+        # 已经算作回答的分块数，遇到没有 <think> 的 </think> 时转为思考 token
+        self._answer_chunks = 0
+        self._first_chunk_at = None
+        self._thinking_start = None
+        self._thinking_end = None
+
+    def feed(self, text: str):
+        """传入一个回答分块（content）。"""
+        if not text:
+            return
+        now = time.perf_counter()
+        if self._first_chunk_at is None:
+            self._first_chunk_at = now
+        text = self._pending + text
+        self._pending = ""
+        if self._strip_open_tag:
+            stripped = text.lstrip()
+            if self.OPEN_TAG.startswith(stripped):
+                # 还不能确定开头是不是 <think>，等下一个分块
+                self._pending = text
+                return
+            self._strip_open_tag = False
+            if stripped.startswith(self.OPEN_TAG):
+                text = stripped[len(self.OPEN_TAG):]
+        thinking = answer = False
+        while text:
+            if self.in_tag:
+                index = text.find(self.CLOSE_TAG)
+                if index == -1:
+                    text, self._pending = _split_partial(text, (self.CLOSE_TAG,))
+                    thinking = self._add_thinking(text, now) or thinking
+                    break
+                thinking = self._add_thinking(text[:index], now) or thinking
+                self._end_thinking(now)
+                self.in_tag = False
+                text = text[index + len(self.CLOSE_TAG):]
+                continue
+            open_index = text.find(self.OPEN_TAG)
+            close_index = text.find(self.CLOSE_TAG)
+            if open_index == -1 and close_index == -1:
+                text, self._pending = _split_partial(text, (self.OPEN_TAG, self.CLOSE_TAG))
+                answer = self._add_answer(text, now) or answer
+                break
+            if close_index == -1 or (open_index != -1 and open_index < close_index):
+                answer = self._add_answer(text[:open_index], now) or answer
+                self.in_tag = True
+                if self._thinking_start is None:
+                    self._thinking_start = now
+                text = text[open_index + len(self.OPEN_TAG):]
+                continue
+            # 没有 <think> 的 </think>：此前的回答其实是思考内容
+            self._add_answer(text[:close_index], now)
+            self.thinking_parts.extend(self.answer_parts)
+            self.answer_parts = []
+            self.thinking_tokens += self._answer_chunks + 1
+            self._answer_chunks = 0
+            if self._thinking_start is None:
+                self._thinking_start = self._first_chunk_at
+            self._end_thinking(now)
+            answer = False
+            text = text[close_index + len(self.CLOSE_TAG):]
+        if thinking:
+            self.thinking_tokens += 1
+        if answer:
+            self._answer_chunks += 1
+
+    def feed_reasoning(self, text: str):
+        """传入一个服务端单独返回的思考分块。"""
+        if not text:
+            return
+        now = time.perf_counter()
+        if self._first_chunk_at is None:
+            self._first_chunk_at = now
+        if self._add_thinking(text, now):
+            self.thinking_tokens += 1
+
+    def _add_thinking(self, text: str, now: float) -> bool:
+        if not text:
+            return False
+        if self._thinking_start is None:
+            self._thinking_start = now
+        self.thinking_parts.append(text)
+        return True
+
+    def _add_answer(self, text: str, now: float) -> bool:
+        if not text:
+            return False
+        if text.strip():
+            # 第一段回答到达时思考结束（思考内容由单独的字段返回时没有结束标签）
+            self._end_thinking(now)
+        self.answer_parts.append(text)
+        return True
+
+    def _end_thinking(self, now: float):
+        if self._thinking_start is not None and self._thinking_end is None:
+            self._thinking_end = now
+
+    def thinking_now(self) -> bool:
+        """是否仍在思考（已经开始思考，还没有收到回答）。"""
+        return self._thinking_start is not None and self._thinking_end is None
+
+    def check(self):
+        """仍在思考且超出思考预算时抛出 ThinkingBudgetExceeded。每收到一个分块调用一次。"""
+        if not self.thinking_now():
+            return
+        if self.max_thinking_tokens is not None and self.thinking_tokens > self.max_thinking_tokens:
+            raise ThinkingBudgetExceeded(f"thinking exceeded {self.max_thinking_tokens} tokens")
+        if self.max_thinking_time is not None and time.perf_counter() - self._thinking_start > self.max_thinking_time:
+            raise ThinkingBudgetExceeded(f"thinking exceeded {self.max_thinking_time}s")
+
+    def finish(self):
+        """输出结束：写入暂存的尾部。没有闭合的 <think> 中的内容全部算作思考。"""
+        now = time.perf_counter()
+        if self._pending:
+            if self._strip_open_tag and self._pending.strip() == self.OPEN_TAG:
+                self._pending = ""
+            elif self.in_tag:
+                self._add_thinking(self._pending, now)
+            else:
+                self._add_answer(self._pending, now)
+            self._pending = ""
+        self._end_thinking(now)
+        return self
+
+    @property
+    def answer(self) -> str:
+        return "".join(self.answer_parts).strip()
+
+    @property
+    def reasoning(self) -> str:
+        return "".join(self.thinking_parts).strip()
+
+    def stats(self) -> dict:
+        """思考的 token 数与耗时（秒），没有思考内容时返回空 dict。"""
+        if self._thinking_start is None:
+            return {}
+        end = self._thinking_end if self._thinking_end is not None else time.perf_counter()
+        return {
+            "thinking_tokens": self.thinking_tokens,
+            "thinking_time": round(end - self._thinking_start, 4),
+        }
+
+
+def _split_partial(text: str, tags: tuple) -> tuple[str, str]:
+    """把 text 末尾可能是某个标签开头的部分分离出来：(确定的部分, 暂存的尾部)。"""
+    keep = 0
+    for tag in tags:
+        for length in range(min(len(tag) - 1, len(text)), keep, -1):
+            if text.endswith(tag[:length]):
+                keep = length
+                break
+    return (text[:-keep], text[-keep:]) if keep else (text, "")
+
+
+def split_reasoning(text: str, reasoning: str = None) -> ReasoningParser:
+    """解析一次性返回的完整输出（非流式）。reasoning 为服务端单独返回的思考内容。"""
+    parser = ReasoningParser()
+    parser.feed_reasoning(reasoning)
+    parser.feed(text)
+    return parser.finish()
+
+
+def extract_answer(text: str, mode: str = "full") -> str:
+    """按 mode（见 ANSWER_MODES）从回答中取出用于评分的部分。"""
+    if mode == "last_line":
+        lines = text.strip().splitlines()
+        return lines[-1].strip() if lines else ""
+    if mode != "full":
+        raise ValueError(f"Unknown answer_mode: {mode} (expected one of {', '.join(ANSWER_MODES)})")
+    return text.strip()
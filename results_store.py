@@ -0,0 +1,443 @@
+# results_store.py
+"""
+结构化的评测结果库（SQLite），与 Markdown 报告并行写入，用于生成榜单和比较两次运行，无需解析 Markdown。
+
+用法：
+    python results_store.py runs                          # 列出已记录的运行
+    python results_store.py leaderboard                   # 每个模型最近一次运行的各类别平均分
+    python results_store.py diff RUN_A RUN_B              # 比较两次运行的逐题得分
+    python results_store.py export RUN --output run.csv   # 导出某次运行的逐题结果
+    python results_store.py rescore RUN                   # 用当前的任务定义离线重新评分历史回答
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from model_adapter import STATUS_OK, STATUS_OUT_OF_TIME, UNSCORED_STATUSES
+from tasks_handler import load_all_tasks
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    model_id TEXT,
+    judger_model_id TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    task_version TEXT,
+    report_path TEXT,
+    total_tasks INTEGER,
+    failed_tasks INTEGER,
+    overall_average REAL,
+    total_execution_time REAL,
+    cost REAL,
+    judge_cost REAL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs(model_id, started_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT,
+    task_id TEXT,
+    model_id TEXT,
+    category TEXT,
+    task_name TEXT,
+    prompt_hash TEXT,
+    response TEXT,
+    status TEXT,
+    score REAL,
+    reason TEXT,
+    cached INTEGER,
+    judge_skipped INTEGER,
+    execution_time REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    reasoning_tokens INTEGER,
+    judge_prompt_tokens INTEGER,
+    judge_completion_tokens INTEGER,
+    cost REAL,
+    judge_cost REAL,
+    metrics TEXT,
+    sample_stats TEXT,
+    endpoint TEXT,
+    recorded_at REAL,
+    PRIMARY KEY (run_id, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_results_model_task ON results(model_id, task_id);
+CREATE INDEX IF NOT EXISTS idx_results_category ON results(category);
+"""
+
+RESULT_COLUMNS = (
+    "run_id", "task_id", "model_id", "category", "task_name", "prompt_hash", "response", "status", "score", "reason",
+    "cached", "judge_skipped", "execution_time", "prompt_tokens", "completion_tokens", "reasoning_tokens",
+    "judge_prompt_tokens", "judge_completion_tokens", "cost", "judge_cost", "metrics", "sample_stats", "endpoint", "recorded_at",
+)
+
+# 结果库创建之后新增的列：(表名, 列名, 类型)，打开旧的结果库时自动补上
+ADDED_COLUMNS = (
+    ("results", "endpoint", "TEXT"),
+)
+
+
+class ResultsStore:
+    """
+    评测结果库。每次运行在 runs 表中占一行，每个任务的结果在 results 表中占一行，
+    按 (run_id, task_id) 唯一，恢复中断的运行时同一任务会覆盖原记录。
+    results 表按模型 + 任务、分类建有索引，runs 表按模型 + 开始时间建有索引，运行次数很多时查询仍然很快。
+    同一个实例可在多个线程（多模型横评）间共享。逐题结果先缓存在内存中，每 FLUSH_EVERY 条或运行结束时批量写入；
+    进程崩溃时未写入的结果可通过 --resume 从运行日志重新写入。
+    :param path: SQLite 文件路径，所在目录不存在时会自动创建。
+    """
+    FLUSH_EVERY = 50
+
+    def __init__(self, path: str = "results/results.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL 模式下运行中也可以用命令行查询，读写互不阻塞
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            for table, column, kind in ADDED_COLUMNS:
+                existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+
+    def start_run(self, run_id: str, meta: dict, report_path: str = None):
+        """记录一次运行的配置。恢复中断的运行时保留原有的逐题结果。"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (run_id, model_id, judger_model_id, started_at, task_version, report_path) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET report_path = excluded.report_path",
+                (run_id, meta.get("model_id"), meta.get("judger_model_id"), meta.get("started_at"), meta.get("task_version"), report_path),
+            )
+
+    def add_result(self, run_id: str, model_id: str, result: dict, outcome: dict):
+        """
+        记录一个任务的结果。
+        :param result: BenchmarkRunner 汇总用的结果 dict（分类、得分、用量、费用等）。
+        :param outcome: 任务的完整执行结果，提供提示词与模型回答。
+        """
+        usage = result.get("usage") or {}
+        judge_usage = result.get("judge_usage") or {}
+        row = (
+            run_id,
+            result["task_id"],
+            model_id,
+            result["category"],
+            result["task_name"],
+            hashlib.sha256(outcome["prompt"].encode("utf-8")).hexdigest(),
+            outcome["response"],
+            result["status"],
+            result["score"],
+            result["reason"],
+            int(bool(result["cached"])),
+            int(bool(result["judge_skipped"])),
+            result["execution_time"],
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            usage.get("reasoning_tokens"),
+            judge_usage.get("prompt_tokens"),
+            judge_usage.get("completion_tokens"),
+            result.get("cost"),
+            result.get("judge_cost"),
+            # 流式指标与服务端计时的键互不重叠，合并保存
+            json.dumps({**result.get("metrics", {}), **result.get("timings", {})}) if result.get("metrics") or result.get("timings") else None,
+            json.dumps(result["sample_stats"]) if result.get("sample_stats") else None,
+            result.get("endpoint"),
+            time.time(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) < self.FLUSH_EVERY:
+                return
+        self.flush()
+
+    def flush(self):
+        """将缓存的逐题结果在一个事务中写入。"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO results ({', '.join(RESULT_COLUMNS)}) VALUES ({', '.join('?' * len(RESULT_COLUMNS))})",
+                    rows,
+                )
+
+    def finish_run(self, run_id: str, summary: dict):
+        """写入剩余的逐题结果并记录运行的汇总。"""
+        self.flush()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE runs SET finished_at = ?, total_tasks = ?, failed_tasks = ?, overall_average = ?, "
+                "total_execution_time = ?, cost = ?, judge_cost = ?, summary = ? WHERE run_id = ?",
+                (
+                    time.strftime('%Y-%m-%d %H:%M:%S'),
+                    summary["total_tasks"],
+                    summary["failed_tasks"],
+                    summary["overall_average"],
+                    summary["total_execution_time"],
+                    summary.get("cost"),
+                    summary.get("judge_cost"),
+                    json.dumps(summary, ensure_ascii=False, default=str),
+                    run_id,
+                ),
+            )
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    # ============ 查询 ============
+
+    def runs(self, model_id: str = None, limit: int = 20) -> list[dict]:
+        """按开始时间倒序列出运行。"""
+        query = "SELECT run_id, model_id, judger_model_id, started_at, finished_at, total_tasks, failed_tasks, overall_average, cost FROM runs"
+        params = []
+        if model_id:
+            query += " WHERE model_id = ?"
+            params.append(model_id)
+        query += " ORDER BY started_at DESC LIMIT ?"
+        params.append(limit)
+        return self._query(query, params)
+
+    def latest_runs(self, models: list[str] = None) -> list[str]:
+        """每个模型最近一次已完成运行的 run_id。"""
+        query = (
+            "SELECT run_id FROM runs AS r WHERE finished_at IS NOT NULL AND started_at = ("
+            "SELECT MAX(started_at) FROM runs WHERE model_id = r.model_id AND finished_at IS NOT NULL)"
+        )
+        params = []
+        if models:
+            query += f" AND model_id IN ({', '.join('?' * len(models))})"
+            params.extend(models)
+        return [row["run_id"] for row in self._query(query + " ORDER BY model_id", params)]
+
+    def category_averages(self, run_ids: list[str]) -> list[dict]:
+        """
+        各运行各类别的平均分（请求失败和超出时间预算的任务不计入）。
+        没有计分任务的类别 average 为 None，out_of_time 为该类别超出时间预算的任务数。
+        """
+        unscored = ', '.join('?' * len(UNSCORED_STATUSES))
+        return self._query(
+            f"SELECT run_id, category, AVG(CASE WHEN status NOT IN ({unscored}) THEN score END) AS average, "
+            f"SUM(status NOT IN ({unscored})) AS count, SUM(status = ?) AS out_of_time FROM results "
+            f"WHERE run_id IN ({', '.join('?' * len(run_ids))}) GROUP BY run_id, category",
+            list(UNSCORED_STATUSES) * 2 + [STATUS_OUT_OF_TIME] + list(run_ids),
+        )
+
+    def latency_history(self, model_id: str, sampled: bool = False) -> list[dict]:
+        """
+        该模型各任务的历史生成耗时（未命中缓存、请求成功的记录），按记录时间从新到旧排列，用于预测任务耗时。
+        :param sampled: 为 True 时只取多次采样的记录，否则只取单次采样的记录（两者的耗时不可比）。
+        """
+        return self._query(
+            f"SELECT task_id, execution_time, prompt_tokens FROM results "
+            f"WHERE model_id = ? AND status = ? AND cached = 0 AND execution_time > 0 AND sample_stats IS {'NOT ' if sampled else ''}NULL "
+            f"ORDER BY recorded_at DESC",
+            [model_id, STATUS_OK],
+        )
+
+    def leaderboard(self, run_ids: list[str]) -> str:
+        """
+        生成榜单 Markdown 表格：各类别平均分、总平均分、耗时与被测模型的 Token 开销，按总平均分降序。
+        """
+        if not run_ids:
+            return "（没有已完成的运行）"
+        runs = {row["run_id"]: row for row in self._query(
+            f"SELECT run_id, model_id, overall_average, total_execution_time, cost FROM runs WHERE run_id IN ({', '.join('?' * len(run_ids))})",
+            list(run_ids),
+        )}
+        averages = {}
+        for row in self.category_averages(run_ids):
+            if row["average"] is not None:
+                averages.setdefault(row["run_id"], {})[row["category"]] = round(row["average"], 2)
+            elif row["out_of_time"]:
+                # 该类别的任务全部超出时间预算
+                averages.setdefault(row["run_id"], {})[row["category"]] = "OOT"
+        categories = sorted({category for per_run in averages.values() for category in per_run})
+
+        lines = [
+            "|模型名|" + "|".join(categories) + "|平均分|耗时(s)|Token 开销|",
+            "|-" * (len(categories) + 4) + "|",
+        ]
+        for run_id in sorted(runs, key=lambda run_id: runs[run_id]["overall_average"] or 0, reverse=True):
+            run = runs[run_id]
+            cells = [str(averages.get(run_id, {}).get(category, "-")) for category in categories]
+            cost = f"${run['cost']:.4f}" if run["cost"] is not None else "-"
+            lines.append(f"|{run['model_id']}|" + "|".join(cells) + f"|{run['overall_average']}|{run['total_execution_time']}|{cost}|")
+        return "\n".join(lines)
+
+    def diff(self, run_a: str, run_b: str, threshold: float = 0.0) -> list[dict]:
+        """
+        逐题比较两次运行，返回得分变化超过 threshold 的任务，按变化幅度降序。
+        prompt_changed 表示两次运行中该任务的提示词不同（题目被修改过），此时得分不可直接比较。
+        """
+        rows = self._query(
+            "SELECT a.task_id, a.category, a.score AS score_a, b.score AS score_b, a.status AS status_a, b.status AS status_b, "
+            "a.prompt_hash != b.prompt_hash AS prompt_changed, a.response = b.response AS same_response "
+            "FROM results AS a JOIN results AS b ON a.task_id = b.task_id "
+            "WHERE a.run_id = ? AND b.run_id = ?",
+            [run_a, run_b],
+        )
+        for row in rows:
+            row["delta"] = round((row["score_b"] or 0) - (row["score_a"] or 0), 2)
+        changed = [row for row in rows if abs(row["delta"]) > threshold or row["status_a"] != row["status_b"]]
+        return sorted(changed, key=lambda row: (-abs(row["delta"]), row["task_id"]))
+
+    def run_results(self, run_id: str) -> list[dict]:
+        return self._query(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE run_id = ? ORDER BY category, task_id", [run_id])
+
+    def rescore(self, run_id: str, tasks: list) -> tuple[int, list[dict]]:
+        """
+        用当前的任务定义重新评分一次运行中保存的回答，不调用模型和裁判，只支持 exact_match / fill_in 任务。
+        同一任务定义下的回答（包括数据集任务的全部行）由编译好的匹配器一次批量评分。
+        请求失败、超出时间预算和多次采样的任务跳过（结果库只保存第一个采样的回答）。
+        :return: 重新评分的回答数，以及得分发生变化的任务。
+        """
+        stored = {row["task_id"]: row for row in self._query(
+            f"SELECT task_id, response, score FROM results WHERE run_id = ? AND sample_stats IS NULL "
+            f"AND status NOT IN ({', '.join('?' * len(UNSCORED_STATUSES))})",
+            [run_id] + list(UNSCORED_STATUSES),
+        )}
+        rescored = 0
+        changed = []
+        for task in tasks:
+            if task.requires_judge():
+                continue
+            instances = [instance for instance in task.iter_instances() if instance.get_id() in stored]
+            if not instances:
+                continue
+            rows = [stored[instance.get_id()] for instance in instances]
+            verdicts = task.evaluate_many(
+                [row["response"] or "" for row in rows],
+                judger=None,
+                answers=[instance.expected_answers() for instance in instances],
+            )
+            rescored += len(rows)
+            for row, verdict in zip(rows, verdicts):
+                if verdict.score != row["score"]:
+                    changed.append({"task_id": row["task_id"], "score_old": row["score"], "score_new": verdict.score, "reason": verdict.reason})
+        return rescored, changed
+
+    def resolve_run(self, run: str) -> str:
+        """将 run_id 或其唯一前缀、或模型 ID（取该模型最近一次运行）解析为 run_id。"""
+        rows = self._query("SELECT run_id FROM runs WHERE run_id = ? OR run_id LIKE ? ORDER BY started_at DESC", [run, run + "%"])
+        if len(rows) == 1 or (rows and rows[0]["run_id"] == run):
+            return rows[0]["run_id"]
+        if len(rows) > 1:
+            raise ValueError(f"Ambiguous run: {run} matches {', '.join(row['run_id'] for row in rows[:5])}")
+        rows = self.runs(model_id=run, limit=1)
+        if not rows:
+            raise ValueError(f"Unknown run or model: {run}")
+        return rows[0]["run_id"]
+
+    def _query(self, query: str, params: list = ()) -> list[dict]:
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def run_id_for(report_path: str, results_dir: str = "results") -> str:
+    """由报告路径得到 run_id：results 目录下去掉扩展名的相对路径，如 2026-02-16-120000 或 2026-02-16-120000-sweep/gpt-4o。"""
+    base = os.path.splitext(report_path)[0]
+    try:
+        relative = os.path.relpath(base, results_dir)
+    except ValueError:
+        return base
+    return base if relative.startswith("..") else relative.replace(os.sep, "/")
+
+
+def _print_table(rows: list[dict], columns: list[str]):
+    print("|" + "|".join(columns) + "|")
+    print("|-" * len(columns) + "|")
+    for row in rows:
+        print("|" + "|".join("-" if row[column] is None else str(row[column]) for column in columns) + "|")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the structured results store written by main.py and sweep.py")
+    parser.add_argument("--db", type=str, default="results/results.sqlite", help="Path of the results store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = subparsers.add_parser("runs", help="List recorded runs, newest first.")
+    runs_parser.add_argument("--model", type=str, default=None, help="Only list runs of this model.")
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    leaderboard_parser = subparsers.add_parser("leaderboard", help="Category averages of the latest finished run of each model.")
+    leaderboard_parser.add_argument("--model", type=str, action="append", default=[], help="Only include this model. Can be repeated.")
+    leaderboard_parser.add_argument("--run", type=str, action="append", default=[], help="Use these runs instead of the latest run per model. Can be repeated.")
+
+    diff_parser = subparsers.add_parser("diff", help="Per-task score changes between two runs (run id, unique run id prefix or model id).")
+    diff_parser.add_argument("run_a", type=str)
+    diff_parser.add_argument("run_b", type=str)
+    diff_parser.add_argument("--threshold", type=float, default=0.0, help="Only show tasks whose score changed by more than this.")
+
+    export_parser = subparsers.add_parser("export", help="Export the per-task results of a run as CSV or JSON lines.")
+    export_parser.add_argument("run", type=str)
+    export_parser.add_argument("--format", type=str, default="csv", choices=("csv", "jsonl"))
+    export_parser.add_argument("--output", type=str, default=None, help="Output file, default is stdout.")
+
+    rescore_parser = subparsers.add_parser("rescore", help="Re-score the stored responses of a run with the current exact_match / fill_in task definitions, without calling any model.")
+    rescore_parser.add_argument("run", type=str)
+    rescore_parser.add_argument("--tasks_dir", type=str, default="tasks", help="Directory of the task definitions.")
+    rescore_parser.add_argument("--only", type=str, action="append", default=[], metavar="SELECTOR", help="Only re-score tasks matching a task id, a category or a glob. Can be repeated.")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"--db: results store not found: {args.db}")
+    store = ResultsStore(args.db)
+
+    try:
+        if args.command == "runs":
+            _print_table(store.runs(args.model, args.limit), ["run_id", "model_id", "judger_model_id", "started_at", "total_tasks", "failed_tasks", "overall_average", "cost"])
+        elif args.command == "leaderboard":
+            run_ids = [store.resolve_run(run) for run in args.run] or store.latest_runs(args.model)
+            print(store.leaderboard(run_ids))
+        elif args.command == "diff":
+            run_a, run_b = store.resolve_run(args.run_a), store.resolve_run(args.run_b)
+            print(f"{run_a} -> {run_b}\n")
+            print(store.leaderboard([run_a, run_b]) + "\n")
+            _print_table(store.diff(run_a, run_b, args.threshold), ["task_id", "category", "score_a", "score_b", "delta", "status_a", "status_b", "prompt_changed", "same_response"])
+        elif args.command == "export":
+            rows = store.run_results(store.resolve_run(args.run))
+            output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+            try:
+                if args.format == "csv":
+                    writer = csv.DictWriter(output, fieldnames=RESULT_COLUMNS)
+                    writer.writeheader()
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+            finally:
+                if args.output:
+                    output.close()
+        elif args.command == "rescore":
+            run_id = store.resolve_run(args.run)
+            rescored, changed = store.rescore(run_id, load_all_tasks(args.tasks_dir, selectors=args.only))
+            print(f"{run_id}: re-scored {rescored} responses, {len(changed)} changed\n")
+            if changed:
+                _print_table(changed, ["task_id", "score_old", "score_new", "reason"])
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# scheduler.py
+import threading
+import time
+from statistics import median
+
+from rate_limit import estimate_tokens
+
+
+class LatencyPredictor:
+    """
+    预测任务在某个模型上的生成耗时（秒）：
+    - 有历史记录的任务（结果库中同一模型、同一任务 ID、未命中缓存的成功记录）取最近 HISTORY_SIZE 次耗时的中位数；
+    - 没有历史的任务按提示词长度预测：用该模型全部历史记录的 (输入 tokens, 耗时) 拟合一条直线，
+      记录不足以拟合时取历史耗时的中位数，完全没有记录时为 DEFAULT_SECONDS + DEFAULT_SECONDS_PER_TOKEN × 输入 tokens。
+    运行中每完成一个任务都会加入观测（observe），之后的预测随之更新。可在多个线程间共享。
+    :param history: 历史记录，每条为 {"task_id", "execution_time", "prompt_tokens"}，按时间从新到旧排列。
+    """
+    HISTORY_SIZE = 5
+    DEFAULT_SECONDS = 10.0
+    DEFAULT_SECONDS_PER_TOKEN = 0.01
+
+    def __init__(self, history: list[dict] = None):
+        self._lock = threading.Lock()
+        # 任务 ID -> 最近的耗时（从新到旧）
+        self.task_history = {}
+        # (输入 tokens, 耗时)，用于按提示词长度预测
+        self.points = []
+        self._fit = None
+        for row in history or []:
+            self._add(row["task_id"], row.get("prompt_tokens"), row["execution_time"], newest=False)
+
+    @classmethod
+    def from_store(cls, results_store, model_id: str, sampled: bool = False) -> "LatencyPredictor":
+        """用结果库中该模型的历史记录创建预测器。sampled 表示本次运行是否多次采样（耗时只与同样采样的记录可比）。"""
+        return cls(results_store.latency_history(model_id, sampled=sampled))
+
+    def _add(self, task_id: str, prompt_tokens: int, seconds: float, newest: bool = True):
+        times = self.task_history.setdefault(task_id, [])
+        if newest:
+            times.insert(0, seconds)
+            del times[self.HISTORY_SIZE:]
+        elif len(times) < self.HISTORY_SIZE:
+            times.append(seconds)
+        if prompt_tokens:
+            self.points.append((prompt_tokens, seconds))
+        self._fit = None
+
+    def observe(self, task_id: str, prompt_tokens: int, seconds: float):
+        """记录一个任务在本次运行中的实际耗时。"""
+        with self._lock:
+            self._add(task_id, prompt_tokens, seconds)
+
+    def predict(self, task) -> tuple[float, str]:
+        """
+        :return: (预测耗时秒数, 依据)，依据为 "history"（该任务的历史耗时）、"length"（按提示词长度拟合）或 "default"。
+        """
+        with self._lock:
+            times = self.task_history.get(task.get_id())
+            if times:
+                return median(times), "history"
+            if self._fit is None:
+                self._fit = self._fit_length()
+        intercept, slope, source = self._fit
+        return intercept + slope * estimate_tokens(task.generate_prompt()), source
+
+    def _fit_length(self) -> tuple[float, float, str]:
+        """最小二乘拟合 耗时 = intercept + slope × 输入 tokens，斜率与截距不小于 0。"""
+        if not self.points:
+            return self.DEFAULT_SECONDS, self.DEFAULT_SECONDS_PER_TOKEN, "default"
+        n = len(self.points)
+        mean_x = sum(x for x, _ in self.points) / n
+        mean_y = sum(y for _, y in self.points) / n
+        variance = sum((x - mean_x) ** 2 for x, _ in self.points)
+        if variance == 0:
+            return median(y for _, y in self.points), 0.0, "length"
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in self.points) / variance)
+        return max(0.0, mean_y - slope * mean_x), slope, "length"
+
+
+class TimeBudgetScheduler:
+    """
+    在时间预算（秒，从运行开始计）内安排任务，让预算内完成的任务尽可能多：
+    - order：按预测耗时从短到长排列（最短任务优先），已完成（从运行日志恢复）的任务排在最前，数据集任务排在最后；
+    - admit：任务开始生成前检查剩余预算，预测耗时超过剩余时间的任务不再运行，标记为超出时间预算（OOT）
+      （该模型还没有任何耗时记录时只在预算用完后才拒绝）；
+      放行的任务得到一个截止时间：有该任务的历史耗时时为预测耗时的 deadline_factor 倍（不少于 MIN_DEADLINE 秒），
+      并且不超过剩余预算；截止时间之前未完成的请求被中断，同样标记为 OOT，而不是计 0 分的超时。
+    预算只约束生成阶段，已放行任务的裁判评分在预算用完后仍会完成。可在多个线程间共享。
+    :param budget: 时间预算（秒）。
+    :param deadline_factor: 截止时间相对于预测耗时的倍数，小于等于 0 时只按剩余预算设置截止时间。
+    """
+    MIN_DEADLINE = 10.0
+
+    def __init__(self, budget: float, predictor: LatencyPredictor = None, deadline_factor: float = 3.0):
+        self.budget = budget
+        self.predictor = predictor or LatencyPredictor()
+        self.deadline_factor = deadline_factor
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        # 任务 ID -> (预测耗时, 依据)，排序时计算，任务开始前更新
+        self.predictions = {}
+        # 放行的任务数，以及因放不进剩余预算而未运行的任务数
+        self.admitted = 0
+        self.not_started = 0
+        # 放行任务的 |实际耗时 - 预测耗时|，用于评估预测的准确度
+        self.errors = []
+
+    def start(self):
+        """从现在开始计算预算。"""
+        self._start = time.monotonic()
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self._start)
+
+    def order(self, tasks, done_ids=frozenset()):
+        """
+        普通任务按预测耗时从短到长排列，预测耗时相同时保持原有顺序。
+        数据集任务排在全部普通任务之后，按原有顺序在轮到时才逐行读取：整个数据集不会读入内存，
+        序号在它之前的任务也都已经提交，各行的报告段落不会因等待前面的任务而积压在内存中。各行仍由 admit 逐行判断。
+        :param tasks: 顶层任务列表。
+        :return: (序号, 任务实例) 的迭代器，序号为实例在原有顺序中的位置（数据集任务每行一个实例）。
+        """
+        regular, datasets = [], []
+        position = 0
+        for task in tasks:
+            (datasets if task.is_dataset() else regular).append((position, task))
+            position += task.instance_count()
+        for _, task in regular:
+            if task.get_id() not in done_ids:
+                self.predictions[task.get_id()] = self.predictor.predict(task)
+        regular.sort(key=lambda item: self.predictions[item[1].get_id()][0] if item[1].get_id() in self.predictions else -1.0)
+        yield from regular
+        for start, task in datasets:
+            for offset, instance in enumerate(task.iter_instances()):
+                yield start + offset, instance
+
+    def admit(self, task) -> tuple[float, float]:
+        """
+        任务开始生成前调用。重新预测一次耗时，使本次运行中已完成任务的观测也参与判断。
+        :return: (截止时间秒数, 预测耗时)；任务放不进剩余预算时截止时间为 None，该任务应标记为 OOT。
+        """
+        predicted, source = self.predictions[task.get_id()] = self.predictor.predict(task)
+        remaining = self.remaining()
+        with self._lock:
+            # 没有任何耗时记录时预测值只是猜测，仍然运行（截止时间为剩余预算），得到观测之后再按预测判断
+            if remaining <= 0 or (source != "default" and predicted > remaining):
+                self.not_started += 1
+                return None, predicted
+            self.admitted += 1
+        deadline = remaining
+        if source == "history" and self.deadline_factor > 0:
+            deadline = min(remaining, max(predicted * self.deadline_factor, self.MIN_DEADLINE))
+        return deadline, predicted
+
+    def observe(self, task, prompt_tokens: int, seconds: float):
+        """记录放行任务的实际生成耗时，更新预测器。"""
+        predicted = self.predictions.get(task.get_id())
+        if predicted is not None:
+            with self._lock:
+                self.errors.append(abs(seconds - predicted[0]))
+        self.predictor.observe(task.get_id(), prompt_tokens, seconds)
+
+    def summary(self) -> dict:
+        sources = [source for _, source in self.predictions.values()]
+        return {
+            "budget": self.budget,
+            "deadline_factor": self.deadline_factor,
+            "admitted": self.admitted,
+            "not_started": self.not_started,
+            "predicted_from_history": sources.count("history"),
+            "prediction_mae": round(sum(self.errors) / len(self.errors), 2) if self.errors else None,
+        }
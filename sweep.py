@@ -0,0 +1,252 @@
+# sweep.py
+import argparse
+import datetime
+import os
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pprint import pprint
+
+import yaml
+
+from benchmark_runner import BenchmarkRunner, format_average, format_cost
+from cache import ResponseCache, VerdictCache
+from evaluate import BatchingJudger, build_judger
+from journal import RunJournal
+from logger import setup_markdown_logger
+from pricing import PriceTable
+from rate_limit import RetryPolicy, shared_rate_limiters
+from results_store import ResultsStore, run_id_for
+from main import TASK_VERSION, ollama_kwargs, write_report_header
+from model_adapter import build_model_adapter
+from scheduler import LatencyPredictor, TimeBudgetScheduler
+from tasks_handler import load_all_tasks
+from tracing import Tracer
+
+
+def load_sweep_config(config_path: str) -> dict:
+    """
+    读取多模型横评配置文件，字符串中的 $ENV_VAR 会被替换为环境变量的值（用于 API Key）。
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return _expand_env(yaml.safe_load(f))
+
+def _expand_env(value):
+    if isinstance(value, str):
+        return os.path.expandvars(value)
+    if isinstance(value, list):
+        return [_expand_env(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _expand_env(item) for key, item in value.items()}
+    return value
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', name)
+
+def _adapter_kwargs(model_cfg: dict, config: dict) -> dict:
+    return {
+        "api_key": model_cfg.get("api_key", ""),
+        "model_id": model_cfg["model_id"],
+        "api_base": model_cfg.get("api_base"),
+        "pool_size": model_cfg.get("pool_size", config.get("pool_size", 10)),
+        "keepalive": model_cfg.get("keepalive", config.get("keepalive", 30.0)),
+    }
+
+def _configure_requests(adapter, model_cfg: dict, config: dict):
+    """按配置为适配器设置限流器（同一服务端的模型与裁判共享）、重试策略和多副本的健康检查。"""
+    adapter.rate_limiters = shared_rate_limiters(
+        adapter.api_base,
+        model_cfg.get("rpm", config.get("rpm")),
+        model_cfg.get("tpm", config.get("tpm")),
+    )
+    adapter.retry_policy = RetryPolicy(
+        max_retries=config.get("max_retries", 3),
+        base_delay=config.get("retry_base_delay", 1.0),
+    )
+    if adapter.endpoints is not None:
+        adapter.endpoints.check_interval = config.get("health_check_interval", 30.0)
+        adapter.endpoints.slow_threshold = config.get("slow_threshold", 5.0)
+
+def run_sweep(config: dict) -> list[dict]:
+    """
+    用同一套任务和同一个裁判线程池评测配置中的全部模型。
+    api_base 相同的模型依次运行，不同 api_base 的模型并行运行，充分利用所有可用的服务端。
+    :return: 按配置顺序排列的各模型 summary（运行失败的模型为 None）。
+    """
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S")
+    sweep_dir = os.path.join(config.get("results_dir", "results"), f"{timestamp}-sweep")
+    os.makedirs(sweep_dir, exist_ok=True)
+
+    # 任务只加载一次，由所有模型共享
+    tasks = load_all_tasks(
+        config.get("tasks_dir", "tasks"),
+        selectors=config.get("tasks"),
+        index_path=config.get("task_index_path", ".cache/task_index.json"),
+    )
+    price_table = PriceTable.load(config.get("prices", "prices.yaml"))
+    results_db = config.get("results_db", "results/results.sqlite")
+    results_store = ResultsStore(results_db) if results_db else None
+
+    judger_cfg = config["judger"]
+    judger = build_judger(judger_cfg.get("adapter_type", "openai"), **_adapter_kwargs(judger_cfg, config))
+    if judger_cfg.get("cache", "off") != "off":
+        judger.verdict_cache = VerdictCache(path=judger_cfg.get("cache_path", ".cache/verdicts.sqlite"), mode=judger_cfg["cache"])
+
+    _configure_requests(judger.judge_adapter, judger_cfg, config)
+
+    judge_workers = judger_cfg.get("workers", 4)
+    if judger_cfg.get("batch_size", 1) > 1:
+        judger = BatchingJudger(judger, batch_size=judger_cfg["batch_size"], linger=judger_cfg.get("batch_linger", 0.5))
+        judge_workers = max(judge_workers, judger_cfg["batch_size"])
+
+    models = config["models"]
+    summaries = [None] * len(models)
+
+    # 按 api_base 分组
+    groups = {}
+    for position, model_cfg in enumerate(models):
+        groups.setdefault(model_cfg.get("api_base"), []).append(position)
+
+    def run_group(positions: list[int]):
+        for position in positions:
+            model_cfg = models[position]
+            try:
+                summaries[position] = _run_model(model_cfg, config, tasks, judger, judge_executor, judger_cfg, sweep_dir, price_table, results_store)
+            except Exception:
+                print(f"❌ Model {model_cfg.get('name', model_cfg['model_id'])} failed:")
+                traceback.print_exc()
+
+    with ThreadPoolExecutor(max_workers=judge_workers, thread_name_prefix="judge") as judge_executor, \
+            ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="endpoint") as endpoint_executor:
+        for future in [endpoint_executor.submit(run_group, positions) for positions in groups.values()]:
+            future.result()
+    if results_store is not None:
+        results_store.close()
+
+    leaderboard = build_leaderboard(models, summaries)
+    with open(os.path.join(sweep_dir, "leaderboard.md"), 'w', encoding='utf-8') as f:
+        f.write("# Noah's LLM Benchmark 横评结果\n\n")
+        f.write(f"- 评价模型: {judger_cfg['model_id']}\n")
+        f.write(f"- 运行时间: {timestamp}\n")
+        f.write(f"- 题库版本: {TASK_VERSION}\n\n")
+        f.write(leaderboard + "\n")
+    print(f"\n{leaderboard}\n")
+    print(f"📄 Leaderboard written to {os.path.join(sweep_dir, 'leaderboard.md')}")
+    return summaries
+
+def _run_model(model_cfg: dict, config: dict, tasks: list, judger, judge_executor, judger_cfg: dict, sweep_dir: str, price_table: PriceTable, results_store: ResultsStore = None) -> dict:
+    name = model_cfg.get("name", model_cfg["model_id"])
+    adapter_type = model_cfg.get("adapter_type", "openai")
+    stream = model_cfg.get("stream", config.get("stream", False))
+    max_thinking_tokens = model_cfg.get("max_thinking_tokens", config.get("max_thinking_tokens")) or None
+    max_thinking_time = model_cfg.get("max_thinking_time", config.get("max_thinking_time")) or None
+    if (max_thinking_tokens or max_thinking_time) and not stream:
+        raise ValueError(f"{name}: max_thinking_tokens and max_thinking_time require stream: true")
+    model_adapter = build_model_adapter(
+        adapter_type,
+        stream=stream,
+        **_adapter_kwargs(model_cfg, config),
+        **ollama_kwargs(
+            adapter_type,
+            model_cfg.get("keep_alive", config.get("keep_alive")),
+            model_cfg.get("num_ctx", config.get("num_ctx")),
+            model_cfg.get("options"),
+        ),
+    )
+    _configure_requests(model_adapter, model_cfg, config)
+    model_adapter.max_thinking_tokens = max_thinking_tokens
+    model_adapter.max_thinking_time = max_thinking_time
+    model_adapter.start_thinking = model_cfg.get("start_thinking", config.get("start_thinking", False))
+    if model_cfg.get("cache", config.get("cache", "off")) != "off":
+        model_adapter.cache = ResponseCache(
+            path=config.get("cache_path", ".cache/responses.sqlite"),
+            mode=model_cfg.get("cache", config.get("cache")),
+        )
+
+    # 每个模型各自记录阶段耗时；共享的裁判在哪个模型的线程中评分，区间就记入该模型
+    tracer = Tracer(max_events=config.get("trace_events", 100000))
+    if model_cfg.get("warm_up", config.get("warm_up", False)):
+        # 同一服务端的模型依次运行，每个模型在自己的第一个任务之前加载
+        with tracer.activate(), tracer.span("warm_up"):
+            timings = model_adapter.warm_up()
+        if timings:
+            print(f"🔥 Warmed up {name}: model loaded in {timings.get('load_duration', 0.0)}s")
+
+    report_path = os.path.join(sweep_dir, f"{_safe_filename(name)}.md")
+    benchmark_logger = setup_markdown_logger(report_path)
+    benchmark_logger.tracer = tracer
+    meta = {
+        "model_id": model_cfg["model_id"],
+        "judger_model_id": judger_cfg["model_id"],
+        "started_at": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "task_version": TASK_VERSION,
+    }
+    journal = RunJournal(os.path.splitext(report_path)[0] + ".jsonl")
+    journal.write_meta(meta)
+    write_report_header(benchmark_logger, meta)
+    run_id = run_id_for(report_path, config.get("results_dir", "results"))
+    if results_store is not None:
+        results_store.start_run(run_id, meta, report_path)
+
+    samples = model_cfg.get("samples", config.get("samples", 1))
+    scheduler = None
+    time_budget = model_cfg.get("time_budget", config.get("time_budget", 0))
+    if time_budget and time_budget > 0:
+        # 按该模型在结果库中的历史耗时预测各任务的耗时
+        predictor = LatencyPredictor.from_store(results_store, model_cfg["model_id"], sampled=samples > 1) if results_store is not None else None
+        scheduler = TimeBudgetScheduler(time_budget, predictor, deadline_factor=model_cfg.get("deadline_factor", config.get("deadline_factor", 3.0)))
+
+    runner = BenchmarkRunner(
+        model_adapter,
+        tasks,
+        judger,
+        benchmark_logger=benchmark_logger,
+        concurrency=model_cfg.get("concurrency", config.get("concurrency", 1)),
+        journal=journal,
+        judge_executor=judge_executor,
+        price_table=price_table,
+        samples=samples,
+        pass_score=config.get("pass_score", 60.0),
+        results_store=results_store,
+        run_id=run_id,
+        tracer=tracer,
+        scheduler=scheduler,
+    )
+    summary = runner.run()
+    journal.close()
+    benchmark_logger.close()
+    if tracer.max_events > 0:
+        tracer.export_chrome_trace(os.path.splitext(report_path)[0] + ".trace.json", {"model_id": model_cfg["model_id"], "run_id": run_id})
+    return summary
+
+def build_leaderboard(models: list[dict], summaries: list[dict]) -> str:
+    """
+    生成合并的榜单 Markdown 表格：各类别平均分、总平均分、耗时与被测模型的 Token 开销。
+    """
+    categories = sorted({cat for summary in summaries if summary for cat in summary["category_summary"]})
+    lines = [
+        "|模型名|" + "|".join(categories) + "|平均分|耗时(s)|Token 开销|",
+        "|-" * (len(categories) + 4) + "|",
+    ]
+    for model_cfg, summary in zip(models, summaries):
+        name = model_cfg.get("name", model_cfg["model_id"])
+        if summary is None:
+            lines.append(f"|{name}|" + "|".join("-" for _ in categories) + "|-|-|-|")
+            continue
+        cells = [format_average(summary["category_summary"][cat]) if cat in summary["category_summary"] else "-" for cat in categories]
+        lines.append(f"|{name}|" + "|".join(cells) + f"|{summary['overall_average']}|{summary['total_execution_time']}|{format_cost(summary['cost'])}|")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Noah's LLM Benchmark against several models in one process")
+    parser.add_argument("--config", type=str, default="sweep.yaml", help="Path to the sweep config file (see sweep.example.yaml).")
+    args = parser.parse_args()
+
+    summaries = run_sweep(load_sweep_config(args.config))
+
+    print("\n\n========== 📊 SWEEP SUMMARY ==========")
+    pprint(summaries)
+    print("======================================")
+
+if __name__ == "__main__":
+    main()
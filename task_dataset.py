@@ -0,0 +1,64 @@
+# task_dataset.py
+import csv
+import json
+import os
+import re
+
+# 模板中的变量占位符，如 {transaction}
+TEMPLATE_VARIABLE = re.compile(r'\{(\w+)\}')
+
+
+def dataset_format(path: str, fmt: str = None) -> str:
+    """数据集格式：显式指定的 format，否则按扩展名判断（.jsonl / .csv）。"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in ("jsonl", "csv"):
+        raise ValueError(f"Unsupported dataset format: {fmt} ({path}), expected jsonl or csv")
+    return fmt
+
+
+def iter_rows(path: str, fmt: str = None):
+    """
+    逐行读取数据集，每次产出一行（dict），不把整个文件读入内存。
+    JSONL 中的空行会被跳过；CSV 的第一行为列名。
+    """
+    fmt = dataset_format(path, fmt)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number} of {path}: {e}") from None
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number} of {path} is not a JSON object")
+            yield row
+
+
+def count_rows(path: str, fmt: str = None) -> int:
+    """统计数据集的行数（用于显示进度），按块读取，内存占用与文件大小无关。"""
+    fmt = dataset_format(path, fmt)
+    if fmt == "csv":
+        # CSV 的字段中可能包含换行，只能逐行解析
+        return sum(1 for _ in iter_rows(path, fmt))
+    count = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                count += 1
+    return count
+
+
+def fill_template(template: str, variables: dict) -> str:
+    """
+    用 variables 填充模板中的 {name} 占位符。没有对应变量的占位符（以及模板中其他的花括号）保持原样，
+    因此模板中可以直接出现 JSON 等包含花括号的文本。
+    """
+    def replace(match):
+        name = match.group(1)
+        return str(variables[name]) if name in variables else match.group(0)
+
+    return TEMPLATE_VARIABLE.sub(replace, template)
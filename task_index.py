@@ -0,0 +1,144 @@
+# task_index.py
+import fnmatch
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import yaml
+
+# 优先使用 libyaml 提供的 C 解析器，未编译 libyaml 时退回纯 Python 实现
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(path: str):
+    """用 C 加速的解析器读取 YAML 文件。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+class DuplicateTaskIdError(ValueError):
+    """任务目录中有两个任务的 ID 相同。"""
+
+
+class TaskIndex:
+    """
+    编译后的任务索引，保存每个任务文件的元数据（id、名称、分类、评估方式、内容哈希），
+    而不保存 prompt、评分标准等大段正文，正文在任务第一次使用时才从文件中读取。
+    索引以 JSON 保存，每次加载时只重新解析 mtime/大小与内容哈希发生变化的文件。
+    任务按相对路径排序，保证同一个题库在不同机器上的顺序一致。
+    :param config_dir: 任务目录。
+    :param index_path: 索引文件路径，为 None 时不落盘（每次都完整解析）。
+    """
+    VERSION = 2
+
+    def __init__(self, config_dir: str, index_path: str = None):
+        self.config_dir = Path(config_dir)
+        self.index_path = index_path
+        self.entries = self._load_entries()
+
+    def _load_entries(self) -> dict:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != self.VERSION or data.get("config_dir") != self.config_dir.as_posix():
+            return {}
+        return data.get("entries", {})
+
+    def save(self):
+        if not self.index_path:
+            return
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {"version": self.VERSION, "config_dir": self.config_dir.as_posix(), "entries": self.entries}
+        # 先写临时文件再替换，避免中断时留下半个索引
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def refresh(self) -> list[dict]:
+        """
+        扫描任务目录，增量更新索引并返回按相对路径排序的全部条目。
+        文件的 mtime 和大小未变化时直接复用索引；变化但内容哈希相同时只更新 mtime；否则重新解析。
+        任务 ID 是运行日志、结果库和耗时历史的键，两个文件的 ID 相同时抛出 DuplicateTaskIdError。
+        """
+        entries = {}
+        changed = False
+        for file_path in sorted(self.config_dir.rglob('*.yaml'), key=lambda p: p.relative_to(self.config_dir).as_posix()):
+            relative = file_path.relative_to(self.config_dir).as_posix()
+            stat = file_path.stat()
+            entry = self.entries.get(relative)
+            if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                entries[relative] = entry
+                continue
+
+            content_hash = hashlib.sha256(file_path.read_bytes()).hexdigest()
+            if entry is None or entry["hash"] != content_hash:
+                entry = self._compile(file_path, relative, content_hash)
+            entries[relative] = {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            changed = True
+
+        paths_by_id = {}
+        for relative, entry in entries.items():
+            if entry["id"] in paths_by_id:
+                raise DuplicateTaskIdError(
+                    f"Duplicate task id '{entry['id']}' in {paths_by_id[entry['id']]} and {relative} "
+                    f"(the id defaults to the file name; set a unique 'id' in one of them)"
+                )
+            paths_by_id[entry["id"]] = relative
+
+        if changed or entries.keys() != self.entries.keys():
+            self.entries = entries
+            self.save()
+        return [entries[relative] for relative in entries]
+
+    def _compile(self, file_path: Path, relative: str, content_hash: str) -> dict:
+        config = load_yaml(str(file_path)) or {}
+        return {
+            "path": relative,
+            "id": config.get('id') or file_path.stem,
+            "name": config.get('name', '未命名任务'),
+            "description": config.get('description', '无描述'),
+            "category": _extract_category(relative),
+            "method": config.get('evaluation', {}).get('method'),
+            # 数据集任务的 dataset 配置（数据文件本身不进入索引）
+            "dataset": config.get('dataset'),
+            "hash": content_hash,
+        }
+
+
+def _extract_category(relative: str) -> str:
+    """
+    从相对于任务目录的路径中提取分类名：第一级子目录名，根目录下的文件为 "unclassified"。
+    """
+    parts = relative.split('/')
+    return parts[0] if len(parts) > 1 else "unclassified"
+
+
+def select_entries(entries: list[dict], selectors: list[str]) -> list[dict]:
+    """
+    按选择器筛选任务，保持索引顺序。选择器可以是任务 id、分类名，
+    或匹配任务 id、相对路径的 glob（如 "reasoning/*"、"*_classify"）。
+    没有选择器时返回全部任务；有选择器未匹配到任何任务时抛出 ValueError。
+    """
+    if not selectors:
+        return entries
+    selected = set()
+    for selector in selectors:
+        matched = [
+            entry["path"] for entry in entries
+            if selector in (entry["id"], entry["category"])
+            or fnmatch.fnmatchcase(entry["id"], selector)
+            or fnmatch.fnmatchcase(entry["path"], selector)
+            or fnmatch.fnmatchcase(entry["path"], selector + ".yaml")
+        ]
+        if not matched:
+            raise ValueError(f"No task matches selector: {selector}")
+        selected.update(matched)
+    return [entry for entry in entries if entry["path"] in selected]
@@ -1,11 +1,14 @@
-import yaml
-import os
 import re
 from pathlib import Path
 
 # tasks/base_task.py
 from abc import ABC, abstractmethod
-from evaluate import OpenAIJudger
+from evaluate import OpenAIJudger, Verdict
+from model_adapter import STATUS_ERROR
+from matchers import build_matcher
+from reasoning import ANSWER_MODES
+from task_dataset import count_rows, fill_template, iter_rows
+from task_index import TaskIndex, load_yaml, select_entries
 
 class BenchmarkTask(ABC):
     """
@@ -36,122 +39,350 @@ class BenchmarkTask(ABC):
         """
         pass
 
+    def requires_judge(self) -> bool:
+        """任务评分是否需要调用 LLM 裁判。"""
+        return False
+
+    def answer_mode(self) -> str:
+        """评分前回答的保留方式（见 reasoning.ANSWER_MODES），返回 None 时使用适配器的默认方式。"""
+        return None
+
+    def pre_check(self, response: str):
+        """
+        LLM 裁判评分前的规则预检，返回成立的规则（带 score 时可直接判定），默认没有规则。
+        """
+        return None
+
+    def evaluate_detailed(self, response: str, judger: OpenAIJudger) -> Verdict:
+        """
+        与 evaluate 相同，但返回包含裁判 token 用量等信息的 Verdict。
+        """
+        score, reason = self.evaluate(response, judger)
+        return Verdict(score, reason)
+
+    def evaluate_pre_checked(self, response: str, judger: OpenAIJudger, rule) -> Verdict:
+        """
+        与 evaluate_detailed 相同，但使用调用方已经得到的规则预检结果 rule（pre_check 的返回值），不再重复预检。
+        """
+        return self.evaluate_detailed(response, judger)
+
+    def evaluate_many(self, responses: list[str], judger: OpenAIJudger) -> list[Verdict]:
+        """
+        为同一任务的多个回答评分（例如多次采样），返回与 responses 一一对应的 Verdict。
+        """
+        return [self.evaluate_detailed(response, judger) for response in responses]
+
+    def iter_instances(self):
+        """逐个产出实际运行的任务实例。普通任务只有自身，数据集任务每行一个实例。"""
+        yield self
+
+    def instance_count(self) -> int:
+        return 1
+
+    def is_dataset(self) -> bool:
+        """是否为数据集任务（由多个实例组成，得分按实例汇总）。"""
+        return False
+
+class PreCheckRule:
+    """
+    LLM 裁判评分前的规则预检，对应任务 YAML 中 evaluation.pre_checks 的一项。
+    条件类型：
+    - empty: 回答为空（去掉空白后）；
+    - keyword: 回答包含 any 中任意一个关键词，或包含 all 中全部关键词；
+    - regex: 回答匹配正则 pattern（ignore_case: true 时忽略大小写；^ 只匹配整个回答的开头，不匹配每一行的开头）；
+    - number: 回答中出现与 value 相差不超过 tolerance 的数字。
+    negate: true 时条件取反（例如「不包含任何要求的关键词」）。
+    条件成立时的动作：
+    - 配置了 score：直接给出分数和 reason，不调用裁判；
+    - 配置了 standard：用这份收窄后的评分标准调用裁判；
+    - 配置了 hint：把提示加在任务自身的评分标准（evaluation.standard）前面调用裁判，评分细则只维护一份。
+    """
+    NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+    def __init__(self, rule: dict):
+        self.type = rule['type']
+        self.negate = rule.get('negate', False)
+        self.score = rule.get('score')
+        self.reason = rule.get('reason', "规则预检判定")
+        self.standard = rule.get('standard')
+        self.hint = rule.get('hint')
+        if self.score is None and self.standard is None and self.hint is None:
+            raise ValueError(f"pre_check rule needs one of 'score', 'standard' or 'hint': {rule}")
+
+        if self.type == "keyword":
+            self.any_keywords = rule.get('any', [])
+            self.all_keywords = rule.get('all', [])
+        elif self.type == "regex":
+            flags = re.IGNORECASE if rule.get('ignore_case') else 0
+            self.pattern = re.compile(rule['pattern'], flags)
+        elif self.type == "number":
+            self.value = float(rule['value'])
+            self.tolerance = float(rule.get('tolerance', 0.0))
+        elif self.type != "empty":
+            raise ValueError(f"Unknown pre_check rule type: {self.type}")
+
+    def matches(self, response: str) -> bool:
+        if self.type == "empty":
+            matched = not response.strip()
+        elif self.type == "keyword":
+            matched = (
+                (not self.any_keywords or any(keyword in response for keyword in self.any_keywords))
+                and all(keyword in response for keyword in self.all_keywords)
+            )
+        elif self.type == "regex":
+            matched = self.pattern.search(response) is not None
+        else:
+            matched = any(abs(float(number) - self.value) <= self.tolerance for number in self.NUMBER_PATTERN.findall(response))
+        return matched != self.negate
+
 class ConfigurableTask(BenchmarkTask):
-    def __init__(self, config_path: str, category: str = "unclassified"):
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
-            self.category = category
-            self.config_path = config_path
-        
+    """
+    由 YAML 文件定义的任务。
+    传入任务索引中的元数据（meta）时，id、名称、描述等直接取自索引，
+    prompt、评分标准等正文在第一次使用时才从文件中读取。
+    """
+    def __init__(self, config_path: str, category: str = "unclassified", meta: dict = None):
+        self.category = category
+        self.config_path = config_path
+        self.meta = meta or {}
+        self._config = None
+        self._matcher = None
+        if meta is None:
+            self._config = load_yaml(config_path)
+
+    @property
+    def config(self) -> dict:
+        if self._config is None:
+            self._config = load_yaml(self.config_path) or {}
+        return self._config
+
+    def get_id(self) -> str:
+        """任务 ID，未配置时使用文件名。"""
+        if "id" in self.meta:
+            return self.meta["id"]
+        return self.config.get('id') or Path(self.config_path).stem
+
     def get_name(self) -> str:
+        if "name" in self.meta:
+            return self.meta["name"]
         return self.config.get('name', '未命名任务')
 
     def get_description(self) -> str:
+        if "description" in self.meta:
+            return self.meta["description"]
         return self.config.get('description', '无描述')
     
     def get_category(self) -> str:
         """获取任务分类"""
         return self.category
     
+    def requires_judge(self) -> bool:
+        if "method" in self.meta:
+            return self.meta["method"] == "llm_eval"
+        return self.config['evaluation']['method'] == "llm_eval"
+
+    def answer_mode(self) -> str:
+        mode = self.config.get('answer_mode')
+        if mode is not None and mode not in ANSWER_MODES:
+            raise ValueError(f"Unknown answer_mode in {self.config_path}: {mode} (expected one of {', '.join(ANSWER_MODES)})")
+        return mode
+
+    def _get_pre_checks(self) -> list[PreCheckRule]:
+        """按顺序编译 evaluation.pre_checks 中的规则，只在第一次使用时编译。"""
+        if not hasattr(self, '_pre_checks'):
+            rules = self.config.get('evaluation', {}).get('pre_checks', [])
+            self._pre_checks = [PreCheckRule(rule) for rule in rules]
+        return self._pre_checks
+
+    def pre_check(self, response: str):
+        """
+        按顺序执行规则预检，返回第一条成立的规则；没有规则成立时返回 None。
+        """
+        for rule in self._get_pre_checks():
+            if rule.matches(response):
+                return rule
+        return None
+
+    def get_dataset(self) -> dict:
+        """
+        任务 YAML 中的 dataset 配置，没有时返回 None。可以直接写数据文件路径，也可以写成
+        {path, format, id_field, limit}；路径相对于任务 YAML 所在目录。
+        """
+        dataset = self.meta["dataset"] if "dataset" in self.meta else self.config.get('dataset')
+        if dataset is None:
+            return None
+        if isinstance(dataset, str):
+            dataset = {"path": dataset}
+        return {**dataset, "path": str(Path(self.config_path).parent / dataset["path"])}
+
+    def is_dataset(self) -> bool:
+        return self.get_dataset() is not None
+
+    def iter_instances(self):
+        """
+        数据集任务逐行读取数据文件，每行产出一个 DatasetRowTask，不会一次性读入全部数据。
+        """
+        dataset = self.get_dataset()
+        if dataset is None:
+            yield self
+            return
+        limit = dataset.get('limit')
+        for position, row in enumerate(iter_rows(dataset["path"], dataset.get('format'))):
+            if limit is not None and position >= limit:
+                return
+            yield DatasetRowTask(self, position, row, dataset.get('id_field', 'id'))
+
+    def instance_count(self) -> int:
+        dataset = self.get_dataset()
+        if dataset is None:
+            return 1
+        count = count_rows(dataset["path"], dataset.get('format'))
+        return min(count, dataset['limit']) if dataset.get('limit') is not None else count
+
+    def variables(self) -> dict:
+        """填充提示词模板与评分标准的变量，数据集任务为当前行的字段。"""
+        return {}
+
+    def expected_answers(self) -> list:
+        """数据集中本行的标准答案（evaluation.answer_field 列），没有时返回 None，使用 YAML 中的配置。"""
+        return None
+
     def generate_prompt(self) -> str:
         # 自动填充模板中的变量（如 {article}）
-        return self.config['prompt_template']
+        return fill_template(self.config['prompt_template'], self.variables())
 
     def evaluate(self, response: str, judger=None) -> tuple[float, str]:
+        verdict = self.evaluate_detailed(response, judger)
+        return verdict.score, verdict.reason
+
+    def evaluate_detailed(self, response: str, judger=None) -> Verdict:
         method = self.config['evaluation']['method']
         
         # 路由到不同的评估策略
         if method == "exact_match":
-            return self._evaluate_exact(response)
+            return Verdict(*self._evaluate_exact(response))
         elif method == "fill_in": # 填空题
-            return self._evaluate_fill_in(response)
+            return Verdict(*self._evaluate_fill_in(response))
         elif method == "llm_eval":
             return self._evaluate_llm(response, judger)
+
+    def evaluate_pre_checked(self, response: str, judger, rule) -> Verdict:
+        if self.config['evaluation']['method'] == "llm_eval":
+            return self._evaluate_llm(response, judger, rule=rule, checked=True)
+        return self.evaluate_detailed(response, judger)
     
+    def _get_matcher(self):
+        """exact_match / fill_in 的匹配器，第一次评分时由 evaluation 配置编译，之后重复使用。"""
+        if self._matcher is None:
+            self._matcher = build_matcher(self.config.get('evaluation', {}))
+        return self._matcher
+
     def _evaluate_exact(self, response: str) -> tuple[float, str]:
         """
         精确匹配评估：用于选择题或分类题。
         """
-        # 获取配置
-        eval_cfg = self.config.get('evaluation', {})
-        mapping = eval_cfg.get('mapping', {})
-        default_score = eval_cfg.get('default_score', 0.0)
-        default_reason = eval_cfg.get('default_reason', "回答未匹配到任何预设选项")
-
-        # 归一化处理
-        # 去掉首尾空格、转小写、去掉可能包含的引号（有的模型喜欢加引号）
-        processed_res = response.strip().lower().replace('"', '').replace("'", "")
-        
-        # 针对选择题，有的模型会输出 "A." 或 "选项 A"，这里尝试提取第一个字母
-        # 逻辑：如果匹配项里全是单字母，我们只看回答的第一个字母
-        is_choice_question = all(len(k) == 1 for k in mapping.keys())
-        if is_choice_question and len(processed_res) > 0:
-            # 简单正则：提取第一个出现的字母
-            match = re.search(r'[a-zA-Z]', processed_res)
-            if match:
-                processed_res = match.group()
-
-        # 查表匹配
-        if processed_res in mapping:
-            result = mapping[processed_res]
-            # 支持 YAML 中简写为 score: 100 或 结构化 {score: 100, reason: "..."}
-            if isinstance(result, dict):
-                return float(result.get('score', 0)), result.get('reason', '匹配成功')
-            else:
-                return float(result), "回答正确"
-
-        return float(default_score), default_reason
+        return self._get_matcher().score(response, self.expected_answers())
 
     def _evaluate_fill_in(self, response: str) -> tuple[float, str]:
         """
         填空题评估：支持多正确选项、去除标点干扰、数值容差等。
         """
-        import re
-        eval_cfg = self.config.get('evaluation', {})
-        # 填空题的正确答案可以是列表或字符串
-        standard_answers = eval_cfg.get('answers', [])
-        if isinstance(standard_answers, str):
-            standard_answers = [standard_answers]
-            
-        score_value = float(eval_cfg.get('score', 100.0))
-        default_score = float(eval_cfg.get('default_score', 0.0))
-
-        # 去掉引号、转小写、去掉首尾空格
-        res = response.strip().lower().replace('"', '').replace("'", "")
-        # 去掉结尾常见的标点符号
-        res = re.sub(r'[。，！？．\.!\?,]$', '', res)
-
-        # 准备标准答案列表
-        normalized_standards = [str(ans).strip().lower() for ans in standard_answers]
-
-        # 匹配逻辑
-        # 逻辑 A: 精确匹配（归一化后）
-        if res in normalized_standards:
-            return score_value, "回答正确"
-        
-        return default_score, eval_cfg.get('default_reason', "回答错误")
+        return self._get_matcher().score(response, self.expected_answers())
+
+    def evaluate_many(self, responses: list[str], judger=None, answers: list = None) -> list[Verdict]:
+        """
+        exact_match / fill_in 用编译好的匹配器一次评完全部回答；llm_eval 逐个评分。
+        :param answers: 与 responses 一一对应的标准答案（例如数据集各行的答案），为 None 时均使用本任务的标准答案。
+        """
+        matcher = self._get_matcher()
+        if matcher is None:
+            return [self.evaluate_detailed(response, judger) for response in responses]
+        if answers is None:
+            answers = [self.expected_answers()] * len(responses)
+        return [Verdict(score, reason) for score, reason in matcher.score_many(responses, answers)]
     
-    def _evaluate_llm(self, response: str, judger=None) -> tuple[float, str]:
+    def _evaluate_llm(self, response: str, judger=None, rule=None, checked: bool = False) -> Verdict:
         """
         LLM 裁判评估：用于开放式推理、文学分析等。
+        :param rule: checked 为 True 时，调用方已经执行过的规则预检结果，不再重复预检。
         """
-        if judger is None:
-            return 0.0, "错误：未提供 Judger，无法进行 LLM 评分"
-
         eval_cfg = self.config.get('evaluation', {})
-        standard = eval_cfg.get('standard', "无具体评分标准")
+        # 评分标准中也可以引用数据集本行的字段（如参考答案）
+        standard = fill_template(eval_cfg.get('standard', "无具体评分标准"), self.variables())
+
+        # 规则预检：能直接判定的回答不再调用裁判，否则可能使用收窄后的评分标准
+        if not checked:
+            rule = self.pre_check(response)
+        if rule is not None:
+            if rule.score is not None:
+                return Verdict(float(rule.score), f"规则预检: {rule.reason}", judge_skipped=True)
+            if rule.standard is not None:
+                standard = fill_template(rule.standard, self.variables())
+            if rule.hint is not None:
+                standard = fill_template(rule.hint, self.variables()).strip() + "\n\n" + standard
+
+        if judger is None:
+            return Verdict(0.0, "错误：未提供 Judger，无法进行 LLM 评分")
 
         # 调用你的 Judger 适配器接口
-        # 这里的 judger.evaluate 应该返回 (score, reason)
+        # 这里的 judger.judge 应该返回 Verdict(score, reason, ...)
         try:
-            score, reason = judger.evaluate(standard, response)
-            return float(score), reason
+            verdict = judger.judge(standard, response, task_id=self.get_id())
+            verdict.score = float(verdict.score)
+            return verdict
         except Exception as e:
-            return 0.0, f"Judger 评分过程出错: {str(e)}"
+            return Verdict(0.0, f"Judger 评分过程出错: {str(e)}", status=STATUS_ERROR)
+
+class DatasetRowTask(ConfigurableTask):
+    """
+    数据集任务的一行：共用父任务的配置，用本行的字段填充模板，并使用本行的标准答案评分。
+    任务 ID 为「父任务 ID#行 ID」，行 ID 取 id_field 列，没有该列时为从 1 开始的行号。
+    """
+    def __init__(self, parent: ConfigurableTask, position: int, row: dict, id_field: str = "id"):
+        super().__init__(parent.config_path, category=parent.category, meta=parent.meta)
+        self.parent = parent
+        self.row = row
+        row_id = row.get(id_field)
+        self.row_id = str(position + 1 if row_id is None or row_id == "" else row_id)
+
+    @property
+    def config(self) -> dict:
+        return self.parent.config
+
+    def get_id(self) -> str:
+        return f"{self.parent.get_id()}#{self.row_id}"
+
+    def get_name(self) -> str:
+        return f"{self.parent.get_name()} #{self.row_id}"
+
+    def _get_pre_checks(self) -> list[PreCheckRule]:
+        return self.parent._get_pre_checks()
+
+    def _get_matcher(self):
+        return self.parent._get_matcher()
+
+    def iter_instances(self):
+        yield self
+
+    def instance_count(self) -> int:
+        return 1
+
+    def is_dataset(self) -> bool:
+        return False
 
-def load_all_tasks(config_dir: str) -> list[ConfigurableTask]:
+    def variables(self) -> dict:
+        return self.row
+
+    def expected_answers(self) -> list:
+        field = self.config.get('evaluation', {}).get('answer_field', 'answer')
+        answer = self.row.get(field)
+        if answer is None or answer == "":
+            return None
+        return answer if isinstance(answer, list) else [answer]
+
+def load_all_tasks(config_dir: str, selectors: list[str] = None, index_path: str = None) -> list[ConfigurableTask]:
     """
-    递归加载目录下所有 YAML 任务配置。
+    递归加载目录下所有 YAML 任务配置，按相对路径排序。
     子文件夹名将作为任务的分类（category）。
     
     目录结构示例：
@@ -162,30 +393,13 @@ def load_all_tasks(config_dir: str) -> list[ConfigurableTask]:
     ├── language_proficiency/
     │   └── task3.yaml
     └── root_task.yaml  # 根目录的任务，分类为 "unclassified"
-    """
-    tasks = []
-    config_path = Path(config_dir)
-    
-    # 使用 rglob 递归查找所有 .yaml 文件
-    for file_path in config_path.rglob('*.yaml'):
-        category = _extract_category(file_path, config_path)
-        task_instance = ConfigurableTask(str(file_path), category=category)
-        tasks.append(task_instance)
-    
-    return tasks
 
-def _extract_category(file_path: Path, base_path: Path) -> str:
-    """
-    从文件路径中提取分类名。
-    取相对于 base_path 的第一级子目录名作为分类。
+    :param selectors: 只加载匹配的任务，可以是任务 id、分类名或 glob，见 select_entries。
+    :param index_path: 任务索引文件路径，提供时只重新解析有变化的文件，正文延迟加载。
     """
-    try:
-        relative = file_path.relative_to(base_path)
-        parts = relative.parts
-        
-        if len(parts) > 1:
-            return parts[0]  # 返回第一级文件夹名作为分类
-        else:
-            return "unclassified"  # 根目录下的文件
-    except ValueError:
-        return "unclassified"
\ No newline at end of file
+    config_path = Path(config_dir)
+    entries = select_entries(TaskIndex(config_dir, index_path).refresh(), selectors)
+    return [
+        ConfigurableTask(str(config_path / entry["path"]), category=entry["category"], meta=entry)
+        for entry in entries
+    ]
@@ -0,0 +1,28 @@
+from evaluate import BaseJudger, _split_usage
+
+
+def test_split_batch_response_by_item_headings():
+    text = (
+        "### Item 1\nScore: 8\nReason: 正确。\n\n"
+        "### Item 2\nScore: 3\nReason: 结论错误。\n### Item 3\n"
+    )
+    sections = BaseJudger._split_batch_response(text)
+    assert sections == {1: "Score: 8\nReason: 正确。", 2: "Score: 3\nReason: 结论错误。", 3: ""}
+
+
+def test_split_batch_response_accepts_loose_headings():
+    text = "前言会被忽略\nItem 1\nScore: 5\nReason: a\n  ## Item  2  \nScore: 6\nReason: b"
+    sections = BaseJudger._split_batch_response(text)
+    assert sections == {1: "Score: 5\nReason: a", 2: "Score: 6\nReason: b"}
+
+
+def test_split_batch_response_ignores_inline_mentions():
+    text = "### Item 1\nScore: 5\nReason: 与 Item 2 的回答相同\n"
+    assert list(BaseJudger._split_batch_response(text)) == [1]
+    assert BaseJudger._split_batch_response("Score: 5\nReason: 没有分段") == {}
+
+
+def test_split_usage_spreads_remainder_over_first_items():
+    shares = _split_usage({"prompt_tokens": 10, "completion_tokens": 3}, 3)
+    assert [share["prompt_tokens"] for share in shares] == [4, 3, 3]
+    assert [share["completion_tokens"] for share in shares] == [1, 1, 1]
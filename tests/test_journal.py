@@ -0,0 +1,27 @@
+from journal import RunJournal
+
+
+def test_resume_after_partial_line(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"type": "task", "task_id": "a"}\n{"type":"task","task_', encoding="utf-8")
+
+    journal = RunJournal(str(path))
+    journal.append({"task_id": "b"})
+    journal.append({"task_id": "c"})
+    journal.close()
+
+    _, records = RunJournal.load(str(path))
+    assert [record["task_id"] for record in records] == ["a", "b", "c"]
+
+
+def test_partial_only_line_is_dropped(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"type": "me', encoding="utf-8")
+
+    journal = RunJournal(str(path))
+    journal.write_meta({"model_id": "m"})
+    journal.close()
+
+    meta, records = RunJournal.load(str(path))
+    assert meta["model_id"] == "m"
+    assert records == []
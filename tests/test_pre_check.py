@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import pytest
+
+from evaluate import Verdict
+from tasks_handler import ConfigurableTask, PreCheckRule
+
+TASKS_DIR = Path(__file__).resolve().parent.parent / "tasks"
+
+
+@pytest.fixture
+def stick_task():
+    return ConfigurableTask(str(TASKS_DIR / "reasoning" / "stick_pass_gate.yaml"), category="reasoning")
+
+
+def test_conclusion_is_read_from_start_of_whole_answer(stick_task):
+    rule = stick_task.pre_check("可以。把木棍放平。\n不能直接竖着过，因为门高只有 4 米。")
+    assert "可以" in rule.pattern.pattern and "不可以" not in rule.pattern.pattern
+
+
+def test_question_echo_is_not_a_conclusion(stick_task):
+    assert stick_task.pre_check("能否通过取决于角度") is None
+
+
+def test_affirmative_prefix(stick_task):
+    rule = stick_task.pre_check("是的，可以，把木棍放平即可。")
+    assert rule is not None and "不可以" not in rule.pattern.pattern
+
+
+def test_empty_answer_scores_without_judge(stick_task):
+    rule = stick_task.pre_check("  \n")
+    assert rule.type == "empty" and rule.score == 0
+
+
+@pytest.mark.parametrize("rule, response, expected", [
+    ({"type": "keyword", "any": ["开车", "驾车"], "score": 0}, "还是驾车吧", True),
+    ({"type": "keyword", "all": ["开车", "洗车"], "score": 0}, "开车去", False),
+    ({"type": "keyword", "any": ["开车"], "negate": True, "score": 0}, "走路", True),
+    ({"type": "regex", "pattern": "^答案", "score": 0}, "解释\n答案", False),
+    ({"type": "regex", "pattern": "yes", "ignore_case": True, "score": 0}, "YES", True),
+    ({"type": "number", "value": 5, "tolerance": 0.1, "score": 0}, "对角线约 5.05 米", True),
+    ({"type": "number", "value": 5, "score": 0}, "5.5 米", False),
+])
+def test_rule_conditions(rule, response, expected):
+    assert PreCheckRule(rule).matches(response) is expected
+
+
+def test_rule_needs_an_action():
+    with pytest.raises(ValueError):
+        PreCheckRule({"type": "empty"})
+    with pytest.raises(ValueError):
+        PreCheckRule({"type": "unknown", "score": 0})
+
+
+class RecordingJudger:
+    def __init__(self):
+        self.standards = []
+
+    def judge(self, standard, response, task_id=None):
+        self.standards.append(standard)
+        return Verdict(70, "ok")
+
+
+def test_hint_is_prepended_to_task_standard(stick_task):
+    judger = RecordingJudger()
+    verdict = stick_task.evaluate_detailed("不可以，对角线只有 5 米。", judger)
+    assert verdict.score == 70.0
+    standard = judger.standards[0]
+    assert standard.startswith("AI 的回答开头给出的结论为「不可以」")
+    assert standard.endswith(stick_task.config["evaluation"]["standard"])
+
+
+def test_pre_checked_evaluation_does_not_check_again(stick_task, monkeypatch):
+    rule = stick_task.pre_check("可以，放平即可。")
+    monkeypatch.setattr(stick_task, "pre_check", lambda response: pytest.fail("pre_check ran twice"))
+    judger = RecordingJudger()
+    stick_task.evaluate_pre_checked("可以，放平即可。", judger, rule)
+    assert judger.standards[0].startswith(rule.hint)
@@ -0,0 +1,25 @@
+import pytest
+
+from rate_limit import TokenBucket, parse_retry_after
+
+
+def test_token_bucket_allows_debt_then_waits_for_it():
+    bucket = TokenBucket(60)
+    now = bucket.updated_at
+    bucket.take(90)
+    # 欠账 30 个额度，按每秒 1 个补充
+    assert bucket.wait_time(now) == pytest.approx(30, abs=0.01)
+    assert bucket.wait_time(now + 31) == 0.0
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(60)
+    now = bucket.updated_at
+    bucket.take(10)
+    bucket.wait_time(now + 3600)
+    assert bucket.available == 60
+
+
+@pytest.mark.parametrize("value, expected", [("5", 5.0), ("-3", 0.0), (None, None), ("soon", None)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
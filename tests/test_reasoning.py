@@ -0,0 +1,32 @@
+import pytest
+
+from reasoning import ReasoningParser, ThinkingBudgetExceeded
+
+
+def feed_all(parser, chunks):
+    for chunk in chunks:
+        parser.feed(chunk)
+        parser.check()
+    return parser.finish()
+
+
+def test_orphan_close_tag_is_thinking():
+    parser = feed_all(ReasoningParser(), ["先想", "一想", "</thi", "nk>\n", "借贷"])
+    assert parser.reasoning == "先想一想"
+    assert parser.answer == "借贷"
+    assert parser.thinking_tokens == 3
+
+
+def test_start_thinking_enforces_budget_before_close_tag():
+    chunks = ["想"] * 10 + ["</think>", "借贷"]
+    with pytest.raises(ThinkingBudgetExceeded):
+        feed_all(ReasoningParser(max_thinking_tokens=5, start_thinking=True), chunks)
+    # 不从思考开始时，</think> 之前的内容被当作回答，预算不会提前生效
+    parser = feed_all(ReasoningParser(max_thinking_tokens=5), chunks)
+    assert parser.answer == "借贷"
+
+
+def test_start_thinking_strips_leading_open_tag():
+    parser = feed_all(ReasoningParser(start_thinking=True), ["\n<th", "ink>", "想", "</think>", "借贷"])
+    assert parser.reasoning == "想"
+    assert parser.answer == "借贷"
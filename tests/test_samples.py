@@ -0,0 +1,43 @@
+from cache import ResponseCache
+from model_adapter import BaseModelAdapter, ModelResponse
+from openai_adapter import OpenAIAdapter
+
+
+class CountingAdapter(BaseModelAdapter):
+    def __init__(self):
+        super().__init__(api_key="", model_id="fake", api_base="http://fake")
+        self.requested = []
+
+    def request_params(self, sample: int = 0) -> dict:
+        return {"seed": 42 + sample}
+
+    def _complete(self, prompt: str, sample: int = 0) -> ModelResponse:
+        self.requested.append(sample)
+        return ModelResponse(text=f"answer {sample}")
+
+
+def test_only_missing_samples_are_requested(tmp_path):
+    adapter = CountingAdapter()
+    adapter.cache = ResponseCache(path=str(tmp_path / "responses.sqlite"), mode="read")
+    adapter.cache.store(adapter, "题目", "cached 0", 0, 3)
+    adapter.cache.store(adapter, "题目", "cached 2", 2, 3)
+
+    responses = adapter.complete_samples("题目", 3)
+
+    assert adapter.requested == [1]
+    assert [r.text for r in responses] == ["cached 0", "answer 1", "cached 2"]
+    assert [r.cached for r in responses] == [True, False, True]
+    assert adapter.cache.lookup(adapter, "题目", 1, 3) == "answer 1"
+
+
+def test_batched_choices_are_keyed_by_the_request_actually_sent(tmp_path):
+    adapter = OpenAIAdapter(api_key="sk-test", model_id="fake", api_base="http://fake/v1")
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"), mode="read")
+    keys = [cache.key_for(adapter, "题目", sample, 3) for sample in range(3)]
+    # n=K 请求的候选共用种子 42，不能与单独请求（种子 42 + 采样序号）的缓存条目混用
+    assert len(set(keys)) == 3
+    assert keys[0] != cache.key_for(adapter, "题目")
+    assert adapter.sample_params(1, 3)["seed"] == adapter.request_params()["seed"]
+
+    adapter.stream = True
+    assert cache.key_for(adapter, "题目", 0, 3) == cache.key_for(adapter, "题目")
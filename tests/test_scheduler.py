@@ -0,0 +1,76 @@
+import pytest
+
+from scheduler import LatencyPredictor, TimeBudgetScheduler
+
+
+class FakeTask:
+    def __init__(self, task_id, prompt="题目", rows=None):
+        self.task_id = task_id
+        self.prompt = prompt
+        self.rows = rows
+        self.expanded = 0
+
+    def get_id(self):
+        return self.task_id
+
+    def generate_prompt(self):
+        return self.prompt
+
+    def is_dataset(self):
+        return self.rows is not None
+
+    def instance_count(self):
+        return len(self.rows) if self.rows is not None else 1
+
+    def iter_instances(self):
+        if self.rows is None:
+            yield self
+            return
+        for row in self.rows:
+            self.expanded += 1
+            yield FakeTask(f"{self.task_id}#{row}", self.prompt)
+
+
+def history(**seconds):
+    return [{"task_id": task_id, "execution_time": value, "prompt_tokens": 10} for task_id, value in seconds.items()]
+
+
+def test_order_shortest_first_with_done_tasks_first():
+    scheduler = TimeBudgetScheduler(100, LatencyPredictor(history(slow=30, fast=1, medium=5)))
+    tasks = [FakeTask("slow"), FakeTask("fast"), FakeTask("medium"), FakeTask("done")]
+    ordered = list(scheduler.order(tasks, done_ids={"done"}))
+    assert [(i, task.get_id()) for i, task in ordered] == [(3, "done"), (1, "fast"), (2, "medium"), (0, "slow")]
+
+
+def test_dataset_rows_come_last_and_are_expanded_lazily():
+    dataset = FakeTask("batch", rows=["a", "b", "c"])
+    scheduler = TimeBudgetScheduler(100, LatencyPredictor(history(single=50)))
+    ordered = scheduler.order([dataset, FakeTask("single")])
+    assert next(ordered)[1].get_id() == "single"
+    assert dataset.expanded == 0
+    assert [(i, task.get_id()) for i, task in ordered] == [(0, "batch#a"), (1, "batch#b"), (2, "batch#c")]
+
+
+def test_admit_marks_tasks_that_cannot_fit_as_out_of_time():
+    scheduler = TimeBudgetScheduler(20, LatencyPredictor(history(fits=5, too_slow=60)), deadline_factor=3.0)
+    deadline, predicted = scheduler.admit(FakeTask("too_slow"))
+    assert deadline is None and predicted == 60
+    deadline, predicted = scheduler.admit(FakeTask("fits"))
+    # 截止时间为预测耗时的 3 倍（不少于 MIN_DEADLINE），且不超过剩余预算
+    assert predicted == 5 and deadline == pytest.approx(15, abs=0.5)
+    assert (scheduler.admitted, scheduler.not_started) == (1, 1)
+
+
+def test_cold_start_admits_until_budget_is_spent():
+    scheduler = TimeBudgetScheduler(1000, LatencyPredictor())
+    deadline, predicted = scheduler.admit(FakeTask("new", prompt="x" * 4000))
+    assert predicted > 10 and deadline == pytest.approx(1000, abs=1)
+    scheduler.budget = 0
+    assert scheduler.admit(FakeTask("late"))[0] is None
+
+
+def test_observed_latency_updates_predictions():
+    scheduler = TimeBudgetScheduler(100, LatencyPredictor())
+    task = FakeTask("t")
+    scheduler.observe(task, 10, 4.0)
+    assert scheduler.predictor.predict(task) == (4.0, "history")
@@ -0,0 +1,22 @@
+import pytest
+
+from task_index import DuplicateTaskIdError, TaskIndex
+
+
+def write_task(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_duplicate_file_stem_in_two_categories(tmp_path):
+    write_task(tmp_path / "reasoning" / "riddle.yaml", "name: a\n")
+    write_task(tmp_path / "language" / "riddle.yaml", "name: b\n")
+    with pytest.raises(DuplicateTaskIdError, match="language/riddle.yaml and reasoning/riddle.yaml"):
+        TaskIndex(str(tmp_path)).refresh()
+
+
+def test_explicit_id_disambiguates(tmp_path):
+    write_task(tmp_path / "reasoning" / "riddle.yaml", "name: a\n")
+    write_task(tmp_path / "language" / "riddle.yaml", "id: language_riddle\nname: b\n")
+    ids = [entry["id"] for entry in TaskIndex(str(tmp_path)).refresh()]
+    assert sorted(ids) == ["language_riddle", "riddle"]
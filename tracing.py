@@ -0,0 +1,187 @@
+# tracing.py
+import cProfile
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from metrics import percentile
+
+# 当前线程正在记录的 Tracer（由 Tracer.activate 设置）
+_local = threading.local()
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    记录一次运行中各阶段的耗时区间（span），用于分析时间花在了哪里：
+    任务加载、提示词构造、网络等待、裁判评分、裁判回复解析、报告写入等。
+    - 每个阶段（以及带 endpoint 的阶段按端点）汇总 p50/p95/p99，见 stage_summary；
+    - 区间可导出为 Chrome trace（chrome://tracing 或 ui.perfetto.dev 打开），见 export_chrome_trace。
+    适配器、裁判等组件通过模块级的 span() 记录到当前线程激活的 Tracer 中，未激活时不记录任何内容，
+    因此同一个裁判被多个 Runner 共享时，区间记入发起评分的那次运行。可在多个线程间共享。
+    :param max_events: 导出 Chrome trace 时最多保留的区间数，超出的区间只计入耗时分布；为 0 时不保留。
+    """
+    def __init__(self, max_events: int = 100_000):
+        self.max_events = max_events
+        self.origin = time.perf_counter_ns()
+        # (阶段, 开始 ns, 持续 ns, 线程 ident, 参数)
+        self.events = []
+        self.dropped = 0
+        self.durations = {}
+        self.endpoint_durations = {}
+        self.thread_names = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter_ns(), args)
+
+    def record(self, name: str, start_ns: int, end_ns: int, args: dict = None):
+        duration = end_ns - start_ns
+        thread = threading.current_thread()
+        endpoint = args.get("endpoint") if args else None
+        with self._lock:
+            self.durations.setdefault(name, []).append(duration)
+            if endpoint:
+                self.endpoint_durations.setdefault((name, endpoint), []).append(duration)
+            if len(self.events) < self.max_events:
+                self.events.append((name, start_ns, duration, thread.ident, args))
+                self.thread_names.setdefault(thread.ident, thread.name)
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def activate(self):
+        """在当前线程中激活该 Tracer，退出时恢复之前激活的 Tracer。"""
+        previous = getattr(_local, "tracer", None)
+        _local.tracer = self
+        try:
+            yield self
+        finally:
+            _local.tracer = previous
+
+    def stage_summary(self) -> dict:
+        """
+        各阶段的次数、总耗时（秒）与 p50/p95/p99（毫秒）；endpoints 为带 endpoint 参数的阶段按端点的分布。
+        """
+        with self._lock:
+            stages = {name: list(durations) for name, durations in self.durations.items()}
+            endpoints = {key: list(durations) for key, durations in self.endpoint_durations.items()}
+        return {
+            "stages": {name: _distribution(durations) for name, durations in sorted(stages.items())},
+            "endpoints": {
+                f"{name} @ {endpoint}": {"stage": name, "endpoint": endpoint, **_distribution(durations)}
+                for (name, endpoint), durations in sorted(endpoints.items())
+            },
+        }
+
+    def export_chrome_trace(self, path: str, metadata: dict = None):
+        """写入 Chrome trace 格式（Trace Event Format）的 JSON 文件，每个线程一行。"""
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.dropped
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": ident, "args": {"name": name}}
+            for ident, name in thread_names.items()
+        ]
+        for name, start, duration, ident, args in events:
+            event = {
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": duration / 1000,
+                "pid": 1,
+                "tid": ident,
+            }
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "otherData": {**(metadata or {}), "dropped_spans": dropped},
+            }, f, ensure_ascii=False)
+
+
+def _distribution(durations: list) -> dict:
+    milliseconds = [duration / 1e6 for duration in durations]
+    return {
+        "count": len(milliseconds),
+        "total_s": round(sum(milliseconds) / 1000, 4),
+        "p50_ms": round(percentile(milliseconds, 50), 3),
+        "p95_ms": round(percentile(milliseconds, 95), 3),
+        "p99_ms": round(percentile(milliseconds, 99), 3),
+    }
+
+
+def current() -> Tracer:
+    """当前线程激活的 Tracer，没有时返回 None。"""
+    return getattr(_local, "tracer", None)
+
+
+def span(name: str, **args):
+    """在当前线程激活的 Tracer 中记录一个区间；没有激活的 Tracer 时什么也不做。"""
+    tracer = getattr(_local, "tracer", None)
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, **args)
+
+
+def bind(fn):
+    """
+    包装在其他线程中执行的函数（例如提交给线程池），使其在调用方当前激活的 Tracer 下执行。
+    """
+    tracer = current()
+    if tracer is None:
+        return fn
+
+    def traced(*args, **kwargs):
+        with tracer.activate():
+            return fn(*args, **kwargs)
+    return traced
+
+
+class RunProfiler:
+    """
+    用 cProfile 分析一次运行。cProfile 只分析启用它的线程，因此除当前线程外，
+    运行期间新建的每个线程（生成、裁判、采样等工作线程）也各自启用一个 Profile，结束时合并统计。
+    在进入之前已经启动的线程（如报告写入线程）不在分析范围内。
+    """
+    def __init__(self):
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, *args):
+        # 由 threading.setprofile 在新线程的第一个事件上调用，启用后 cProfile 接管该线程
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+
+    def __enter__(self):
+        threading.setprofile(self._profile_thread)
+        self._main = cProfile.Profile()
+        self.profilers.append(self._main)
+        self._main.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._main.disable()
+        threading.setprofile(None)
+
+    def dump(self, path: str) -> pstats.Stats:
+        """合并全部线程的统计并写入 path（可用 python -m pstats 或 snakeviz 查看）。"""
+        stats = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return stats